@@ -1,15 +1,53 @@
-from typing import Optional
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from uuid import uuid4
+import anyio
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import os
 
 # Import backend logic lazily to avoid importing optional audio / desktop deps at module-import time
 # We'll import when the first request arrives so the server can start for simple text-only usage.
-handle_query = None
-process_input = None
+_handle_query = None
+_handle_query_lock = threading.Lock()
+
+def _warm_stt():
+    """Optionally start loading the Whisper model in the background (config.STT_WARMUP)."""
+    try:
+        from config import STT_WARMUP
+        if STT_WARMUP:
+            from stt import get_engine
+            get_engine().warmup(background=True)
+    except Exception as e:
+        print("DEBUG | STT warmup skipped:", e)
+
+
+def _warm_tts():
+    """Optionally pre-synthesize tts.CANNED_REPLIES into the TTS cache (config.TTS_CACHE_PREWARM)."""
+    try:
+        from config import TTS_CACHE_PREWARM
+        if TTS_CACHE_PREWARM:
+            from tts import prewarm_tts
+            prewarm_tts()
+    except Exception as e:
+        print("DEBUG | TTS prewarm skipped:", e)
+
 
-app = FastAPI(title="VerySleepy AI API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Both warmups start background threads and return immediately
+    _warm_stt()
+    _warm_tts()
+    yield
+
+
+app = FastAPI(title="VerySleepy AI API", lifespan=lifespan)
 
 # Allow all origins for Replit environment
 app.add_middleware(
@@ -20,10 +58,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
 class QueryPayload(BaseModel):
     input: str
     mode: Optional[str] = None
     source: Optional[str] = "text"  # allowed values: 'text' or 'voice'
+    prefetch_voice: Optional[str] = None  # start TTS of the answer in this voice right away
+    id: Optional[str] = None  # choose the query id up front so POST /query/{id}/cancel can stop it
 
 
 # --- STT upload endpoint --------------------------------------------------
@@ -31,74 +72,215 @@ from fastapi import File, UploadFile
 
 
 @app.post("/stt")
-async def stt_upload(file: UploadFile = File(...)):
-    """Accept an audio upload (webm/ogg/wav/etc) and return a transcript."""
+async def stt_upload(file: UploadFile = File(...), accuracy: Optional[str] = None):
+    """Accept an audio upload (webm/ogg/wav/etc) and return a transcript.
+
+    `accuracy` ("fast" | "high") pins the smallest / largest Whisper tier;
+    by default the tier follows clip length and queue depth.
+    """
     if not file:
         raise HTTPException(status_code=400, detail="No file uploaded")
 
     try:
-        import tempfile
-        import shutil
-
-        suffix = os.path.splitext(file.filename)[1] or ".wav"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as f:
-            temp_path = f.name
-            # Write uploaded bytes
-            shutil.copyfileobj(file.file, f)
-
-        # Lazy import stt and use its transcribe_file helper
+        # Lazy import the STT worker pool (keeps Whisper off the event loop)
         try:
-            from stt import transcribe_file
+            from stt_pool import get_pool, QueueFull
+            from config import STT_MAX_UPLOAD_BYTES, STT_REQUEST_TIMEOUT
         except Exception:
             raise HTTPException(status_code=500, detail="STT not available on server")
 
-        text = transcribe_file(temp_path)
+        # Read the upload in chunks, enforcing the size cap as we go; the audio is
+        # decoded from memory, never copied to a temp file.
+        audio = bytearray()
+        while True:
+            chunk = await file.read(64 * 1024)
+            if not chunk:
+                break
+            audio += chunk
+            if len(audio) > STT_MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail="Audio upload too large")
+        if not audio:
+            raise HTTPException(status_code=400, detail="Empty audio upload")
+
+        # Decode and cut silence off the event loop; speechless clips never reach the model
+        from stt import prepare_audio
         try:
-            os.unlink(temp_path)
-        except Exception:
-            pass
+            samples, info = await run_in_threadpool(prepare_audio, bytes(audio))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not decode audio: {e}")
+        trim = {"no_speech": not info["speech"], "audio_seconds": info["audio_seconds"], "saved_seconds": info["saved_seconds"]}
+        if not info["speech"]:
+            return {"transcript": "", **trim, **_transcript_flags("")}
+
+        # Identical audio + settings -> reuse the earlier full-model transcript and flags
+        from stt_cache import get_transcript_cache, is_cacheable
+        cache = get_transcript_cache()
+        key, cached = await run_in_threadpool(cache.lookup, samples)
+        if cached is not None:
+            return {**cached, **trim, "cached": True}
 
-        # Check if the transcript contains an explicit memory command (for UI confirmation)
-        triggers = [
-            "remember this",
-            "remember that",
-            "save this",
-            "from now on remember",
-            "always remember",
-        ]
-        t = text.lower() if text else ""
-        contains_memory_command = any(k in t for k in triggers)
-
-        # Check if content is disallowed for long-term memory
         try:
-            from memory import is_disallowed_memory_content
-            disallowed = is_disallowed_memory_content(text)
-        except Exception:
-            disallowed = None
+            result = await get_pool().transcribe_async(
+                samples, timeout=STT_REQUEST_TIMEOUT, accuracy=accuracy, detailed=True
+            )
+        except QueueFull:
+            raise HTTPException(status_code=503, detail="STT is busy, try again shortly")
+        except (TimeoutError, asyncio.TimeoutError):
+            raise HTTPException(status_code=504, detail="STT timed out")
+        text = result["text"]
+        response = {"transcript": text, "model": result["model"], "escalated": result["escalated"],
+                    **_transcript_flags(text)}
+        if is_cacheable(response):
+            await run_in_threadpool(cache.set, key, response)
+        return {**response, **trim, "cached": False}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return {"transcript": text, "contains_memory_command": contains_memory_command, "disallowed_memory_reason": disallowed}
 
+@app.get("/stt/stats")
+def stt_stats():
+    """Queue depth, throughput and latency of the STT worker pool."""
+    try:
+        from stt import trim_stats
+        from stt_cache import get_transcript_cache
+        from stt_pool import get_pool
+        return {**get_pool().stats(), "silence_trim": trim_stats(), "cache": get_transcript_cache().stats()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# --- TTS playback control -------------------------------------------------
-from uuid import uuid4
+def _transcript_flags(text: str) -> dict:
+    """Memory-command / disallowed-content flags the UI uses to confirm saves."""
+    # Check if the transcript contains an explicit memory command (for UI confirmation)
+    triggers = [
+        "remember this",
+        "remember that",
+        "save this",
+        "from now on remember",
+        "always remember",
+    ]
+    t = text.lower() if text else ""
+    contains_memory_command = any(k in t for k in triggers)
+
+    # Check if content is disallowed for long-term memory
+    try:
+        from memory import is_disallowed_memory_content
+        disallowed = is_disallowed_memory_content(text)
+    except Exception:
+        disallowed = None
+
+    return {"contains_memory_command": contains_memory_command, "disallowed_memory_reason": disallowed}
+
 
-_playback_registry = {}
+@app.websocket("/stt/stream")
+async def stt_stream(websocket: WebSocket, format: str = "pcm16", sample_rate: int = 16000):
+    """Streaming speech recognition.
+
+    Send binary audio frames (format=pcm16|f32 mono at `sample_rate`, or
+    format=webm|ogg MediaRecorder chunks). The server replies with JSON events:
+    {"type": "partial"|"final", "text"} while the user speaks and
+    {"type": "end_of_utterance", "text", "contains_memory_command", "disallowed_memory_reason"}
+    after a long pause. Send the text message "end" to flush and close.
+    """
+    await websocket.accept()
+    try:
+        from stt import StreamingTranscriber
+        from stt_pool import get_pool
+        # Segments go through the shared worker pool like /stt uploads
+        transcriber = StreamingTranscriber(fmt=format, sample_rate=sample_rate, engine=get_pool())
+    except Exception as e:
+        await websocket.send_json({"type": "error", "detail": f"STT not available on server: {e}"})
+        await websocket.close()
+        return
+
+    async def _send(events):
+        for event in events:
+            if event["type"] == "end_of_utterance":
+                event.update(_transcript_flags(event["text"]))
+            await websocket.send_json(event)
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                await _send(await run_in_threadpool(transcriber.feed, message["bytes"]))
+            elif (message.get("text") or "").strip().lower() in ("end", "stop", '{"type": "end"}'):
+                await _send(await run_in_threadpool(transcriber.finish))
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        try:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+            await websocket.close()
+        except Exception:
+            pass
+    finally:
+        # a client that drops without "end" must not leave the decoder thread waiting
+        transcriber.close()
 
 
+# --- TTS playback control -------------------------------------------------
 class SpeakPayload(BaseModel):
-    text: str
+    text: Optional[str] = None         # may be omitted when response_id names a prefetched /query answer
+    response_id: Optional[str] = None  # "id" from /query; reuses audio started by prefetch_voice
     voice: Optional[str] = "en_US-lessac"
     volume: Optional[float] = 1.0
+    channel: Optional[str] = "default"
+    interrupt: Optional[bool] = False  # stop whatever is queued / playing on the channel first
+
+
+def _check_voice(voice: Optional[str]):
+    """400 for a voice that is not a plain model name inside the voices directory."""
+    try:
+        from tts_pool import voice_path
+        voice_path(voice or "")
+    except ImportError:
+        pass
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _speech_text(text: Optional[str], response_id: Optional[str]) -> str:
+    """The text to speak: given explicitly, or the /query answer prefetched under `response_id`
+    (by any worker process).
+    """
+    if (not text or not text.strip()) and response_id:
+        try:
+            from tts import prefetched_text
+            text = await run_in_threadpool(prefetched_text, response_id)
+        except Exception:
+            text = None
+    if not text or not text.strip():
+        raise HTTPException(status_code=400, detail="Text is required")
+    return text
+
+
+def _get_scheduler():
+    # Playback status / stop go through the scheduler, which also finds clips
+    # scheduled by other worker processes via the shared store
+    try:
+        from audio_player import get_scheduler
+    except Exception:
+        return None
+    return get_scheduler()
 
 
 @app.post("/speak")
 async def speak_endpoint(payload: SpeakPayload):
-    """Trigger server-side TTS playback and return an id for controlling it."""
-    if not payload.text or not payload.text.strip():
-        raise HTTPException(status_code=400, detail="Text is required")
+    """Queue server-side TTS playback and return an id for controlling it.
+
+    Replies on the same channel play in order; status moves
+    queued -> playing -> done (or stopped / failed).
+    """
+    _check_voice(payload.voice)
+    text = await _speech_text(payload.text, payload.response_id)
 
     # Lazy import tts.speak
     try:
@@ -107,42 +289,114 @@ async def speak_endpoint(payload: SpeakPayload):
         raise HTTPException(status_code=500, detail="TTS not available on server")
 
     try:
-        controller = _speak(payload.text, payload.voice)
+        controller = await run_in_threadpool(
+            _speak, text, payload.voice,
+            payload.volume if payload.volume is not None else 1.0,
+            payload.channel or "default", bool(payload.interrupt), payload.response_id, raise_errors=True,
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"TTS generation/playback error: {e}")
 
-    play_id = None
-    if controller is not None:
-        play_id = str(uuid4())
-        _playback_registry[play_id] = controller
+    if controller is None:
+        # No scheduler: the fallback player has already played it synchronously
+        # (generation or playback failures raised above)
+        return {"id": None, "status": "done"}
+    return {"id": controller.id, "status": controller.state}
 
-    return {"id": play_id, "status": "playing"}
 
+async def _stream_speech(text: str, voice: str, response_id: Optional[str] = None):
+    """Yield a WAV stream sentence by sentence; all sentences synthesize in parallel, sent in order."""
+    from tts import submit_sentences, prefetched_sentences, wav_stream_header, silence_pcm, SENTENCE_GAP_SECONDS
 
-@app.post("/speak/{play_id}/stop")
-async def stop_speak(play_id: str):
-    controller = _playback_registry.get(play_id)
-    if not controller:
-        return {"status": "not_found"}
+    futures = prefetched_sentences(response_id, voice, text) if response_id else None
+    owned = futures is None
+    if owned:
+        futures = submit_sentences(text, voice)
     try:
-        controller.stop()
-    except Exception:
-        pass
+        for i, future in enumerate(futures):
+            pcm, sample_rate = await asyncio.wrap_future(future)
+            if i == 0:
+                yield wav_stream_header(sample_rate)
+            else:
+                yield silence_pcm(SENTENCE_GAP_SECONDS, sample_rate)
+            yield pcm
+    finally:
+        # Client went away mid-stream: drop sentences that haven't started yet
+        # (prefetched ones stay available for a later /speak)
+        if owned:
+            for future in futures:
+                future.cancel()
+
+
+async def _speak_stream_response(text: Optional[str], voice: str, response_id: Optional[str] = None):
     try:
-        del _playback_registry[play_id]
+        import tts  # noqa: F401
     except Exception:
-        pass
-    return {"status": "stopped"}
+        raise HTTPException(status_code=500, detail="TTS not available on server")
+    _check_voice(voice)
+    text = await _speech_text(text, response_id)
+
+    stream = _stream_speech(text, voice, response_id)
+    # Pull the header + first sentence now so synthesis errors become a 500, not a broken stream
+    try:
+        first = [await stream.__anext__(), await stream.__anext__()]
+    except Exception as e:
+        await stream.aclose()
+        raise HTTPException(status_code=500, detail=f"TTS generation error: {e}")
+
+    async def _body():
+        for chunk in first:
+            yield chunk
+        async for chunk in stream:
+            yield chunk
+
+    return StreamingResponse(_body(), media_type="audio/wav")
+
+
+@app.post("/speak/stream")
+async def speak_stream(payload: SpeakPayload):
+    """Synthesize `text` and stream it to the client as WAV, one sentence at a time.
+
+    Unlike /speak nothing plays on the server; the first audio is sent as soon
+    as the first sentence is synthesized.
+    """
+    return await _speak_stream_response(payload.text, payload.voice, payload.response_id)
+
+
+@app.get("/speak/stream")
+async def speak_stream_get(text: Optional[str] = None, voice: str = "en_US-lessac", response_id: Optional[str] = None):
+    """GET form of /speak/stream, usable directly as an <audio> src."""
+    return await _speak_stream_response(text, voice, response_id)
+
+
+@app.post("/speak/{play_id}/stop")
+async def stop_speak(play_id: str):
+    scheduler = _get_scheduler()
+    try:
+        status = await run_in_threadpool(scheduler.stop, play_id) if scheduler else None
+    except Exception as e:
+        print("DEBUG | stop playback failed:", e)
+        status = None
+    if not status:
+        return {"status": "not_found"}
+    return {"status": status["status"]}
 
 
 @app.get("/speak/{play_id}")
 async def get_playback(play_id: str):
-    controller = _playback_registry.get(play_id)
-    if not controller:
+    scheduler = _get_scheduler()
+    try:
+        status = await run_in_threadpool(scheduler.status, play_id) if scheduler else None
+    except Exception as e:
+        print("DEBUG | playback status failed:", e)
+        status = None
+    if not status:
         return {"status": "not_found"}
-    return {"status": "playing"}
+    return status
 
 # --- Memory & Prefs endpoints -------------------------------------------
+# Async handlers go through memory_async so sqlite work runs on the DB thread,
+# never on the event loop; plain `def` handlers already run in the threadpool.
 class PrefPayload(BaseModel):
     key: str
     value: str
@@ -151,12 +405,12 @@ class PrefPayload(BaseModel):
 @app.post("/prefs")
 async def set_pref_endpoint(payload: PrefPayload):
     try:
-        from memory import set_pref
+        from memory_async import set_pref
     except Exception:
         raise HTTPException(status_code=500, detail="Memory service unavailable")
 
     try:
-        set_pref(payload.key, payload.value)
+        await set_pref(payload.key, payload.value)
         return {"status": "ok"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -165,6 +419,7 @@ async def set_pref_endpoint(payload: PrefPayload):
 class RememberPayload(BaseModel):
     content: str
     source: Optional[str] = "explicit"
+    on_duplicate: Optional[str] = "refresh"  # refresh | merge | skip | insert
 
 
 @app.post("/memory/remember")
@@ -173,12 +428,19 @@ async def remember(payload: RememberPayload):
         raise HTTPException(status_code=400, detail="Content required")
 
     try:
-        from memory import is_disallowed_memory_content, add_long_term
+        from memory import is_disallowed_memory_content
+        from memory_async import add_long_term
         disallowed = is_disallowed_memory_content(payload.content)
         if disallowed:
             raise HTTPException(status_code=400, detail=f"Content not allowed for long-term memory: {disallowed}")
-        add_long_term(payload.content, source=payload.source)
-        return {"status": "remembered"}
+        result = await add_long_term(payload.content, source=payload.source, on_duplicate=payload.on_duplicate or "refresh")
+        return {
+            "status": "skipped" if result["status"] == "skipped" else "remembered",
+            "id": result["id"],
+            "dedup": result["status"],
+            "match": result["match"],
+            "existing": result["existing"],
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -191,19 +453,29 @@ async def remember(payload: RememberPayload):
 @app.post("/memory/clear")
 async def clear_memory():
     try:
-        from memory import clear_all_memory
-        clear_all_memory()
+        from memory_async import clear_all_memory
+        await clear_all_memory()
         return {"status": "cleared"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/memory/dedupe")
+async def dedupe_memory():
+    """One-off pass removing duplicate and near-duplicate long-term facts."""
+    try:
+        from memory_async import dedupe_long_term
+        return {"status": "ok", "removed": await dedupe_long_term()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/memory")
 async def get_memory():
     try:
-        from memory import get_long_term, get_context
-        long_term = get_long_term()
-        short_term = get_context()
+        from memory_async import get_long_term, get_context
+        long_term = await get_long_term()
+        short_term = await get_context()
         return {"long_term": long_term, "short_term": short_term}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -212,20 +484,69 @@ async def get_memory():
 @app.get("/memory/snapshot")
 async def get_memory_snapshot_endpoint():
     try:
-        from memory import get_memory_snapshot
-        return get_memory_snapshot()
+        from memory_async import get_memory_snapshot
+        return await get_memory_snapshot()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/memory/export")
+def export_memory():
+    """Stream the whole memory store as NDJSON (prefs, short-term, long-term)."""
+    try:
+        from memory import export_memory_ndjson
+    except Exception:
+        raise HTTPException(status_code=500, detail="Memory service unavailable")
+    return StreamingResponse(export_memory_ndjson(), media_type="application/x-ndjson")
+
+
+@app.post("/memory/import")
+async def import_memory(request: Request):
+    """Import an NDJSON body in chunked transactions and report accepted/rejected counts."""
+    try:
+        from memory import new_import_report, reject_line, IMPORT_BATCH_SIZE, MAX_IMPORT_LINE_BYTES
+        from memory_async import import_memory_batch
+    except Exception:
+        raise HTTPException(status_code=500, detail="Memory service unavailable")
+
+    report = new_import_report()
+    batch = []
+    pending = b""
+    oversized = False  # inside a line that already went over MAX_IMPORT_LINE_BYTES
+    try:
+        async for chunk in request.stream():
+            if oversized:
+                # drop the rest of that line without buffering it
+                end = chunk.find(b"\n")
+                if end < 0:
+                    continue
+                chunk, oversized = chunk[end + 1:], False
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            if len(pending) > MAX_IMPORT_LINE_BYTES:
+                reject_line(report, "too_long")
+                pending, oversized = b"", True
+            batch.extend(lines)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await import_memory_batch(batch, report)
+                batch = []
+        if pending:
+            batch.append(pending)
+        if batch:
+            await import_memory_batch(batch, report)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Import failed after {report['accepted']} rows: {e}")
+    return report
+
+
 @app.get("/prefs")
 async def get_prefs():
     try:
-        from memory import get_prefs
+        from memory_async import get_prefs
     except Exception:
         raise HTTPException(status_code=500, detail="Memory service unavailable")
     try:
-        return get_prefs()
+        return await get_prefs()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -233,47 +554,259 @@ async def get_prefs():
 @app.delete("/memory/{entry_id}")
 async def delete_memory(entry_id: int):
     try:
-        from memory import delete_long_term
+        from memory_async import delete_long_term
     except Exception:
         raise HTTPException(status_code=500, detail="Memory service unavailable")
     try:
-        delete_long_term(entry_id)
+        await delete_long_term(entry_id)
         return {"status": "deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _query_handler():
+    """main.handle_query, imported on first use."""
+    # Lazy import the core logic to avoid pulling in optional audio / OS-specific
+    # packages during module import (which can crash the server on systems
+    # without audio libs when only text-based API is desired).
+    global _handle_query
+    if _handle_query is None:
+        with _handle_query_lock:
+            if _handle_query is None:
+                # Import using package-relative name so imports work whether the server is
+                # run from the project root or as the `backend` package under uvicorn.
+                try:
+                    from .main import handle_query
+                except Exception:
+                    from backend.main import handle_query
+                _handle_query = handle_query
+    return _handle_query
+
+
+async def _watch_query(request: Optional[Request], registry, query_id, token):
+    """Cancel `token` once the client has gone away (closed tab, aborted fetch)
+    or another worker process received POST /query/{id}/cancel for it.
+
+    Pass `request=None` for streaming responses: Starlette already cancels
+    those on disconnect, so only remote cancels are watched.
+    """
+    from config import QUERY_DISCONNECT_POLL_SECONDS
+    while not token.cancelled:
+        if request is not None and await request.is_disconnected():
+            token.cancel("client_disconnected")
+            return
+        if await run_in_threadpool(registry.poll_remote, query_id):
+            return
+        await asyncio.sleep(QUERY_DISCONNECT_POLL_SECONDS)
+
+
 @app.post("/query")
-def query(payload: QueryPayload):
+async def query(payload: QueryPayload, request: Request):
+    """Answer one input. The query can be cancelled while it runs via
+    POST /query/{id}/cancel (pass your own `id`), and is cancelled automatically
+    if the client disconnects; either way web search and the Ollama generation
+    are abandoned and the response is a 499.
+
+    Every query has a config.QUERY_DEADLINE_SECONDS budget shared by search and
+    generation; when it runs out a degraded answer comes back instead of a hang.
+
+    `mode` and `source` apply to this request only, so any worker process can
+    serve any request.
+    """
     if not payload.input or not payload.input.strip():
         raise HTTPException(status_code=400, detail="Input is required")
+    if payload.prefetch_voice:
+        _check_voice(payload.prefetch_voice)
     try:
-        # Lazy import the core logic to avoid pulling in optional audio / OS-specific
-        # packages during module import (which can crash the server on systems
-        # without audio libs when only text-based API is desired).
-        global handle_query, process_input
-        if handle_query is None or process_input is None:
-            # Import using package-relative name so imports work whether the server is
-            # run from the project root or as the `backend` package under uvicorn.
-            try:
-                from .main import handle_query as _handle_query, process_input as _process_input
-            except Exception:
-                from backend.main import handle_query as _handle_query, process_input as _process_input
-            handle_query = _handle_query
-            process_input = _process_input
+        handle_query = _query_handler()
+        from cancellation import Cancelled, get_request_registry
+        from config import QUERY_DEADLINE_SECONDS
+        from resilience import Deadline
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    deadline = Deadline(QUERY_DEADLINE_SECONDS)
+
+    response_id = payload.id or str(uuid4())
+    registry = get_request_registry()
+    try:
+        token = await run_in_threadpool(registry.register, response_id)
+    except KeyError:
+        raise HTTPException(status_code=409, detail="A query with this id is already running")
 
+    watcher = asyncio.create_task(_watch_query(request, registry, response_id, token))
+    outcome = "failed"
+    try:
         # Respect the source (voice vs text) to avoid auto-saving voice memory
-        src = payload.source or "text"
-        if payload.mode:
-            # process_input handles mode; pass source along by setting global or via wrapper
-            resp = process_input(payload.input, payload.mode, source=src)
-        else:
-            resp = handle_query(payload.input, source=src)
-        return {"response": resp}
+        resp = await run_in_threadpool(
+            handle_query, payload.input, source=payload.source or "text",
+            cancel=token, deadline=deadline, mode=payload.mode,
+        )
+        outcome = "completed"
+    except Cancelled as e:
+        outcome = "cancelled"
+        raise HTTPException(status_code=499, detail=f"Query cancelled: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        watcher.cancel()
+        await run_in_threadpool(registry.finish, response_id, outcome)
+
+    # Speculative TTS: /speak or /speak/stream with this id picks the audio up
+    if payload.prefetch_voice and resp:
+        try:
+            from tts import prefetch
+            await run_in_threadpool(prefetch, response_id, resp, payload.prefetch_voice)
+        except Exception as e:
+            print("DEBUG | TTS prefetch skipped:", e)
+    return {"response": resp, "id": response_id}
+
+
+@app.post("/query/{query_id}/cancel")
+async def cancel_query(query_id: str):
+    """Stop a running /query; it answers its caller with a 499."""
+    try:
+        from cancellation import get_request_registry
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not await run_in_threadpool(get_request_registry().cancel, query_id, "cancelled_by_client"):
+        return {"status": "not_found"}
+    return {"status": "cancelled"}
+
+
+@app.get("/query/stats")
+def query_stats():
+    """How /query requests ended (completed / failed / cancelled and why), Ollama
+    generations abandoned or cut off, and the state of each backend's circuit breaker.
+    """
+    try:
+        from brain import generation_stats
+        from cancellation import get_request_registry
+        from resilience import breaker_stats
+        return {**get_request_registry().stats(), "generation": generation_stats(), "circuits": breaker_stats()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class BatchItem(BaseModel):
+    input: str
+    mode: Optional[str] = None
+    source: Optional[str] = "text"
+
+
+class QueryBatchPayload(BaseModel):
+    items: List[BatchItem]
+    concurrency: Optional[int] = None  # queries answered at once (default config.QUERY_BATCH_CONCURRENCY)
+    id: Optional[str] = None           # POST /query/{id}/cancel stops the rest of the batch
+
+
+@app.post("/query/batch")
+async def query_batch(payload: QueryBatchPayload):
+    """Answer many inputs, streaming one NDJSON line per item as it completes.
+
+    Identical items (same input, mode and source) are answered once and the
+    answer is sent for every copy ("deduped": true on the extra ones). All items
+    share one memory snapshot taken when the batch starts and write nothing back:
+    no turns are added and "remember ..." inputs are not acted on. At most
+    `concurrency` queries run at a time, each with its own QUERY_DEADLINE_SECONDS budget.
+
+    Item lines: {"index", "input", "status": "ok" | "error" | "cancelled", "response" | "error", "deduped"};
+    the last line is {"done": true, "id", "items", "unique", "ok", "error", "cancelled", "seconds"}.
+    Disconnecting or POST /query/{id}/cancel stops the items still running.
+    """
+    try:
+        from config import QUERY_BATCH_CONCURRENCY, QUERY_BATCH_MAX_CONCURRENCY, QUERY_BATCH_MAX_ITEMS
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="At least one item is required")
+    if len(payload.items) > QUERY_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {QUERY_BATCH_MAX_ITEMS} items per batch")
+
+    try:
+        handle_query = _query_handler()
+        from cancellation import Cancelled, get_request_registry
+        from config import QUERY_DEADLINE_SECONDS
+        from memory_async import memory_view
+        from resilience import Deadline
+        view = await memory_view()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Identical inputs run once; every index that asked gets the answer
+    groups = {}  # (input, mode, source) -> [item indexes]
+    for index, item in enumerate(payload.items):
+        key = ((item.input or "").strip(), item.mode or None, item.source or "text")
+        groups.setdefault(key, []).append(index)
+
+    concurrency = max(1, min(payload.concurrency or QUERY_BATCH_CONCURRENCY, QUERY_BATCH_MAX_CONCURRENCY))
+    # Keep the id reserved for as long as the batch can run: every round of
+    # `concurrency` queries may take a full QUERY_DEADLINE_SECONDS
+    rounds = -(-len(groups) // concurrency)
+    batch_id = payload.id or str(uuid4())
+    registry = get_request_registry()
+    try:
+        token = await run_in_threadpool(registry.register, batch_id, ttl=rounds * QUERY_DEADLINE_SECONDS + 60)
+    except KeyError:
+        raise HTTPException(status_code=409, detail="A query with this id is already running")
+    limiter = asyncio.Semaphore(concurrency)
+
+    async def _answer(key):
+        text, mode, source = key
+        if not text:
+            return key, "error", "Input is required"
+        async with limiter:
+            if token.cancelled:
+                return key, "cancelled", str(token.reason)
+            try:
+                resp = await run_in_threadpool(
+                    handle_query, text, source=source, cancel=token,
+                    deadline=Deadline(QUERY_DEADLINE_SECONDS), mode=mode, view=view, persist=False,
+                )
+            except Cancelled as e:
+                return key, "cancelled", str(e)
+            except Exception as e:
+                return key, "error", str(e)
+        return key, "ok", resp
+
+    async def _lines():
+        started = time.monotonic()
+        counts = {"ok": 0, "error": 0, "cancelled": 0}
+        # POST /query/{id}/cancel may land on another worker process
+        watcher = asyncio.create_task(_watch_query(None, registry, batch_id, token))
+        tasks = [asyncio.create_task(_answer(key)) for key in groups]
+        outcome = "cancelled"  # unless we get to the end: the client went away mid-stream
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                key, status, value = await next_done
+                for n, index in enumerate(groups[key]):
+                    counts[status] += 1
+                    line = {"index": index, "input": payload.items[index].input, "status": status, "deduped": n > 0}
+                    line["response" if status == "ok" else "error"] = value
+                    yield json.dumps(line, ensure_ascii=False) + "\n"
+            outcome = "cancelled" if token.cancelled else "completed"
+            yield json.dumps({
+                "done": True, "id": batch_id, "items": len(payload.items), "unique": len(groups),
+                **counts, "seconds": round(time.monotonic() - started, 3),
+            }) + "\n"
+        finally:
+            if outcome != "completed":
+                token.cancel("client_disconnected")
+            watcher.cancel()
+            for task in tasks:
+                task.cancel()
+            # On disconnect Starlette cancels this generator; unshielded, the
+            # threadpool call would be cancelled too and the id never released
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(registry.finish, batch_id, outcome)
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("backend.api:app", host="0.0.0.0", port=8000, reload=True)
+    from config import API_WORKERS
+
+    if API_WORKERS > 1:
+        # Scale /query across cores; shared state lives in config.SHARED_STATE_PATH
+        uvicorn.run("backend.api:app", host="0.0.0.0", port=8000, workers=API_WORKERS)
+    else:
+        uvicorn.run("backend.api:app", host="0.0.0.0", port=8000, reload=True)
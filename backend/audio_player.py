@@ -1,99 +1,377 @@
+import numpy as np
 import sounddevice as sd
 import soundfile as sf
 import threading
+import time
+from collections import deque
+from uuid import uuid4
+
+from config import PLAYBACK_TTL_SECONDS, PLAYBACK_BLOCK_FRAMES
+
+QUEUED, PLAYING, DONE, STOPPED, FAILED = "queued", "playing", "done", "stopped", "failed"
+_FINISHED = (DONE, STOPPED, FAILED)
+ACTIVE_TTL_SECONDS = 3600   # shared status of a clip that hasn't finished yet
+STOP_POLL_SECONDS = 0.1     # how often stop requests from other worker processes are checked
+CHANNEL_IDLE_SECONDS = 30.0  # a channel with nothing queued for this long loses its worker thread
 
-# Single global controller to manage/interrupt current playback
-_current_controller = None
-_current_lock = threading.Lock()
 
 class PlaybackController:
-    """Controller handle returned by `play_wav_in_app`.
+    """Handle for one scheduled clip, returned by `play_wav_in_app` / `play_array_in_app`.
 
-    Call `.stop()` to interrupt playback immediately (calls `sd.stop()`).
+    `state` moves queued -> playing -> done, or to stopped / failed. Call
+    `.stop()` to drop a queued clip or interrupt it while playing. `on_done`
+    runs exactly once however the clip ends, so temp files are always removed.
     """
 
-    def __init__(self):
-        self._stopped = False
+    def __init__(self, load, on_done=None, volume: float = 1.0, channel: str = "default"):
+        self.id = str(uuid4())
+        self.channel = channel
+        self.volume = volume
+        self.state = QUEUED
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._load = load
+        self._on_done = on_done
+        self._lock = threading.Lock()
+        self._publish = None  # set by the scheduler: shares state changes with other processes
+
+    def _changed(self):
+        if self._publish is not None:
+            self._publish(self)
 
     def stop(self):
-        try:
-            sd.stop()
-        finally:
-            self._stopped = True
+        with self._lock:
+            state = self.state
+            if state in _FINISHED:
+                return
+            self.state = STOPPED
+        # A playing clip notices on its next audio block; one that never
+        # reached the device is cleaned up now and skipped by the channel worker.
+        if state != PLAYING:
+            self._finish(STOPPED)
+        else:
+            self._changed()
 
     @property
     def stopped(self):
-        return self._stopped
+        return self.state == STOPPED
+
+    def status(self) -> dict:
+        return {
+            "id": self.id,
+            "channel": self.channel,
+            "status": self.state,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def _begin(self) -> bool:
+        with self._lock:
+            if self.state != QUEUED:
+                return False
+            self.state = PLAYING
+        self._changed()
+        return True
+
+    def _finish(self, state, error=None):
+        with self._lock:
+            if self.finished_at is not None:
+                return
+            if self.state != STOPPED:
+                self.state = state
+            self.error = error
+            self.finished_at = time.time()
+            on_done, self._on_done = self._on_done, None
+        try:
+            if on_done:
+                on_done()
+        except Exception:
+            pass
+        self._changed()
+
+
+# ---------- block sources ----------
+# Each fills the stream's float32 (frames, channels) buffer in place and returns
+# how many frames it wrote; fewer than requested means the clip has ended.
+class _ArraySource:
+    def __init__(self, data, samplerate):
+        data = np.asarray(data, dtype=np.float32)
+        self.data = data.reshape(-1, 1) if data.ndim == 1 else data
+        self.samplerate = samplerate
+        self.channels = self.data.shape[1]
+        self.pos = 0
+
+    def read_into(self, out):
+        n = min(len(out), len(self.data) - self.pos)
+        out[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def close(self):
+        pass
+
+
+class _PCMSource(_ArraySource):
+    """Mono int16 PCM bytes, converted to float one block at a time."""
+
+    def __init__(self, pcm, samplerate):
+        self.data = np.frombuffer(pcm, dtype=np.int16)
+        self.samplerate = samplerate
+        self.channels = 1
+        self.pos = 0
+
+    def read_into(self, out):
+        n = min(len(out), len(self.data) - self.pos)
+        np.multiply(self.data[self.pos:self.pos + n], 1.0 / 32768.0, out=out[:n, 0], casting="unsafe")
+        self.pos += n
+        return n
+
+
+class _FileSource:
+    def __init__(self, path):
+        self.file = sf.SoundFile(path)
+        self.samplerate = self.file.samplerate
+        self.channels = self.file.channels
+
+    def read_into(self, out):
+        return len(self.file.read(dtype="float32", always_2d=True, out=out))
+
+    def close(self):
+        self.file.close()
+
+
+def _play_blocking(controller: PlaybackController, blocksize=PLAYBACK_BLOCK_FRAMES):
+    """Stream the clip block by block; volume is applied per block and a stop lands within one block."""
+    source = controller._load()
+    finished = threading.Event()
+    volume = float(controller.volume)
+
+    def _callback(outdata, frames, time_info, status):
+        if controller.stopped:
+            outdata.fill(0)
+            raise sd.CallbackStop
+        n = source.read_into(outdata)
+        if volume != 1.0:
+            np.multiply(outdata[:n], volume, out=outdata[:n])
+            np.clip(outdata[:n], -1.0, 1.0, out=outdata[:n])
+        if n < frames:
+            outdata[n:] = 0
+            raise sd.CallbackStop
+
+    try:
+        if controller.stopped:
+            return
+        with sd.OutputStream(
+            samplerate=source.samplerate,
+            channels=source.channels,
+            dtype="float32",
+            blocksize=blocksize,
+            callback=_callback,
+            finished_callback=finished.set,
+        ):
+            finished.wait()
+    finally:
+        source.close()
+
+
+class PlaybackScheduler:
+    """Per-channel FIFO queues of clips, each drained by its own worker thread.
+
+    Finished controllers stay queryable for `ttl` seconds, then are dropped
+    from the registry so a long-running server doesn't accumulate them.
 
+    A channel's worker exits, and the channel is forgotten, once it has been
+    idle for `idle_seconds`, so clients naming many channels don't leave
+    threads behind.
 
-def play_wav_in_app(wav_path, on_done=None, volume: float = 1.0):
+    With `shared`, every state change is also written to the shared store, so
+    `status` / `stop` work for clips scheduled by another API worker process;
+    the owning process polls for stop requests while it has channels open.
+    """
+
+    def __init__(self, ttl=PLAYBACK_TTL_SECONDS, shared=False, idle_seconds=CHANNEL_IDLE_SECONDS):
+        self.ttl = ttl
+        self.shared = shared
+        self.idle_seconds = idle_seconds
+        self._items = {}     # id -> PlaybackController
+        self._queues = {}    # channel -> deque of PlaybackController
+        self._current = {}   # channel -> PlaybackController playing now
+        self._cond = threading.Condition()
+        self._watching = False
+
+    def _store(self):
+        from shared_state import get_shared_store
+        return get_shared_store()
+
+    def _publish(self, controller):
+        try:
+            ttl = self.ttl if controller.finished_at else ACTIVE_TTL_SECONDS
+            self._store().put("playback", controller.id, controller.status(), ttl)
+        except Exception as e:
+            print("DEBUG | playback status not shared:", e)
+
+    def _watch_stops(self):
+        while True:
+            time.sleep(STOP_POLL_SECONDS)
+            with self._cond:
+                if not self._queues:
+                    # every channel has gone idle; the next one to start restarts the watcher
+                    self._watching = False
+                    return
+                active = {c.id: c for c in self._items.values() if c.state in (QUEUED, PLAYING)}
+            if not active:
+                continue
+            try:
+                requested = self._store().keys("playback:stop")
+            except Exception as e:
+                print("DEBUG | playback stop requests unavailable:", e)
+                continue
+            for play_id in requested & active.keys():
+                active[play_id].stop()
+
+    def schedule(self, controller: PlaybackController, interrupt=False) -> PlaybackController:
+        """Queue `controller` on its channel; `interrupt` first stops everything already there."""
+        if interrupt:
+            self.stop_channel(controller.channel)
+        if self.shared:
+            controller._publish = self._publish
+            self._publish(controller)
+        with self._cond:
+            self._evict()
+            self._items[controller.id] = controller
+            if controller.channel not in self._queues:
+                self._queues[controller.channel] = deque()
+                threading.Thread(
+                    target=self._worker, args=(controller.channel,),
+                    name=f"playback-{controller.channel}", daemon=True,
+                ).start()
+                if self.shared and not self._watching:
+                    self._watching = True
+                    threading.Thread(target=self._watch_stops, name="playback-stops", daemon=True).start()
+            self._queues[controller.channel].append(controller)
+            self._cond.notify_all()
+        return controller
+
+    def _worker(self, channel):
+        queue = self._queues[channel]
+        while True:
+            with self._cond:
+                idle_until = time.monotonic() + self.idle_seconds
+                while not queue:
+                    remaining = idle_until - time.monotonic()
+                    if remaining <= 0:
+                        # schedule() holds the same lock, so nothing can be queued here meanwhile
+                        del self._queues[channel]
+                        return
+                    self._cond.wait(remaining)
+                controller = queue.popleft()
+                self._current[channel] = controller
+            try:
+                if controller._begin():
+                    _play_blocking(controller)
+                    controller._finish(DONE)
+            except Exception as e:
+                print("DEBUG | playback failed:", e)
+                controller._finish(FAILED, str(e))
+            finally:
+                # Covers clips stopped while queued and any path that skipped _finish
+                controller._finish(STOPPED)
+                with self._cond:
+                    self._current.pop(channel, None)
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl
+        for pid in [pid for pid, c in self._items.items() if c.finished_at and c.finished_at < cutoff]:
+            del self._items[pid]
+
+    def get(self, play_id):
+        with self._cond:
+            self._evict()
+            return self._items.get(play_id)
+
+    def status(self, play_id):
+        """Status dict of a clip scheduled by this or (when shared) another process, or None."""
+        controller = self.get(play_id)
+        if controller is not None:
+            return controller.status()
+        return self._store().get("playback", play_id) if self.shared else None
+
+    def stop(self, play_id):
+        """Stop a clip scheduled by this or (when shared) another process; returns its status or None."""
+        controller = self.get(play_id)
+        if controller is not None:
+            controller.stop()
+            return controller.status()
+        if not self.shared:
+            return None
+        store = self._store()
+        status = store.get("playback", play_id)
+        if status is not None and status["status"] in (QUEUED, PLAYING):
+            # The owning process stops it within STOP_POLL_SECONDS
+            store.put("playback:stop", play_id, {}, self.ttl)
+            status["status"] = STOPPED
+        return status
+
+    def stop_channel(self, channel):
+        with self._cond:
+            pending = list(self._queues.get(channel, ()))
+            current = self._current.get(channel)
+        for controller in pending + ([current] if current else []):
+            controller.stop()
+
+    def stop_all(self):
+        with self._cond:
+            channels = list(self._queues)
+        for channel in channels:
+            self.stop_channel(channel)
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._evict()
+            states = {}
+            for c in self._items.values():
+                states[c.state] = states.get(c.state, 0) + 1
+            return {"tracked": len(self._items), "states": states,
+                    "queued": {ch: len(q) for ch, q in self._queues.items()}}
+
+
+_scheduler = PlaybackScheduler(shared=True)
+
+
+def get_scheduler() -> PlaybackScheduler:
+    return _scheduler
+
+
+def play_wav_in_app(wav_path, on_done=None, volume: float = 1.0, channel: str = "default", interrupt=False):
     """
     Plays WAV audio directly in-app (no external player).
-    Non-blocking. Returns a `PlaybackController` that can be used to interrupt playback.
+    Non-blocking: the clip is queued behind earlier clips on `channel` (or replaces
+    them when `interrupt` is set). Returns a `PlaybackController`.
 
     Parameters:
     - wav_path: path to wav file
-    - on_done: optional callable invoked when playback finishes or is stopped
+    - on_done: optional callable invoked once when playback finishes, fails or is stopped
+      (including while still queued) — use it to delete temp files
     - volume: float 0.0-1.0 to scale playback amplitude
     """
+    controller = PlaybackController(lambda: _FileSource(wav_path), on_done, volume, channel)
+    return _scheduler.schedule(controller, interrupt)
 
-    def _play(controller: PlaybackController):
-        try:
-            data, samplerate = sf.read(wav_path, dtype="float32")
-
-            # Apply volume scaling if needed (try numpy for performance, fallback otherwise)
-            if volume != 1.0:
-                try:
-                    import numpy as _np
-                    data = data * float(volume)
-                    data = _np.clip(data, -1.0, 1.0)
-                except Exception:
-                    # Fallback: elementwise scaling (slower)
-                    try:
-                        data = (data * float(volume)).tolist()
-                    except Exception:
-                        pass
-
-            if controller.stopped:
-                return
 
-            sd.play(data, samplerate)
-            sd.wait()
-        finally:
-            try:
-                if on_done:
-                    on_done()
-            except Exception:
-                pass
-            # Clear global controller when finished
-            with _current_lock:
-                global _current_controller
-                if _current_controller is controller:
-                    _current_controller = None
-
-    controller = PlaybackController()
-
-    # Stop any existing playback and replace with this controller
-    with _current_lock:
-        global _current_controller
-        if _current_controller:
-            try:
-                _current_controller.stop()
-            except Exception:
-                pass
-        _current_controller = controller
+def play_array_in_app(data, samplerate, on_done=None, volume: float = 1.0, channel: str = "default", interrupt=False):
+    """Like `play_wav_in_app`, for float32 samples already in memory."""
+    controller = PlaybackController(lambda: _ArraySource(data, samplerate), on_done, volume, channel)
+    return _scheduler.schedule(controller, interrupt)
+
 
-    threading.Thread(target=_play, args=(controller,), daemon=True).start()
-    return controller
+def play_pcm_in_app(pcm: bytes, samplerate, on_done=None, volume: float = 1.0, channel: str = "default", interrupt=False):
+    """Like `play_wav_in_app`, for mono int16 PCM bytes (as produced by piper)."""
+    controller = PlaybackController(lambda: _PCMSource(pcm, samplerate), on_done, volume, channel)
+    return _scheduler.schedule(controller, interrupt)
 
 
 def stop_all():
-    """Stop any active playback immediately."""
-    with _current_lock:
-        global _current_controller
-        if _current_controller:
-            try:
-                _current_controller.stop()
-            except Exception:
-                pass
-            _current_controller = None
+    """Stop any active or queued playback immediately."""
+    _scheduler.stop_all()
@@ -0,0 +1,148 @@
+# barge_in.py
+# Lets the user interrupt the assistant. Each answered input is a Turn (a
+# CancelToken); while it is being answered and spoken the microphone is
+# watched, and speech cancels the turn: playback stops within one audio block,
+# the streaming LLM request is closed and pending TTS is dropped.
+
+import threading
+
+from cancellation import CancelToken
+from config import (
+    BARGE_IN_ENABLED, BARGE_IN_HOLD_MS, BARGE_IN_MIN_RMS, BARGE_IN_NOISE_RATIO,
+    BARGE_IN_HEADPHONES, BARGE_IN_ECHO_RATIO, BARGE_IN_ECHO_MIN_RMS,
+)
+
+MIC_SAMPLE_RATE = 16000
+MIC_BLOCK_MS = 10
+
+
+class Turn(CancelToken):
+    """One user input and everything done to answer it (generation, synthesis, playback)."""
+
+    def __init__(self):
+        super().__init__()
+        self.barged_in = False
+        self._busy = 0
+        self._playback = []
+
+    def begin(self):
+        """Mark background work (e.g. TTS synthesis) as running for this turn."""
+        with self._lock:
+            self._busy += 1
+
+    def end(self):
+        with self._lock:
+            self._busy -= 1
+
+    def track_playback(self, controller):
+        """Playback started for this turn: stop it if the turn is cancelled."""
+        with self._lock:
+            self._playback.append(controller)
+        self.on_cancel(controller.stop)
+
+    @property
+    def active(self) -> bool:
+        """Still generating, synthesizing or speaking."""
+        with self._lock:
+            if self._busy > 0:
+                return True
+            playback = list(self._playback)
+        return any(c.state in ("queued", "playing") for c in playback)
+
+    @property
+    def speaking(self) -> bool:
+        """Audio for this turn is coming out of the speakers right now."""
+        with self._lock:
+            playback = list(self._playback)
+        return any(c.state == "playing" for c in playback)
+
+
+class BargeInController:
+    """Owns the current Turn and the microphone watcher that can cancel it."""
+
+    def __init__(self, enabled=BARGE_IN_ENABLED, headphones=BARGE_IN_HEADPHONES):
+        self.enabled = enabled
+        self.headphones = headphones
+        self.current = None
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def new_turn(self, listen=True) -> Turn:
+        """Cancel whatever is left of the previous turn and start a new one.
+
+        With `listen`, the mic is watched from now until `wait_for_user`.
+        """
+        previous = self.current
+        if previous is not None:
+            previous.cancel("superseded")
+        turn = Turn()
+        self.current = turn
+        if listen and self.enabled:
+            self._listen(turn)
+        return turn
+
+    def interrupt(self):
+        """Cancel the current turn now (e.g. the user pressed the mic button)."""
+        turn = self.current
+        if turn is not None and turn.cancel("interrupted"):
+            turn.barged_in = True
+
+    def wait_for_user(self, poll=0.02) -> bool:
+        """Block until the current turn has finished speaking or the user barged in.
+
+        Closes the mic watcher so capture can start; returns True on barge-in.
+        """
+        turn = self.current
+        try:
+            while turn is not None and turn.active and not turn.cancelled:
+                turn.wait(poll)
+        finally:
+            self._stop_listening()
+        return bool(turn is not None and turn.barged_in)
+
+    # ---------- microphone ----------
+    def _listen(self, turn):
+        self._stop_listening()
+        try:
+            import sounddevice as sd
+            from vad import SpeechOnsetDetector
+        except Exception as e:
+            print("DEBUG | barge-in unavailable (missing deps):", e)
+            return
+
+        detector = SpeechOnsetDetector(
+            MIC_SAMPLE_RATE, frame_ms=MIC_BLOCK_MS, hold_ms=BARGE_IN_HOLD_MS,
+            ratio=BARGE_IN_NOISE_RATIO, min_rms=BARGE_IN_MIN_RMS,
+            echo_ratio=BARGE_IN_ECHO_RATIO, echo_min_rms=BARGE_IN_ECHO_MIN_RMS,
+        )
+        # on headphones the mic never hears the reply, so no echo thresholds
+        echo = not self.headphones
+
+        def _callback(indata, frames, time_info, status):
+            if turn.cancelled or not detector.push(indata[:, 0], playing=echo and turn.speaking):
+                return
+            turn.barged_in = True
+            # Cancel off the audio thread; stopping playback is just a flag per block
+            threading.Thread(target=turn.cancel, args=("barge-in",), daemon=True).start()
+
+        try:
+            stream = sd.InputStream(
+                samplerate=MIC_SAMPLE_RATE, channels=1, dtype="float32",
+                blocksize=int(MIC_SAMPLE_RATE * MIC_BLOCK_MS / 1000), callback=_callback,
+            )
+            stream.start()
+        except Exception as e:
+            print("DEBUG | barge-in mic unavailable:", e)
+            return
+        with self._lock:
+            self._stream = stream
+
+    def _stop_listening(self):
+        with self._lock:
+            stream, self._stream = self._stream, None
+        if stream is not None:
+            try:
+                stream.stop()
+                stream.close()
+            except Exception:
+                pass
@@ -1,9 +1,179 @@
 # brain.py
 
+import json
+import socket
+import threading
+
 import requests
-from config import OLLAMA_URL, BRAIN_MODEL
+from config import OLLAMA_URL, BRAIN_MODEL, OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT, OLLAMA_RETRIES
+from resilience import DeadlineExceeded, get_breaker
+
+# Generations started / abandoned because their CancelToken fired / cut off by their deadline
+_stats = {"generations": 0, "cancelled": 0, "timed_out": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def generation_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+class _ServerError(Exception):
+    """Ollama answered 5xx (overloaded / restarting); worth retrying."""
+
+
+# Failures that say Ollama itself is down or hanging; these trip the circuit
+_RETRYABLE = (requests.ConnectionError, requests.Timeout, _ServerError)
+
+
+def _open_stream(payload, read_timeout):
+    response = requests.post(
+        f"{OLLAMA_URL}/api/generate", json=payload, stream=True,
+        timeout=(OLLAMA_CONNECT_TIMEOUT, read_timeout),
+    )
+    if response.status_code >= 500:
+        response.close()
+        raise _ServerError(f"Ollama returned HTTP {response.status_code}")
+    response.raise_for_status()
+    return response
+
+
+def _abort(response):
+    """Drop the connection under a streaming response from another thread.
+
+    response.close() alone does not wake a reader blocked in recv(); shutting
+    the socket down does, and Ollama stops generating once the socket is gone.
+    The socket comes from urllib3's public `HTTPResponse.connection`; when it
+    is not there (older urllib3, connection already released) the response is
+    only closed and the reader stops at its next line or read timeout.
+    """
+    sock = getattr(getattr(response.raw, "connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError as e:
+            print("DEBUG | could not shut down Ollama socket:", e)
+    try:
+        response.close()
+    except Exception as e:
+        print("DEBUG | could not close Ollama response:", e)
+
+
+def _stream_generate(payload, cancel=None, deadline=None, parts=None) -> str:
+    """POST a streaming /api/generate request and join the tokens.
+
+    Opening the stream goes through the Ollama circuit breaker with jittered
+    retries; once tokens flow nothing is retried. Checks `cancel` and
+    `deadline` on every streamed line; closing the connection early is what
+    makes Ollama stop generating. While the stream is open, cancelling drops
+    the connection at once (even mid-read). Tokens are appended to `parts` as
+    they arrive.
+    """
+    parts = [] if parts is None else parts
+    read_timeout = OLLAMA_READ_TIMEOUT
+    if deadline is not None:
+        read_timeout = max(0.1, min(read_timeout, deadline.remaining()))
+    breaker = get_breaker("ollama")
+    try:
+        response = breaker.call(
+            _open_stream, payload, read_timeout,
+            retries=OLLAMA_RETRIES, deadline=deadline, retry_on=_RETRYABLE,
+        )
+    except requests.Timeout as e:
+        if deadline is not None and deadline.expired:
+            raise DeadlineExceeded("generation ran out of time") from e
+        raise
+    hook = cancel.on_cancel(lambda: _abort(response)) if cancel is not None else None
+    try:
+        for line in response.iter_lines():
+            if cancel is not None:
+                cancel.check()
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceeded("generation ran out of time", partial="".join(parts))
+            if not line:
+                continue
+            chunk = json.loads(line)
+            parts.append(chunk.get("response", ""))
+            if chunk.get("done"):
+                break
+    except Exception as e:
+        if cancel is not None and cancel.cancelled:
+            # the read failed because the cancel hook dropped the connection
+            cancel.check()
+        if isinstance(e, _RETRYABLE) and deadline is not None and deadline.expired:
+            # the read timeout was cut down to our budget (requests reports it
+            # mid-stream as a ConnectionError): we ran out of time, Ollama didn't fail
+            raise DeadlineExceeded("generation ran out of time", partial="".join(parts)) from e
+        if isinstance(e, _RETRYABLE):
+            # Stalled or dropped mid-answer
+            breaker.record_failure()
+        raise
+    finally:
+        if hook is not None:
+            cancel.remove(hook)
+        response.close()
+    return "".join(parts)
+
+
+def _generate(payload, cancel=None, deadline=None) -> str:
+    _count("generations")
+    if cancel is None and deadline is None:
+        return _stream_generate(payload)
+
+    # The request runs on a helper thread so the caller is released the moment
+    # `cancel` fires or the deadline passes, even while Ollama is still
+    # evaluating the prompt; the helper drops the connection as soon as it
+    # next hears from Ollama (or its read timeout, capped by the deadline, hits).
+    result = {}
+    parts = []
+    finished = threading.Event()
+
+    def _run():
+        try:
+            result["text"] = _stream_generate(payload, cancel, deadline, parts)
+        except BaseException as e:
+            result["error"] = e
+        finally:
+            finished.set()
+
+    threading.Thread(target=_run, name="ollama-generate", daemon=True).start()
+    hook = cancel.on_cancel(finished.set) if cancel is not None else None
+    try:
+        finished.wait(deadline.remaining() if deadline is not None else None)
+    finally:
+        if hook is not None:
+            cancel.remove(hook)
+    if cancel is not None and cancel.cancelled:
+        _count("cancelled")
+        cancel.check()
+    error = result.get("error")
+    if not finished.is_set() or isinstance(error, DeadlineExceeded):
+        _count("timed_out")
+        raise DeadlineExceeded("generation ran out of time", partial="".join(parts))
+    if error is not None:
+        raise error
+    return result["text"]
+
+
+def think(user_text, extra_context="", max_tokens=120, cancel=None, deadline=None):
+    """Generate an answer with BRAIN_MODEL.
+
+    The reply is streamed from Ollama. If `cancel` (a CancelToken) fires,
+    `Cancelled` is raised right away and the generation is abandoned. With a
+    `deadline` (resilience.Deadline) the generation gets only the time left;
+    when it runs out `DeadlineExceeded` is raised carrying the partial answer.
+    Raises `CircuitOpen` while Ollama is considered down.
+    """
+    if cancel is not None:
+        cancel.check()
+    if deadline is not None:
+        deadline.check()
 
-def think(user_text, extra_context="", max_tokens=120):
     with open("system_prompt.txt", "r", encoding="utf-8") as f:
         system_prompt = f.read()
 
@@ -17,19 +187,18 @@ User:
 {user_text}
 """
 
-    response = requests.post(
-        f"{OLLAMA_URL}/api/generate",
-        json={
+    return _generate(
+        {
             "model": BRAIN_MODEL,
             "prompt": prompt,
-            "stream": False,
+            "stream": True,
             "options": {
                 "temperature": 0.6,
                 "num_ctx": 2048,
                 "num_predict": max_tokens,
                 "top_p": 0.9
             }
-        }
+        },
+        cancel,
+        deadline,
     )
-
-    return response.json()["response"]
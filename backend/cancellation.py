@@ -0,0 +1,165 @@
+# cancellation.py
+# Cooperative cancellation for in-flight work (LLM generation, TTS, playback).
+# A CancelToken is handed down to the code doing the work; whoever owns the
+# request / voice turn cancels it, and registered callbacks abort blocking I/O.
+
+import os
+import threading
+import time
+
+
+class Cancelled(Exception):
+    """Raised by work that noticed its CancelToken was cancelled."""
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.reason = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason="cancelled") -> bool:
+        """Cancel once and run the registered callbacks; returns False if already cancelled."""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                print("DEBUG | cancel callback failed:", e)
+        return True
+
+    def on_cancel(self, fn):
+        """Call `fn` on cancellation (right away if already cancelled); returns `fn` for `remove`."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return fn
+        try:
+            fn()
+        except Exception as e:
+            print("DEBUG | cancel callback failed:", e)
+        return fn
+
+    def remove(self, fn):
+        with self._lock:
+            if fn in self._callbacks:
+                self._callbacks.remove(fn)
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+    def wait(self, timeout=None) -> bool:
+        return self._event.wait(timeout)
+
+
+class CancelRegistry:
+    """Tokens of in-flight requests by id, so they can be cancelled from elsewhere
+    (another endpoint, a disconnect watcher), plus counts of how requests ended.
+
+    With a `store` (shared_state.SharedStore) running ids are also recorded
+    there, so a cancel arriving at another worker process is left as a request
+    that the owning process picks up in `poll_remote`. Counts are per process.
+    """
+
+    OUTCOMES = ("completed", "failed", "cancelled")
+
+    def __init__(self, store=None, namespace="request", ttl=3600):
+        self._running = {}  # request id -> (CancelToken, start time)
+        self._lock = threading.Lock()
+        self._stats = {"started": 0, **{o: 0 for o in self.OUTCOMES}}
+        self._reasons = {}
+        self._cancelled_seconds = 0.0
+        self._store = store
+        self._ns = namespace
+        self._ttl = ttl  # how long a crashed process's ids stay reserved
+
+    def register(self, request_id, token=None, ttl=None) -> CancelToken:
+        """Track a new request; raises KeyError if `request_id` is already running (in any process).
+
+        `ttl` overrides the registry default for requests expected to run longer.
+        """
+        token = token or CancelToken()
+        with self._lock:
+            if request_id in self._running:
+                raise KeyError(request_id)
+            if self._store is not None and not self._store.add(self._ns, request_id, {"pid": os.getpid()}, ttl or self._ttl):
+                raise KeyError(request_id)
+            self._running[request_id] = (token, time.monotonic())
+            self._stats["started"] += 1
+        return token
+
+    def get(self, request_id):
+        with self._lock:
+            entry = self._running.get(request_id)
+        return entry[0] if entry else None
+
+    def cancel(self, request_id, reason="cancelled") -> bool:
+        """Cancel a running request; False if it is unknown or already finished."""
+        token = self.get(request_id)
+        if token is not None:
+            return token.cancel(reason)
+        if self._store is not None and self._store.get(self._ns, request_id) is not None:
+            # Running in another worker process
+            self._store.put(self._ns + ":cancel", request_id, {"reason": reason}, self._ttl)
+            return True
+        return False
+
+    def poll_remote(self, request_id) -> bool:
+        """Apply a cancel request another process left for `request_id`; True if it was cancelled."""
+        if self._store is None:
+            return False
+        request = self._store.get(self._ns + ":cancel", request_id)
+        token = self.get(request_id)
+        return request is not None and token is not None and token.cancel(request.get("reason", "cancelled"))
+
+    def finish(self, request_id, outcome):
+        """Stop tracking `request_id`; `outcome` is one of OUTCOMES."""
+        with self._lock:
+            entry = self._running.pop(request_id, None)
+            if entry is None:
+                return
+            token, started = entry
+            self._stats[outcome] += 1
+            if outcome == "cancelled":
+                self._reasons[token.reason] = self._reasons.get(token.reason, 0) + 1
+                self._cancelled_seconds += time.monotonic() - started
+        if self._store is not None:
+            self._store.delete(self._ns, request_id)
+            self._store.delete(self._ns + ":cancel", request_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "active": len(self._running),
+                "cancel_reasons": dict(self._reasons),
+                # time spent on requests before they were cancelled (work thrown away)
+                "cancelled_seconds": round(self._cancelled_seconds, 3),
+            }
+
+
+_requests = None
+_requests_lock = threading.Lock()
+
+
+def get_request_registry() -> CancelRegistry:
+    """Registry of in-flight API queries (see api.query), shared across worker processes."""
+    global _requests
+    if _requests is None:
+        with _requests_lock:
+            if _requests is None:
+                from config import QUERY_DEADLINE_SECONDS
+                from shared_state import get_shared_store
+                _requests = CancelRegistry(get_shared_store(), "query", ttl=QUERY_DEADLINE_SECONDS + 60)
+    return _requests
@@ -0,0 +1,81 @@
+# compactor.py
+# Background compaction of short-term memory into a rolling conversation summary.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import OLLAMA_URL, ROUTER_MODEL, SUMMARY_TOKEN_THRESHOLD, SUMMARY_KEEP_RECENT
+from tokens import estimate_tokens
+
+# One worker is enough: compactions are serialized and never run on the request path
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-compactor")
+_pending = False
+_pending_lock = threading.Lock()
+
+
+def _summarize(previous_summary: str, rows) -> str:
+    import requests
+
+    turns = "\n".join(f"{r['role'].capitalize()}: {r['content']}" for r in rows)
+    prompt = (
+        "Update the running summary of a conversation between a user and an assistant.\n"
+        "Keep facts, names, decisions and open questions. Drop pleasantries.\n"
+        "Write at most 5 short sentences. Output only the summary.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\n"
+        f"New turns:\n{turns}\n"
+    )
+    response = requests.post(
+        f"{OLLAMA_URL}/api/generate",
+        json={
+            "model": ROUTER_MODEL,
+            "prompt": prompt,
+            "stream": False,
+            "options": {"temperature": 0.2, "num_ctx": 2048, "num_predict": 160},
+        },
+        timeout=120,
+    )
+    # an error body must never be stored as the summary
+    response.raise_for_status()
+    return response.json()["response"].strip()
+
+
+def compact(db, threshold=SUMMARY_TOKEN_THRESHOLD, keep_recent=SUMMARY_KEEP_RECENT):
+    """Fold older short-term turns into the summary row if they exceed `threshold` tokens.
+
+    Returns True when a new summary was written; False as well when another
+    worker process stored a newer summary while this one was being generated.
+    """
+    current = db.get_summary()
+    after_id = current["last_row_id"] if current else 0
+    rows = db.get_short_term_since(after_id)
+    if len(rows) <= keep_recent:
+        return False
+    if sum(estimate_tokens(r["content"]) for r in rows) <= threshold:
+        return False
+
+    older = rows[:-keep_recent] if keep_recent else rows
+    summary = _summarize(current["summary"] if current else "", older)
+    if not summary:
+        return False
+    return db.set_summary(summary, older[-1]["id"], expected_last_row_id=after_id)
+
+
+def _run(db):
+    global _pending
+    try:
+        compact(db)
+    except Exception as e:
+        print("DEBUG | memory compaction failed:", e)
+    finally:
+        with _pending_lock:
+            _pending = False
+
+
+def schedule_compaction(db):
+    """Queue a background compaction unless one is already queued or running."""
+    global _pending
+    with _pending_lock:
+        if _pending:
+            return
+        _pending = True
+    _executor.submit(_run, db)
@@ -1,4 +1,5 @@
 # config.py
+import os
 
 OLLAMA_URL = "http://localhost:11434"
 
@@ -21,3 +22,89 @@ OPINION_MODE = "blunt"
 VOICE_ENABLED = True
 VOICE_INPUT = True
 VOICE_OUTPUT = True
+
+# Short-term memory compaction: once the unsummarized turns exceed this many
+# (estimated) tokens, older turns are folded into a rolling summary by ROUTER_MODEL.
+SUMMARY_TOKEN_THRESHOLD = 600
+SUMMARY_KEEP_RECENT = 4  # rows (user + assistant) kept verbatim after compaction
+
+# Web search: providers are queried concurrently and merged (see web_search.py)
+SEARCH_PROVIDERS = ["duckduckgo", "wikipedia"]
+SEARCH_TIMEOUT = 4.0          # seconds to wait for providers on a cache miss
+SEARCH_CACHE_TTL = 6 * 3600   # seconds a cached result list stays fresh
+SEARCH_CACHE_PATH = "search_cache.db"
+SEARCH_RETRIES = 1            # extra attempts per failing provider, within the search timeout
+
+# Time budgets and circuit breakers (see resilience.py). A /query gets
+# QUERY_DEADLINE_SECONDS in total; search stops early so the model keeps at
+# least LLM_MIN_BUDGET_SECONDS, and when time runs out a degraded answer is returned.
+QUERY_DEADLINE_SECONDS = 45.0
+LLM_MIN_BUDGET_SECONDS = 8.0
+OLLAMA_CONNECT_TIMEOUT = 3.0
+OLLAMA_READ_TIMEOUT = 120.0   # longest silence between streamed tokens when no deadline is set
+OLLAMA_RETRIES = 1            # connection / 5xx retries before any token has streamed
+RETRY_BASE_DELAY = 0.25       # full-jitter backoff: sleep uniform(0, base * 2**attempt)
+CIRCUIT_FAILURE_THRESHOLD = 3 # consecutive failures that open a backend's circuit
+CIRCUIT_RESET_SECONDS = 20.0  # how long an open circuit refuses calls before a trial call
+
+# Search evidence is compressed to roughly this many tokens before prompting
+EVIDENCE_TOKEN_BUDGET = 500
+
+# Speech-to-text (faster-whisper). "auto" picks CUDA when available, else CPU + int8.
+STT_MODEL_SIZE = "small"
+STT_MODEL_TIERS = ["tiny", "base", "small"]  # smallest -> largest; /stt picks one per clip
+STT_COMMAND_SECONDS = 3.0    # clips this short (voice commands) drop one tier
+STT_ESCALATE_LOGPROB = -0.8  # re-run on the next tier up when avg_logprob is below this
+STT_DEVICE = "auto"          # auto | cpu | cuda
+STT_COMPUTE_TYPE = "auto"    # auto | int8 | int8_float16 | float16 | float32
+STT_CPU_THREADS = 0          # 0 = let CTranslate2 decide
+STT_WARMUP = False           # load the model in the background when the API starts
+STT_MAX_UPLOAD_BYTES = 25 * 1024 * 1024  # /stt rejects larger uploads while reading them
+STT_WORKERS = 2              # transcription worker threads sharing one model
+STT_QUEUE_SIZE = 32          # pending /stt jobs before new ones get 503
+STT_BATCH_SIZE = 8           # short clips transcribed together in one batched pass
+STT_REQUEST_TIMEOUT = 30.0   # seconds a /stt request may wait (queue + inference)
+STT_TRIM_SILENCE = True      # cut silence / long pauses and skip speechless clips before Whisper
+STT_CACHE_PATH = "stt_cache.db"
+STT_CACHE_MEMORY_ITEMS = 256  # transcripts kept in the in-process LRU
+STT_CACHE_MAX_ROWS = 5000     # transcripts kept in SQLite (least recently used are dropped)
+
+# Text-to-speech (piper). Workers keep a voice model loaded between replies (see tts_pool.py).
+TTS_VOICES_DIR = "voices"
+# Sentences of a long answer are synthesized in parallel, one worker process each
+TTS_WORKERS_PER_VOICE = max(1, min(4, (os.cpu_count() or 2) // 2))
+TTS_PARALLEL_SENTENCES = True
+TTS_WORKER_IDLE_SECONDS = 600  # idle workers are shut down after this long
+TTS_CACHE_ENABLED = True
+TTS_CACHE_PATH = "tts_cache.db"
+TTS_CACHE_MAX_BYTES = 64 * 1024 * 1024  # int16 PCM kept on disk; least recently used goes first
+TTS_CACHE_PREWARM = False      # synthesize tts.CANNED_REPLIES at startup
+PLAYBACK_TTL_SECONDS = 300     # finished /speak playbacks stay queryable this long
+TTS_PREFETCH_TTL_SECONDS = 120 # /query prefetch_voice audio waits this long for a /speak call
+
+# Barge-in: while a voice turn is answered the mic is watched, and speech stops
+# playback and cancels the turn. While the reply is playing the mic also hears
+# it through the speakers, so the thresholds are raised (unless on headphones).
+BARGE_IN_ENABLED = True
+BARGE_IN_HOLD_MS = 60          # continuous speech needed to count as an interruption
+BARGE_IN_MIN_RMS = 0.02
+BARGE_IN_NOISE_RATIO = 4.0
+BARGE_IN_HEADPHONES = os.environ.get("BARGE_IN_HEADPHONES", "0") == "1"  # no speaker echo to reject
+BARGE_IN_ECHO_RATIO = 2.5      # noise ratio multiplier while our own reply is playing
+BARGE_IN_ECHO_MIN_RMS = 0.08   # absolute floor while our own reply is playing
+PLAYBACK_BLOCK_FRAMES = 1024   # frames per output block (~50 ms at 22 kHz); bounds stop latency
+
+# /query: how often to check whether the client is still connected; a gone
+# client cancels the query (and the Ollama generation behind it)
+QUERY_DISCONNECT_POLL_SECONDS = 0.5
+
+# POST /query/batch
+QUERY_BATCH_CONCURRENCY = 4       # queries answered at once when the request doesn't say
+QUERY_BATCH_MAX_CONCURRENCY = 16  # upper bound for a request's "concurrency"
+QUERY_BATCH_MAX_ITEMS = 1000
+
+# API worker processes (python api.py). State that requests share (running
+# queries, playback status, prefetched answers) lives in SHARED_STATE_PATH so
+# any worker can serve any request.
+API_WORKERS = int(os.environ.get("API_WORKERS", "1"))
+SHARED_STATE_PATH = "shared_state.db"
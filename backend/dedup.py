@@ -0,0 +1,128 @@
+# dedup.py
+# Content normalization, exact-match hashing and MinHash/LSH signatures used to
+# catch duplicate and near-duplicate long-term memory facts.
+
+import hashlib
+import re
+import struct
+import zlib
+
+try:
+    import numpy as np
+except Exception:  # numpy is optional; fall back to pure Python
+    np = None
+
+NUM_PERM = 64
+# 8 bands x 8 rows: a pair with Jaccard 0.85 becomes a candidate ~92% of the time,
+# 0.9 ~99%. More bands catch more, but every band is a row in long_term_lsh.
+LSH_BANDS = 8
+ROWS_PER_BAND = NUM_PERM // LSH_BANDS
+NEAR_DUP_THRESHOLD = 0.8
+SHINGLE_SIZE = 4
+
+_PRIME = (1 << 31) - 1
+_MASK64 = (1 << 64) - 1
+_FNV_OFFSET = 0xCBF29CE484222325
+_FNV_PRIME = 0x100000001B3
+_NON_WORD = re.compile(r"[^\w\s]+", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+# Memory commands are stored verbatim with the fact; they carry no content
+_COMMAND_PREFIX = re.compile(r"^(please )?(from now on )?(always )?(remember|save) (this|that)?\s*")
+
+
+def _permutations():
+    perms = []
+    for i in range(NUM_PERM):
+        d = hashlib.blake2b(f"minhash-{i}".encode(), digest_size=8).digest()
+        a = int.from_bytes(d[:4], "little") % _PRIME or 1
+        b = int.from_bytes(d[4:], "little") % _PRIME
+        perms.append((a, b))
+    return perms
+
+
+# Fixed (a, b) pairs so signatures stay comparable across processes and restarts
+_PERMS = _permutations()
+if np is not None:
+    _PERM_A = np.array([a for a, _ in _PERMS], dtype=np.uint64)[:, None]
+    _PERM_B = np.array([b for _, b in _PERMS], dtype=np.uint64)[:, None]
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and memory-command prefixes, collapse whitespace."""
+    t = _NON_WORD.sub(" ", (text or "").lower())
+    t = _SPACES.sub(" ", t).strip()
+    return _COMMAND_PREFIX.sub("", t) or t
+
+
+def content_hash(text: str) -> int:
+    """Signed 64-bit hash of the normalized text (stored as a SQLite INTEGER)."""
+    return int.from_bytes(hashlib.blake2b(normalize(text).encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+def _shingle_hashes(norm: str):
+    if len(norm) <= SHINGLE_SIZE:
+        return [zlib.crc32(norm.encode("utf-8"))]
+    return list({zlib.crc32(norm[i:i + SHINGLE_SIZE].encode("utf-8")) for i in range(len(norm) - SHINGLE_SIZE + 1)})
+
+
+def minhash(text: str) -> list:
+    """MinHash signature (NUM_PERM ints) over character shingles of the normalized text."""
+    return minhash_many([text])[0]
+
+
+def minhash_many(texts) -> list:
+    """Signatures for a batch of texts; one vectorized pass when numpy is available."""
+    shingles = [_shingle_hashes(normalize(t)) for t in texts]
+    if not shingles:
+        return []
+    if np is None:
+        return [[min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS] for hashes in shingles]
+
+    lengths = np.fromiter((len(h) for h in shingles), dtype=np.int64, count=len(shingles))
+    flat = np.fromiter((h for hashes in shingles for h in hashes), dtype=np.uint64, count=int(lengths.sum()))
+    values = (_PERM_A * flat[None, :] + _PERM_B) % _PRIME
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return np.minimum.reduceat(values, offsets, axis=1).T.tolist()
+
+
+def pack_signature(sig) -> bytes:
+    return struct.pack(f"<{NUM_PERM}I", *sig)
+
+
+def unpack_signature(blob: bytes) -> list:
+    return list(struct.unpack(f"<{NUM_PERM}I", blob))
+
+
+def similarity(sig_a, sig_b) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def lsh_buckets(sig) -> list:
+    """One signed 64-bit bucket key per band; near-duplicates share at least one with high probability."""
+    return lsh_buckets_many([sig])[0]
+
+
+def lsh_buckets_many(sigs) -> list:
+    """FNV-1a over each band's rows (salted by band index), for a batch of signatures."""
+    if not sigs:
+        return []
+    if np is None:
+        out = []
+        for sig in sigs:
+            keys = []
+            for band in range(LSH_BANDS):
+                h = (_FNV_OFFSET ^ band) * _FNV_PRIME & _MASK64
+                for v in sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]:
+                    h = (h ^ v) * _FNV_PRIME & _MASK64
+                keys.append(h - (1 << 64) if h >> 63 else h)
+            out.append(keys)
+        return out
+
+    bands = np.asarray(sigs, dtype=np.uint64).reshape(len(sigs), LSH_BANDS, ROWS_PER_BAND)
+    with np.errstate(over="ignore"):
+        h = (np.uint64(_FNV_OFFSET) ^ np.arange(LSH_BANDS, dtype=np.uint64)) * np.uint64(_FNV_PRIME)
+        h = np.broadcast_to(h, bands.shape[:2]).copy()
+        for r in range(ROWS_PER_BAND):
+            h = (h ^ bands[:, :, r]) * np.uint64(_FNV_PRIME)
+    return h.view(np.int64).tolist()
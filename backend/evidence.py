@@ -0,0 +1,139 @@
+# evidence.py
+# Extractive compression of web search results before they go into a prompt:
+# drop near-duplicate snippets, split into sentences, rank sentences against the
+# query with BM25 and keep the best ones within a token budget.
+
+import math
+import re
+
+from config import EVIDENCE_TOKEN_BUDGET
+import dedup
+from tokens import estimate_tokens
+
+try:
+    import numpy as np
+except Exception:  # numpy is optional; fall back to pure Python
+    np = None
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+SNIPPET_DUP_THRESHOLD = 0.8
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+_WORD = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "in", "on", "at", "to", "for",
+    "and", "or", "what", "who", "why", "how", "when", "where", "do", "does", "did", "you",
+    "your", "about", "this", "that", "it", "me", "tell", "think", "with", "as", "by",
+}
+
+
+def split_sentences(text: str) -> list:
+    return [s.strip() for s in _SENTENCE_END.split(text or "") if s.strip()]
+
+
+def tokenize(text: str) -> list:
+    return _WORD.findall((text or "").lower())
+
+
+def drop_duplicate_snippets(results, threshold=SNIPPET_DUP_THRESHOLD) -> list:
+    """Keep the first of every group of near-identical result bodies."""
+    sigs = dedup.minhash_many([r.get("body", "") for r in results])
+    kept, kept_sigs = [], []
+    for r, sig in zip(results, sigs):
+        if any(dedup.similarity(sig, other) >= threshold for other in kept_sigs):
+            continue
+        kept.append(r)
+        kept_sigs.append(sig)
+    return kept
+
+
+def bm25_scores(query: str, sentences: list) -> list:
+    """BM25 score of every sentence against the query terms."""
+    terms = [t for t in dict.fromkeys(tokenize(query)) if t not in _STOPWORDS]
+    if not terms or not sentences:
+        return [0.0] * len(sentences)
+
+    docs = [tokenize(s) for s in sentences]
+    index = {t: i for i, t in enumerate(terms)}
+    n = len(docs)
+
+    if np is not None:
+        tf = np.zeros((n, len(terms)), dtype=np.float64)
+        for row, doc in enumerate(docs):
+            for tok in doc:
+                col = index.get(tok)
+                if col is not None:
+                    tf[row, col] += 1
+        lengths = np.array([len(d) for d in docs], dtype=np.float64)
+        avgdl = max(lengths.mean(), 1.0)
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths / avgdl)
+        return ((tf * (BM25_K1 + 1.0)) / (tf + norm[:, None]) * idf).sum(axis=1).tolist()
+
+    counts = [{} for _ in docs]
+    for c, doc in zip(counts, docs):
+        for tok in doc:
+            if tok in index:
+                c[tok] = c.get(tok, 0) + 1
+    avgdl = max(sum(len(d) for d in docs) / n, 1.0)
+    idf = {}
+    for t in terms:
+        df = sum(1 for c in counts if t in c)
+        idf[t] = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+    scores = []
+    for c, doc in zip(counts, docs):
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * len(doc) / avgdl)
+        scores.append(sum(idf[t] * f * (BM25_K1 + 1.0) / (f + norm) for t, f in c.items()))
+    return scores
+
+
+def _select(query, sentences, costs, token_budget):
+    scores = bm25_scores(query, [s for _, _, s in sentences])
+    # Relevant sentences first (best score wins), then the rest in reading order
+    order = sorted(range(len(sentences)), key=lambda i: (scores[i] <= 0, -scores[i], sentences[i][1], i))
+    chosen, used = set(), 0
+    for i in order:
+        if used + costs[i] > token_budget:
+            continue
+        chosen.add(i)
+        used += costs[i]
+    return chosen
+
+
+def compress_evidence(query: str, results: list, token_budget: int = EVIDENCE_TOKEN_BUDGET) -> list:
+    """Return results trimmed to the sentences most relevant to `query`.
+
+    Each returned dict keeps its title/href and gets a shortened "body".
+    Duplicate sources and sources with nothing selected are dropped; the rest
+    are numbered 1, 2, 3... in order as "source", so the numbers a prompt cites
+    match the list it is given, with no gaps.
+    """
+    numbered = drop_duplicate_snippets(list(results))
+
+    sentences = []  # (result index, sentence position, text)
+    seen = set()
+    for ri, r in enumerate(numbered):
+        for si, s in enumerate(split_sentences(r.get("body", ""))):
+            key = dedup.normalize(s)
+            if key in seen:
+                continue
+            seen.add(key)
+            sentences.append((ri, si, s))
+    if not sentences:
+        return [dict(r, source=n) for n, r in enumerate(numbered, start=1)]
+
+    costs = [estimate_tokens(s) for _, _, s in sentences]
+    if sum(costs) <= token_budget:
+        # Everything fits: keep every distinct sentence
+        chosen = set(range(len(sentences)))
+    else:
+        chosen = _select(query, sentences, costs, token_budget)
+
+    compressed = []
+    for ri, r in enumerate(numbered):
+        picked = [s for i, (rj, _si, s) in enumerate(sentences) if rj == ri and i in chosen]
+        if picked:
+            compressed.append(dict(r, body=" ".join(picked), source=len(compressed) + 1))
+    return compressed
@@ -1,12 +1,17 @@
 # main.py
+import threading
+
 from autocorrect import autocorrect_text
 from router import route_intent
 from brain import think
+from cancellation import Cancelled
 from tools import open_file, open_app
 from tools import load_adult_movies
-from web_search import web_search
-from config import OPINION_MODE, VOICE_ENABLED, VOICE_INPUT, VOICE_OUTPUT
-from memory import add_turn, get_context, set_pref, get_pref
+from web_search import web_search, SearchUnavailable
+from resilience import CircuitOpen, DeadlineExceeded
+from evidence import compress_evidence
+from config import OPINION_MODE, VOICE_ENABLED, VOICE_INPUT, VOICE_OUTPUT, TTS_CACHE_PREWARM
+from memory import add_turn, get_context, set_pref, get_pref, get_summary_text, memory_view
 from memory_db import MemoryDB
 from prompt_builder import build_prompt
 
@@ -18,7 +23,6 @@ from prompt_builder import build_prompt
 # Initialize a dedicated memory instance (persistent DB file)
 memory = MemoryDB()
 
-
 def is_explicit_memory_command(text: str) -> bool:
     triggers = [
         "remember this",
@@ -55,8 +59,11 @@ def maybe_save_explicit(user_text: str, assistant_text: str, source: str = "text
             pass
 
 
-def handle_user_input(user_text: str, max_tokens: int | None = None, source: str = "text") -> str:
-    """Create a compact prompt using memory and call the LLM, then update memory."""
+def handle_user_input(user_text: str, max_tokens: int | None = None, source: str = "text", cancel=None) -> str:
+    """Create a compact prompt using memory and call the LLM, then update memory.
+
+    Raises `Cancelled` (nothing is saved) if `cancel` fires during generation.
+    """
     try:
         prefs = memory.get_prefs()
         short_rows = memory.get_short_term(limit=6)
@@ -74,17 +81,20 @@ def handle_user_input(user_text: str, max_tokens: int | None = None, source: str
             short_term=short_rows,
             long_term=long_rows,
             include_system=False,
+            summary=get_summary_text(),
         )
 
         if max_tokens is not None:
-            answer = think(user_text, extra_context=prompt_context, max_tokens=max_tokens)
+            answer = think(user_text, extra_context=prompt_context, max_tokens=max_tokens, cancel=cancel)
         else:
-            answer = think(user_text, extra_context=prompt_context)
+            answer = think(user_text, extra_context=prompt_context, cancel=cancel)
+    except Cancelled:
+        raise
     except Exception:
         # fallback to older simple context
         memory_context = get_context()
         extra_context = f"Conversation context:\n{memory_context}\n\n" if memory_context else ""
-        answer = think(user_text, extra_context=extra_context)
+        answer = think(user_text, extra_context=extra_context, cancel=cancel)
 
     # persist short-term and possibly explicit long-term memory
     maybe_save_explicit(user_text, answer, source=source)
@@ -94,6 +104,17 @@ def handle_user_input(user_text: str, max_tokens: int | None = None, source: str
 # Safe, lazy TTS wrapper. If TTS dependencies are missing, this becomes a no-op.
 _say_func = None
 
+# Barge-in controller for the CLI voice loop (created in `main`); when set,
+# replies are synthesized in the background and belong to its current turn.
+_barge = None
+
+
+def _say(text, voice=None):
+    if voice:
+        return _say_func(text, voice)
+    return _say_func(text)
+
+
 def _speak(text, voice=None):
     global _say_func
     if _say_func is None:
@@ -102,23 +123,54 @@ def _speak(text, voice=None):
             _say_func = _s
         except Exception:
             _say_func = lambda *args, **kwargs: None
-    try:
-        if voice:
-            _say_func(text, voice=voice)
-        else:
-            _say_func(text)
-    except Exception:
-        # Swallow TTS runtime errors to keep the text API robust
-        pass
+
+    turn = _barge.current if _barge is not None else None
+    if turn is None:
+        try:
+            _say(text, voice)
+        except Exception:
+            # Swallow TTS runtime errors to keep the text API robust
+            pass
+        return
+
+    # Synthesize off the loop so the user can talk over it; a cancelled turn drops it
+    def _run():
+        try:
+            if turn.cancelled:
+                return
+            controller = _say(text, voice)
+            if controller is not None:
+                turn.track_playback(controller)
+        except Exception:
+            pass
+        finally:
+            turn.end()
+
+    turn.begin()
+    threading.Thread(target=_run, name="turn-tts", daemon=True).start()
 
 
 def main():
+    global _barge
     # Load persisted preferences
-    OPINION_MODE = get_pref("opinion_mode", OPINION_MODE)
+    opinion_mode = get_pref("opinion_mode", OPINION_MODE)
+
+    if VOICE_OUTPUT and TTS_CACHE_PREWARM:
+        from tts import prewarm_tts
+        prewarm_tts()
+
+    from barge_in import BargeInController
+    _barge = BargeInController()
+    turn = None
 
     print("AI Assistant ready (type 'exit' to quit)\n")
 
     while True:
+        # Don't record the assistant's own voice: wait until it finishes
+        # speaking, unless the user talks over it (barge-in cancels the turn).
+        if VOICE_INPUT and turn is not None and _barge.wait_for_user():
+            print("DEBUG | barge-in: reply interrupted")
+
         # Input (voice or text)
         if VOICE_INPUT:
             try:
@@ -142,6 +194,9 @@ def main():
         if user_input.lower() == "exit":
             break
 
+        # New turn: whatever the previous answer was still doing is cancelled
+        turn = _barge.new_turn(listen=VOICE_INPUT)
+
         # 🚫 Block junk input
         if len(user_input) < 4 or (user_input.isalpha() and user_input.lower() == user_input):
             print("AI: Please enter a meaningful request.")
@@ -172,7 +227,10 @@ def main():
 
             memory_context = get_context()
             extra_context = f"Conversation context:\n{memory_context}\n\n" if memory_context else ""
-            answer = think(user_input, extra_context=extra_context + prompt)
+            try:
+                answer = think(user_input, extra_context=extra_context + prompt, cancel=turn)
+            except Cancelled:
+                continue
             print("AI:", answer)
             maybe_save_explicit(user_input, answer, source=source)
             if VOICE_OUTPUT:
@@ -203,10 +261,10 @@ def main():
                 print("AI: Not enough reliable information to form a reasoned opinion.")
                 continue
 
-            evidence = "\n".join(f"- {r['body']}" for r in results)
+            evidence = "\n".join(f"- {r['body']}" for r in compress_evidence(user_input, results))
 
             # 2️⃣ Mode-specific instruction
-            if OPINION_MODE == "blunt":
+            if opinion_mode == "blunt":
                 style = """
 BLUNT MODE — NON-NEGOTIABLE RULES:
 
@@ -244,7 +302,7 @@ Required structure:
 4. End with a judgment about power or enforcement.
 """
 
-            elif OPINION_MODE == "critical":
+            elif opinion_mode == "critical":
                 style = """
 CRITICAL MODE:
 
@@ -300,14 +358,18 @@ Evidence:
             # 4️⃣ Generate
             memory_context = get_context()
             extra_context = f"Conversation context:\n{memory_context}\n\n" if memory_context else ""
-            answer = think(
-                user_input,
-                extra_context=extra_context + prompt,
-                max_tokens=320
-            )
+            try:
+                answer = think(
+                    user_input,
+                    extra_context=extra_context + prompt,
+                    max_tokens=320,
+                    cancel=turn,
+                )
+            except Cancelled:
+                continue
             print("AI:", answer)
             maybe_save_explicit(user_input, answer, source=source)
-            set_pref("opinion_mode", OPINION_MODE)
+            set_pref("opinion_mode", opinion_mode)
             # Voice output (optional)
             if VOICE_OUTPUT:
                 # simple language heuristic: detect Telugu characters as an example
@@ -357,8 +419,8 @@ Evidence:
                     continue
 
             context = ""
-            for i, r in enumerate(results, start=1):
-                context += f"Source {i}:\nTitle: {r['title']}\nInfo: {r['body']}\n\n"
+            for r in compress_evidence(user_input, results):
+                context += f"Source {r['source']}:\nTitle: {r['title']}\nInfo: {r['body']}\n\n"
 
             is_person_query = user_input.lower().startswith("who is")
 
@@ -389,11 +451,15 @@ Evidence:
 
             memory_context = get_context()
             extra_context = f"Conversation context:\n{memory_context}\n\n" if memory_context else ""
-            answer = think(
-                user_input,
-                extra_context=extra_context + prompt,
-                max_tokens=tokens
-            )
+            try:
+                answer = think(
+                    user_input,
+                    extra_context=extra_context + prompt,
+                    max_tokens=tokens,
+                    cancel=turn,
+                )
+            except Cancelled:
+                continue
             print("AI:", answer)
             maybe_save_explicit(user_input, answer, source=source)
             if VOICE_OUTPUT:
@@ -404,7 +470,10 @@ Evidence:
 
         else:
             # Use structured memory-aware prompt + automatic short-term storage
-            answer = handle_user_input(user_input, source=source)
+            try:
+                answer = handle_user_input(user_input, source=source, cancel=turn)
+            except Cancelled:
+                continue
             print("AI:", answer)
             if VOICE_OUTPUT:
                 if any(ch in user_input for ch in "అఆఇఈఉ"):
@@ -412,13 +481,62 @@ Evidence:
                 else:
                     _speak(answer, voice="en_US-lessac")
 
-def handle_query(user_input: str, source: str = "text") -> str:
+def handle_query(user_input: str, source: str = "text", cancel=None, deadline=None, mode: str | None = None,
+                 view=None, persist: bool = True) -> str:
     """Run routing + appropriate action for a single user input and return the assistant's text response.
 
     This is a UI-friendly backend entrypoint (no direct TTS playback).
 
     The `source` parameter should be 'text' or 'voice'. Voice inputs will never trigger automatic long-term memory saves.
+
+    `mode` is the opinion style (balanced | blunt | critical | academic) for this
+    request only; without it the stored "opinion_mode" pref (or config.OPINION_MODE)
+    is used. Nothing here writes module state, so concurrent requests (and API
+    worker processes) don't leak their settings into each other.
+
+    Memory (prefs, context, facts) is read once per call; pass `view`
+    (memory.memory_view()) to share one read across many queries.
+
+    With `persist=False` nothing is written: no turn is added (so no compaction
+    is scheduled) and explicit "remember ..." commands are ignored. /query/batch
+    uses it so bulk runs leave the conversation alone.
+
+    `cancel` (a CancelToken) aborts web search and generation; `Cancelled` is raised and nothing is saved.
+
+    `deadline` (resilience.Deadline) bounds the whole answer: search and generation
+    only get the time left, and instead of hanging a degraded answer is returned
+    (no evidence, a cut-off reply, or a short apology). Degraded answers are not saved.
+    """
+    try:
+        return _answer_query(user_input, source, cancel, deadline, mode, view, persist)
+    except DeadlineExceeded as e:
+        print("DEBUG | query ran out of time:", e)
+        if e.partial.strip():
+            return e.partial.rstrip() + " …"
+        return "Sorry, I couldn't finish an answer in time. Please try again."
+    except CircuitOpen as e:
+        print("DEBUG | query short-circuited:", e)
+        return "The language model is unavailable right now. Please try again in a moment."
+
+
+def _answer_without_evidence(user_input: str, view, cancel=None, deadline=None, max_tokens=200) -> str:
+    """Fallback when web search is down or out of time: answer from the model alone, flagged as unverified.
+
+    Like every degraded answer it is not saved: no turn is added and no explicit
+    memory command is acted on, so the user can simply ask again.
     """
+    memory_context = view.context
+    extra_context = f"Conversation context:\n{memory_context}\n\n" if memory_context else ""
+    note = (
+        "Web search is unavailable right now, so no sources could be checked.\n"
+        "Answer briefly from general knowledge and say that the answer could not be verified.\n"
+    )
+    return think(user_input, extra_context=extra_context + note, max_tokens=max_tokens, cancel=cancel, deadline=deadline)
+
+
+def _answer_query(user_input: str, source: str, cancel=None, deadline=None, mode=None, view=None,
+                  persist=True) -> str:
+    view = view or memory_view()
     route = route_intent(user_input)
     intent = route.get("intent")
 
@@ -437,33 +555,41 @@ def handle_query(user_input: str, source: str = "text") -> str:
             "- No explanations\n"
             "- No substitutions"
         )
-        memory_context = get_context()
+        memory_context = view.context
         extra_context = f"Conversation context:\n{memory_context}\n\n" if memory_context else ""
-        answer = think(prompt, extra_context=extra_context)
-        maybe_save_explicit(user_input, answer, source=source)
+        answer = think(prompt, extra_context=extra_context, cancel=cancel, deadline=deadline)
+        if persist:
+            maybe_save_explicit(user_input, answer, source=source)
         return answer
 
     # open file
     if intent == "file_open":
         result = open_file(route.get("path", ""))
-        maybe_save_explicit(user_input, result, source=source)
+        if persist:
+            maybe_save_explicit(user_input, result, source=source)
         return result
 
     # open app
     if intent == "app_open":
         result = open_app(route.get("app", ""))
-        maybe_save_explicit(user_input, result, source=source)
+        if persist:
+            maybe_save_explicit(user_input, result, source=source)
         return result
 
     # opinion analysis
     if intent == "opinion_analysis":
-        results = web_search(user_input, max_results=6)
+        try:
+            results = web_search(user_input, max_results=6, cancel=cancel, deadline=deadline)
+        except SearchUnavailable as e:
+            print("DEBUG | answering without evidence:", e)
+            return _answer_without_evidence(user_input, view, cancel, deadline, max_tokens=320)
         if len(results) < 2:
             return "Not enough reliable information to form a reasoned opinion."
 
-        evidence = "\n".join(f"- {r['body']}" for r in results)
+        evidence = "\n".join(f"- {r['body']}" for r in compress_evidence(user_input, results))
 
-        if OPINION_MODE == "blunt":
+        mode = mode or view.prefs.get("opinion_mode", OPINION_MODE)
+        if mode == "blunt":
             style = """
 BLUNT MODE — NON-NEGOTIABLE RULES:
 
@@ -501,7 +627,7 @@ Required structure:
 4. End with a judgment about power or enforcement.
 """
 
-        elif OPINION_MODE == "critical":
+        elif mode == "critical":
             style = """
 CRITICAL MODE:
 
@@ -546,16 +672,20 @@ Evidence:
 {evidence}
 """
 
-        memory_context = get_context()
+        memory_context = view.context
         extra_context = f"Conversation context:\n{memory_context}\n\n" if memory_context else ""
-        answer = think(user_input, extra_context=extra_context + prompt, max_tokens=320)
-        maybe_save_explicit(user_input, answer, source=source)
-        set_pref("opinion_mode", OPINION_MODE)
+        answer = think(user_input, extra_context=extra_context + prompt, max_tokens=320, cancel=cancel, deadline=deadline)
+        if persist:
+            maybe_save_explicit(user_input, answer, source=source)
         return answer
 
     # search and explain
     if intent == "search_and_explain":
-        results = web_search(user_input, max_results=8)
+        try:
+            results = web_search(user_input, max_results=8, cancel=cancel, deadline=deadline)
+        except SearchUnavailable as e:
+            print("DEBUG | answering without evidence:", e)
+            return _answer_without_evidence(user_input, view, cancel, deadline)
         tokens = user_input.lower().split()
         generic_tokens = {"xyz", "abc", "test", "testtest", "protesttest"}
         if any(t in generic_tokens for t in tokens):
@@ -576,8 +706,8 @@ Evidence:
                 return "The name you asked about may refer to multiple people or entities. Please specify which one you mean (profession, country, or context)."
 
         context = ""
-        for i, r in enumerate(results, start=1):
-            context += f"Source {i}:\nTitle: {r['title']}\nInfo: {r['body']}\n\n"
+        for r in compress_evidence(user_input, results):
+            context += f"Source {r['source']}:\nTitle: {r['title']}\nInfo: {r['body']}\n\n"
 
         is_person_query = user_input.lower().startswith("who is")
         if is_person_query:
@@ -600,42 +730,40 @@ Evidence:
         long_form = any(k in user_input.lower() for k in ["why", "causes", "reasons", "protesting", "movement"])
         tokens = 140 if is_person_query else (200 if long_form else 120)
 
-        memory_context = get_context()
+        memory_context = view.context
         extra_context = f"Conversation context:\n{memory_context}\n\n" if memory_context else ""
-        answer = think(user_input, extra_context=extra_context + prompt, max_tokens=tokens)
-        maybe_save_explicit(user_input, answer, source=source)
+        answer = think(user_input, extra_context=extra_context + prompt, max_tokens=tokens, cancel=cancel, deadline=deadline)
+        if persist:
+            maybe_save_explicit(user_input, answer, source=source)
         return answer
 
     # fallback — prefer structured prompt when possible
     try:
         from prompt_builder import build_prompt
-        from memory import get_prefs, get_long_term, get_short_term_rows
-
-        prefs = get_prefs()
-        short_rows = get_short_term_rows()
-        memory_enabled = str(prefs.get("memory_enabled", "true")).lower() == "true"
-        long_rows = get_long_term() if memory_enabled else []
 
         with open("system_prompt.txt", "r", encoding="utf-8") as f:
             system_prompt = f.read()
 
-        prompt_context = build_prompt(system_prompt, user_input, prefs, short_rows, long_rows, include_system=False)
-        answer = think(user_input, extra_context=prompt_context)
+        prompt_context = build_prompt(
+            system_prompt, user_input, view.prefs, view.short_rows, view.long_rows,
+            include_system=False, summary=view.summary,
+        )
+        answer = think(user_input, extra_context=prompt_context, cancel=cancel, deadline=deadline)
+    except (Cancelled, DeadlineExceeded, CircuitOpen):
+        raise
     except Exception:
-        memory_context = get_context()
+        memory_context = view.context
         extra_context = f"Conversation context:\n{memory_context}\n\n" if memory_context else ""
-        answer = think(user_input, extra_context=extra_context)
+        answer = think(user_input, extra_context=extra_context, cancel=cancel, deadline=deadline)
 
-    maybe_save_explicit(user_input, answer, source=source)
+    if persist:
+        maybe_save_explicit(user_input, answer, source=source)
     return answer
 
 
-def process_input(user_input: str, mode: str, source: str = "text"):
-    """External UI wrapper: set mode and process input through the backend."""
-    global OPINION_MODE
-    OPINION_MODE = mode
-    set_pref("opinion_mode", OPINION_MODE)
-    return handle_query(user_input, source=source)
+def process_input(user_input: str, mode: str, source: str = "text", cancel=None, deadline=None):
+    """External UI wrapper: process input through the backend with `mode` applied to this request."""
+    return handle_query(user_input, source=source, cancel=cancel, deadline=deadline, mode=mode)
 
 
 if __name__ == "__main__":
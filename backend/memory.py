@@ -1,3 +1,6 @@
+import json
+from datetime import datetime, timedelta
+
 from memory_db import MemoryDB
 
 memory = MemoryDB()
@@ -18,14 +21,29 @@ def add_turn(user_text: str, assistant_text: str):
     # store both sides as short-term memory
     memory.add_short_term("user", user_text)
     memory.add_short_term("assistant", assistant_text)
+    # fold older turns into the rolling summary off the request path
+    try:
+        from compactor import schedule_compaction
+        schedule_compaction(memory)
+    except Exception:
+        pass
+
+
+def get_summary_text():
+    """Rolling summary of turns older than the short-term window, or ''."""
+    summary = memory.get_summary()
+    return summary["summary"] if summary else ""
 
 
 def get_context(limit=6):
-    # return a readable joined context string (most recent last)
-    rows = memory.get_short_term(limit=limit)
-    if not rows:
+    # return a readable joined context string (most recent last), led by the summary if any
+    return _format_context(get_summary_text(), memory.get_short_term(limit=limit))
+
+
+def _format_context(summary, rows):
+    if not rows and not summary:
         return ""
-    parts = []
+    parts = [f"Summary of earlier conversation: {summary}"] if summary else []
     for r in rows:
         # r may be sqlite Row-like with 'role' and 'content'
         role = r["role"] if isinstance(r, dict) or hasattr(r, "__getitem__") else getattr(r, "role", "user")
@@ -37,6 +55,34 @@ def get_context(limit=6):
 def get_short_term_rows(limit=6):
     return memory.get_short_term(limit=limit)
 
+
+class MemoryView:
+    """Everything answering a query reads from memory, captured at one moment.
+
+    main.handle_query takes one so a batch of queries can share a single read
+    (see /query/batch); writes made while answering are not reflected in it.
+    """
+
+    def __init__(self, prefs, summary, short_rows, long_rows):
+        self.prefs = prefs
+        self.summary = summary
+        self.short_rows = short_rows
+        self.long_rows = long_rows  # [] when the "memory_enabled" pref is off
+        self.context = _format_context(summary, short_rows)
+
+
+def memory_view(limit=6) -> MemoryView:
+    # one lock hold, so no write lands between the reads
+    with memory.lock:
+        prefs = memory.get_prefs()
+        memory_enabled = str(prefs.get("memory_enabled", "true")).lower() == "true"
+        return MemoryView(
+            prefs,
+            get_summary_text(),
+            [dict(r) for r in memory.get_short_term(limit=limit)],
+            memory.get_long_term() if memory_enabled else [],
+        )
+
 # Long-term
 
 def is_disallowed_memory_content(text: str):
@@ -65,11 +111,18 @@ def is_disallowed_memory_content(text: str):
     return None
 
 
-def add_long_term(text: str, source: str = "explicit"):
+def add_long_term(text: str, source: str = "explicit", on_duplicate: str = "refresh"):
+    """Validate and store a fact. Duplicates are handled per `on_duplicate`
+    ("refresh", "merge", "skip" or "insert", see MemoryDB.add_long_term)."""
     reason = is_disallowed_memory_content(text)
     if reason:
         raise ValueError(f"Content disallowed for memory: {reason}")
-    memory.add_long_term(text, source=source)
+    return memory.add_long_term(text, source=source, on_duplicate=on_duplicate)
+
+
+def dedupe_long_term():
+    """Remove duplicate / near-duplicate facts from an existing database; returns rows removed."""
+    return memory.dedupe_long_term()
 
 
 def get_long_term(limit=10):
@@ -101,20 +154,127 @@ def forget_memory_item(item_id: int):
     memory.delete_long_term(item_id)
 
 
-# Utility: clear memory
+# Bulk export / import (NDJSON, one JSON object per line)
+
+IMPORT_BATCH_SIZE = 5000
+MAX_IMPORT_LINE_BYTES = 64 * 1024  # longer lines are rejected as "too_long" without being parsed
+
+
+def export_memory_ndjson(batch_size=500):
+    """Yield every pref, short-term and long-term row as an NDJSON line."""
+    for row in memory.export_rows(batch_size=batch_size):
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def new_import_report():
+    return {"accepted": 0, "rejected": 0, "reasons": {}}
+
+
+def _reject(report, reason):
+    report["rejected"] += 1
+    report["reasons"][reason] = report["reasons"].get(reason, 0) + 1
+
+
+def reject_line(report, reason):
+    """Count a line dropped before it reached import_memory_batch (e.g. one cut off for length)."""
+    _reject(report, reason)
+
+
+def _text_field(rec, name):
+    """rec[name] as a string, or None when absent; raises TypeError for any other type."""
+    value = rec.get(name)
+    if value is None or isinstance(value, str):
+        return value
+    raise TypeError(f"{name} must be a string, not {type(value).__name__}")
+
+
+def import_memory_batch(lines, report=None):
+    """Parse, validate and insert one chunk of NDJSON lines in a single transaction.
+
+    Long-term facts are checked with `is_disallowed_memory_content`; malformed
+    lines (bad JSON, missing or non-string fields), lines over
+    MAX_IMPORT_LINE_BYTES, unknown types and
+    disallowed facts are counted as rejected without affecting the other lines.
+    Returns the updated report dict.
+    """
+    if report is None:
+        report = new_import_report()
+
+    now = datetime.utcnow()
+    prefs, short_term, long_term = [], [], []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        line = line.strip()
+        if not line:
+            continue
+        if len(line) > MAX_IMPORT_LINE_BYTES:
+            _reject(report, "too_long")
+            continue
+        try:
+            rec = json.loads(line)
+            kind = rec.get("type")
+            if kind == "pref":
+                key = _text_field(rec, "key")
+                if not key:
+                    raise ValueError("missing key")
+                prefs.append((key, _text_field(rec, "value"), _text_field(rec, "updated_at") or now.isoformat()))
+            elif kind == "short_term":
+                content = _text_field(rec, "content")
+                if not content:
+                    raise ValueError("missing content")
+                expires = _text_field(rec, "expires_at") or (now + timedelta(minutes=30)).isoformat()
+                short_term.append((
+                    _text_field(rec, "role") or "user", content, _text_field(rec, "created_at") or now.isoformat(), expires
+                ))
+            elif kind == "long_term":
+                content = _text_field(rec, "content")
+                if not content or not content.strip():
+                    raise ValueError("missing content")
+                reason = is_disallowed_memory_content(content)
+                if reason:
+                    _reject(report, reason)
+                    continue
+                long_term.append((
+                    content, _text_field(rec, "source") or "import", _text_field(rec, "created_at") or now.isoformat()
+                ))
+            else:
+                _reject(report, "unknown_type")
+        except Exception:
+            # bad JSON, a non-object line, or a field of the wrong type: drop
+            # this line only, so the rest of the batch still goes in
+            _reject(report, "malformed")
+
+    duplicates = memory.import_rows(prefs=prefs, short_term=short_term, long_term=long_term)
+    report["accepted"] += len(prefs) + len(short_term) + len(long_term) - duplicates
+    if duplicates:
+        report["rejected"] += duplicates
+        report["reasons"]["duplicate"] = report["reasons"].get("duplicate", 0) + duplicates
+    return report
+
+
+def import_memory_ndjson(lines, batch_size=IMPORT_BATCH_SIZE):
+    """Import an iterable of NDJSON lines in chunks of `batch_size`; return the report."""
+    report = new_import_report()
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            import_memory_batch(batch, report)
+            batch = []
+    if batch:
+        import_memory_batch(batch, report)
+    return report
 
-def clear_all_memory():
-    conn = memory.conn
-    conn.execute("DELETE FROM short_term_memory")
-    conn.execute("DELETE FROM long_term_memory")
-    conn.execute("DELETE FROM user_prefs")
-    conn.commit()
 
 # Utility: clear memory
 
 def clear_all_memory():
-    conn = memory.conn
-    conn.execute("DELETE FROM short_term_memory")
-    conn.execute("DELETE FROM long_term_memory")
-    conn.execute("DELETE FROM user_prefs")
-    conn.commit()
\ No newline at end of file
+    with memory.lock:
+        conn = memory.conn
+        conn.execute("DELETE FROM short_term_memory")
+        conn.execute("DELETE FROM conversation_summary")
+        conn.execute("DELETE FROM long_term_memory")
+        conn.execute("DELETE FROM long_term_lsh")
+        conn.execute("DELETE FROM user_prefs")
+        conn.commit()
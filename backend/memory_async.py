@@ -0,0 +1,66 @@
+# memory_async.py
+# Awaitable access to the memory store for the async API endpoints. sqlite3
+# calls (and the commit / fsync behind every write) run on a dedicated DB
+# thread instead of the event loop, so a slow write only delays other memory
+# calls, never unrelated requests; endpoint calls run in arrival order.
+# The connection is also used outside this thread (/query handlers saving
+# turns, the compactor): MemoryDB.lock is what keeps each call one
+# transaction, and it can make an endpoint wait for one of those writes.
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import memory
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-db")
+
+
+async def run(fn, *args, **kwargs):
+    """Run a blocking memory / MemoryDB call on the DB thread and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def get_prefs():
+    return await run(memory.get_prefs)
+
+
+async def set_pref(key: str, value: str):
+    return await run(memory.set_pref, key, value)
+
+
+async def get_long_term(limit=10):
+    return await run(memory.get_long_term, limit)
+
+
+async def get_context(limit=6):
+    return await run(memory.get_context, limit)
+
+
+async def get_memory_snapshot():
+    return await run(memory.get_memory_snapshot)
+
+
+async def memory_view():
+    return await run(memory.memory_view)
+
+
+async def add_long_term(text: str, source: str = "explicit", on_duplicate: str = "refresh"):
+    return await run(memory.add_long_term, text, source=source, on_duplicate=on_duplicate)
+
+
+async def dedupe_long_term():
+    return await run(memory.dedupe_long_term)
+
+
+async def delete_long_term(entry_id: int):
+    return await run(memory.delete_long_term, entry_id)
+
+
+async def clear_all_memory():
+    return await run(memory.clear_all_memory)
+
+
+async def import_memory_batch(lines, report=None):
+    return await run(memory.import_memory_batch, lines, report)
@@ -1,13 +1,34 @@
+import functools
 import sqlite3
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 
+import dedup
+
 DB_PATH = Path("memory.db")
 
+
+def _locked(method):
+    # The connection is shared by the API's DB thread, /query worker threads
+    # and the compactor; holding the lock makes each method one transaction
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class MemoryDB:
     def __init__(self):
         self.conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        # re-entrant: locked methods call each other (get_short_term -> get_summary)
+        self.lock = threading.RLock()
         self.conn.row_factory = sqlite3.Row
+        # 32 MB page cache keeps the dedup indexes hot during bulk imports
+        self.conn.execute("PRAGMA cache_size = -32768")
+        # WAL: API worker processes keep reading while another one writes
+        self.conn.execute("PRAGMA journal_mode = WAL")
         self._init_tables()
 
     def _init_tables(self):
@@ -31,18 +52,50 @@ class MemoryDB:
         )
         """)
 
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_summary (
+            conversation_id TEXT PRIMARY KEY,
+            summary TEXT,
+            last_row_id INTEGER,
+            updated_at TEXT,
+            expires_at TEXT
+        )
+        """)
+
         cur.execute("""
         CREATE TABLE IF NOT EXISTS long_term_memory (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             content TEXT,
             source TEXT,
-            created_at TEXT
+            created_at TEXT,
+            content_hash INTEGER,
+            minhash BLOB
         )
         """)
 
+        # Older databases lack the dedup columns; add them in place
+        columns = {row["name"] for row in cur.execute("PRAGMA table_info(long_term_memory)")}
+        if "content_hash" not in columns:
+            cur.execute("ALTER TABLE long_term_memory ADD COLUMN content_hash INTEGER")
+        if "minhash" not in columns:
+            cur.execute("ALTER TABLE long_term_memory ADD COLUMN minhash BLOB")
+
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_long_term_hash ON long_term_memory (content_hash)")
+
+        # LSH band bucket -> content hash, for near-duplicate candidate lookup
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS long_term_lsh (
+            bucket INTEGER,
+            content_hash INTEGER,
+            PRIMARY KEY (bucket, content_hash)
+        ) WITHOUT ROWID
+        """)
+
         self.conn.commit()
+        self._backfill_signatures()
 
     # ---------- USER PREFS ----------
+    @_locked
     def set_pref(self, key, value):
         self.conn.execute(
             "REPLACE INTO user_prefs VALUES (?, ?, ?)",
@@ -50,11 +103,13 @@ class MemoryDB:
         )
         self.conn.commit()
 
+    @_locked
     def get_prefs(self):
         cur = self.conn.execute("SELECT key, value FROM user_prefs")
         return {row["key"]: row["value"] for row in cur.fetchall()}
 
     # ---------- SHORT TERM MEMORY ----------
+    @_locked
     def add_short_term(self, role, content, ttl_minutes=30):
         expires = datetime.utcnow() + timedelta(minutes=ttl_minutes)
         self.conn.execute(
@@ -63,30 +118,239 @@ class MemoryDB:
         )
         self.conn.commit()
 
+    @_locked
     def get_short_term(self, limit=6):
+        """Most recent turns (oldest first), skipping turns already folded into the summary."""
         self.cleanup_short_term()
+        summary = self.get_summary()
+        after_id = summary["last_row_id"] if summary else 0
         cur = self.conn.execute("""
             SELECT role, content FROM short_term_memory
+            WHERE id > ?
             ORDER BY created_at DESC
             LIMIT ?
-        """, (limit,))
+        """, (after_id, limit))
         return list(reversed(cur.fetchall()))
 
+    @_locked
+    def get_short_term_since(self, after_id=0):
+        """All unexpired turns with id > after_id, oldest first (used by the compactor)."""
+        self.cleanup_short_term()
+        cur = self.conn.execute("""
+            SELECT id, role, content FROM short_term_memory
+            WHERE id > ?
+            ORDER BY id
+        """, (after_id,))
+        return cur.fetchall()
+
+    @_locked
     def cleanup_short_term(self):
-        self.conn.execute(
-            "DELETE FROM short_term_memory WHERE expires_at < ?",
-            (datetime.utcnow().isoformat(),)
-        )
+        now = datetime.utcnow().isoformat()
+        self.conn.execute("DELETE FROM short_term_memory WHERE expires_at < ?", (now,))
+        self.conn.execute("DELETE FROM conversation_summary WHERE expires_at < ?", (now,))
         self.conn.commit()
 
-    # ---------- LONG TERM MEMORY ----------
-    def add_long_term(self, content, source="explicit"):
-        self.conn.execute(
-            "INSERT INTO long_term_memory VALUES (NULL, ?, ?, ?)",
-            (content, source, datetime.utcnow().isoformat())
+    # ---------- CONVERSATION SUMMARY ----------
+    @_locked
+    def get_summary(self, conversation_id="default"):
+        cur = self.conn.execute(
+            "SELECT summary, last_row_id FROM conversation_summary WHERE conversation_id = ? AND expires_at >= ?",
+            (conversation_id, datetime.utcnow().isoformat())
         )
+        row = cur.fetchone()
+        if not row:
+            return None
+        return {"summary": row["summary"], "last_row_id": row["last_row_id"]}
+
+    @_locked
+    def set_summary(self, summary, last_row_id, ttl_minutes=30, conversation_id="default", expected_last_row_id=None):
+        """Store the rolling summary covering every turn up to and including last_row_id.
+
+        With `expected_last_row_id` the write only happens if the stored summary
+        still ends at that row (0: no summary), so a compaction in another worker
+        process that finished first is not overwritten. Returns True if written.
+        """
+        now = datetime.utcnow()
+        # IMMEDIATE takes the write lock up front: the check and the write are one step for every process
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            if expected_last_row_id is not None:
+                current = self.get_summary(conversation_id)
+                if (current["last_row_id"] if current else 0) != expected_last_row_id:
+                    self.conn.rollback()
+                    return False
+            self.conn.execute(
+                "REPLACE INTO conversation_summary VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, summary, last_row_id, now.isoformat(), (now + timedelta(minutes=ttl_minutes)).isoformat())
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return True
+
+    # ---------- LONG TERM MEMORY ----------
+    @_locked
+    def add_long_term(self, content, source="explicit", on_duplicate="refresh"):
+        """Insert a fact unless it duplicates (exactly or nearly) an existing one.
+
+        on_duplicate controls what happens to a match:
+        - "refresh": bump an exact (normalized) match's created_at so it ranks as
+                     recent; a near match is not the same fact (555-1234 vs
+                     555-1235), so the new text is inserted next to it
+        - "merge":   replace the existing row's content/source with the new text and refresh it
+        - "skip":    leave the existing row untouched
+        - "insert":  insert anyway (no dedup)
+
+        Returns {"id", "status", "match", "existing"} where status is
+        inserted/refreshed/merged/skipped, match is None, "exact" or "near" and
+        existing is the matched row ({"id", "content"}) or None.
+        """
+        now = datetime.utcnow().isoformat()
+        chash = dedup.content_hash(content)
+        sig = dedup.minhash(content)
+
+        match, kind = None, None
+        if on_duplicate != "insert":
+            match, kind = self.find_duplicate(content, chash=chash, sig=sig)
+
+        existing = None
+        if match is not None:
+            row = self.conn.execute(
+                "SELECT id, content, content_hash, minhash FROM long_term_memory WHERE id = ?", (match,)
+            ).fetchone()
+            existing = {"id": row["id"], "content": row["content"]}
+
+        if match is None or (on_duplicate == "refresh" and kind == "near"):
+            cur = self.conn.execute(
+                "INSERT INTO long_term_memory (content, source, created_at, content_hash, minhash) VALUES (?, ?, ?, ?, ?)",
+                (content, source, now, chash, dedup.pack_signature(sig))
+            )
+            self._index_signature(chash, sig)
+            self.conn.commit()
+            return {"id": cur.lastrowid, "status": "inserted", "match": kind, "existing": existing}
+
+        if on_duplicate == "merge":
+            self.conn.execute(
+                "UPDATE long_term_memory SET content = ?, source = ?, created_at = ?, content_hash = ?, minhash = ? WHERE id = ?",
+                (content, source, now, chash, dedup.pack_signature(sig), match)
+            )
+            self._index_signature(chash, sig)
+            self._prune_lsh([row])  # the replaced text's bands
+            status = "merged"
+        elif on_duplicate == "refresh":
+            self.conn.execute("UPDATE long_term_memory SET created_at = ? WHERE id = ?", (now, match))
+            status = "refreshed"
+        else:
+            status = "skipped"
         self.conn.commit()
+        return {"id": match, "status": status, "match": kind, "existing": existing}
+
+    @_locked
+    def find_duplicate(self, content, chash=None, sig=None, threshold=dedup.NEAR_DUP_THRESHOLD):
+        """Return (id, "exact"|"near") of a stored duplicate of content, or (None, None)."""
+        chash = chash or dedup.content_hash(content)
+        row = self.conn.execute(
+            "SELECT id FROM long_term_memory WHERE content_hash = ? ORDER BY created_at DESC LIMIT 1", (chash,)
+        ).fetchone()
+        if row:
+            return row["id"], "exact"
+
+        sig = sig or dedup.minhash(content)
+        keys = dedup.lsh_buckets(sig)
+        cur = self.conn.execute(f"""
+            SELECT DISTINCT m.id, m.minhash FROM long_term_lsh l
+            JOIN long_term_memory m ON m.content_hash = l.content_hash
+            WHERE l.bucket IN ({','.join('?' * len(keys))})
+        """, keys)
+        best_id, best_sim = None, threshold
+        for cand in cur.fetchall():
+            if not cand["minhash"]:
+                continue
+            sim = dedup.similarity(sig, dedup.unpack_signature(cand["minhash"]))
+            if sim >= best_sim:
+                best_id, best_sim = cand["id"], sim
+        return (best_id, "near") if best_id is not None else (None, None)
+
+    def _index_signature(self, chash, sig):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO long_term_lsh VALUES (?, ?)",
+            [(bucket, chash) for bucket in dedup.lsh_buckets(sig)]
+        )
+
+    def _backfill_signatures(self):
+        """Compute hash/signature for rows stored before dedup existed."""
+        rows = self.conn.execute(
+            "SELECT id, content FROM long_term_memory WHERE content_hash IS NULL OR minhash IS NULL"
+        ).fetchall()
+        if not rows:
+            return
+        for i in range(0, len(rows), 1000):
+            chunk = rows[i:i + 1000]
+            contents = [row["content"] for row in chunk]
+            hashes = [dedup.content_hash(c) for c in contents]
+            sigs = dedup.minhash_many(contents)
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE long_term_memory SET content_hash = ?, minhash = ? WHERE id = ?",
+                    [(h, dedup.pack_signature(s), row["id"]) for h, s, row in zip(hashes, sigs, chunk)]
+                )
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO long_term_lsh VALUES (?, ?)",
+                    [(b, h) for h, keys in zip(hashes, dedup.lsh_buckets_many(sigs)) for b in keys]
+                )
+
+    @_locked
+    def dedupe_long_term(self, threshold=dedup.NEAR_DUP_THRESHOLD):
+        """One-off pass: keep the newest row of every duplicate cluster, delete the rest.
+
+        Returns the number of rows removed.
+        """
+        self._backfill_signatures()
+        rows = self.conn.execute(
+            "SELECT id, content_hash, minhash FROM long_term_memory ORDER BY created_at DESC, id DESC"
+        ).fetchall()
 
+        sigs = [dedup.unpack_signature(row["minhash"]) for row in rows]
+        kept_hashes = set()
+        buckets = {}  # bucket -> [index of kept rows]
+        doomed = []
+        for i, (row, keys) in enumerate(zip(rows, dedup.lsh_buckets_many(sigs))):
+            duplicate = row["content_hash"] in kept_hashes
+            if not duplicate:
+                candidates = {j for key in keys for j in buckets.get(key, ())}
+                duplicate = any(dedup.similarity(sigs[i], sigs[j]) >= threshold for j in candidates)
+            if duplicate:
+                doomed.append(row)
+                continue
+            kept_hashes.add(row["content_hash"])
+            for key in keys:
+                buckets.setdefault(key, []).append(i)
+
+        with self.conn:
+            self.conn.executemany("DELETE FROM long_term_memory WHERE id = ?", [(row["id"],) for row in doomed])
+            self._prune_lsh(doomed)
+        return len(doomed)
+
+    def _prune_lsh(self, rows):
+        """Drop the LSH bands of removed rows (content_hash, minhash) whose content no other row has.
+
+        The bands are recomputed from the stored signature, so each one is a
+        primary-key delete instead of a scan of the whole index.
+        """
+        for row in rows:
+            if not row["minhash"]:
+                continue  # never indexed
+            if self.conn.execute(
+                "SELECT 1 FROM long_term_memory WHERE content_hash = ? LIMIT 1", (row["content_hash"],)
+            ).fetchone():
+                continue
+            self.conn.executemany(
+                "DELETE FROM long_term_lsh WHERE bucket = ? AND content_hash = ?",
+                [(bucket, row["content_hash"]) for bucket in dedup.lsh_buckets(dedup.unpack_signature(row["minhash"]))]
+            )
+
+    @_locked
     def get_long_term(self, limit=10):
         cur = self.conn.execute("""
             SELECT id, content, source, created_at FROM long_term_memory
@@ -95,6 +359,92 @@ class MemoryDB:
         """, (limit,))
         return [{"id": row["id"], "content": row["content"], "source": row["source"], "created_at": row["created_at"]} for row in cur.fetchall()]
 
+    @_locked
     def delete_long_term(self, entry_id: int):
+        row = self.conn.execute(
+            "SELECT content_hash, minhash FROM long_term_memory WHERE id = ?", (entry_id,)
+        ).fetchone()
+        if row is None:
+            return
         self.conn.execute("DELETE FROM long_term_memory WHERE id = ?", (entry_id,))
+        self._prune_lsh([row])
         self.conn.commit()
+
+    # ---------- BULK EXPORT / IMPORT ----------
+    def export_rows(self, batch_size=500):
+        """Yield every stored row as a dict tagged with its `type`.
+
+        Rows are fetched `batch_size` at a time from a dedicated connection so a
+        large export never sits in memory or holds up the shared connection.
+        """
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            for kind, query in EXPORT_QUERIES:
+                cur = conn.execute(query)
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        item = {"type": kind}
+                        item.update(dict(row))
+                        yield item
+        finally:
+            conn.close()
+
+    @_locked
+    def import_rows(self, prefs=(), short_term=(), long_term=()):
+        """Insert pre-validated rows with `executemany` in a single transaction.
+
+        - prefs: iterable of (key, value, updated_at)
+        - short_term: iterable of (role, content, created_at, expires_at)
+        - long_term: iterable of (content, source, created_at)
+
+        Long-term rows that exactly duplicate a stored fact (or an earlier row in
+        the same batch) are skipped; near-duplicates are left to `dedupe_long_term`.
+        Returns the number of skipped duplicates.
+        """
+        long_term = list(long_term)
+        hashes = [dedup.content_hash(content) for content, _source, _created in long_term]
+        existing = set()
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            cur = self.conn.execute(
+                f"SELECT content_hash FROM long_term_memory WHERE content_hash IN ({','.join('?' * len(chunk))})", chunk
+            )
+            existing.update(row["content_hash"] for row in cur.fetchall())
+        fresh = []
+        for row, chash in zip(long_term, hashes):
+            if chash not in existing:
+                existing.add(chash)
+                fresh.append((row, chash))
+
+        sigs = dedup.minhash_many([content for (content, _source, _created), _chash in fresh])
+        facts = [
+            (content, source, created_at, chash, dedup.pack_signature(sig))
+            for ((content, source, created_at), chash), sig in zip(fresh, sigs)
+        ]
+        # sorted keys turn random B-tree inserts into mostly sequential ones
+        bands = sorted((b, chash) for (_row, chash), keys in zip(fresh, dedup.lsh_buckets_many(sigs)) for b in keys)
+
+        with self.conn:
+            if prefs:
+                self.conn.executemany("REPLACE INTO user_prefs VALUES (?, ?, ?)", prefs)
+            if short_term:
+                self.conn.executemany("INSERT INTO short_term_memory VALUES (NULL, ?, ?, ?, ?)", short_term)
+            if facts:
+                self.conn.executemany(
+                    "INSERT INTO long_term_memory (content, source, created_at, content_hash, minhash) VALUES (?, ?, ?, ?, ?)",
+                    facts
+                )
+                self.conn.executemany("INSERT OR IGNORE INTO long_term_lsh VALUES (?, ?)", bands)
+        return len(long_term) - len(facts)
+
+
+# (type, query) pairs streamed by MemoryDB.export_rows, in export order
+EXPORT_QUERIES = [
+    ("pref", "SELECT key, value, updated_at FROM user_prefs ORDER BY key"),
+    ("short_term", "SELECT role, content, created_at, expires_at FROM short_term_memory ORDER BY id"),
+    ("long_term", "SELECT content, source, created_at FROM long_term_memory ORDER BY id"),
+]
@@ -5,6 +5,7 @@ def build_prompt(
     short_term: list,
     long_term: list,
     include_system: bool = True,
+    summary: str = "",
 ) -> str:
 
     parts = []
@@ -26,6 +27,10 @@ def build_prompt(
             else:
                 parts.append(f"- {fact}")
 
+    if summary:
+        parts.append("\nConversation Summary:")
+        parts.append(summary.strip())
+
     if short_term:
         parts.append("\nRecent Context:")
         for row in short_term:
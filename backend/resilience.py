@@ -0,0 +1,162 @@
+# resilience.py
+# Time budgets and circuit breakers for calls to backends that can hang or
+# flap (Ollama, web search providers). A Deadline is created per request and
+# handed down so every stage only gets the time that is left; a CircuitBreaker
+# per backend stops hammering it once it keeps failing.
+
+import random
+import threading
+import time
+
+from config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS, RETRY_BASE_DELAY
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before the work finished."""
+
+    def __init__(self, message="deadline exceeded", partial=""):
+        super().__init__(message)
+        self.partial = partial  # text generated before time ran out, if any
+
+
+class CircuitOpen(Exception):
+    """The backend has been failing; the call was refused without trying it."""
+
+
+class Deadline:
+    """Absolute end time for one request."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def budget(self, cap=None, reserve=0.0) -> float:
+        """Seconds a stage may spend: what is left minus `reserve` (kept for later stages), at most `cap`."""
+        left = max(0.0, self.remaining() - reserve)
+        return left if cap is None else min(cap, left)
+
+    def check(self):
+        if self.expired:
+            raise DeadlineExceeded()
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and refuses calls
+    for `reset_seconds`; then one trial call is let through (half-open) and its
+    outcome closes the circuit again or re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "failures": 0, "retries": 0, "short_circuited": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state, self._trial = HALF_OPEN, False
+            if self.state == OPEN or (self.state == HALF_OPEN and self._trial):
+                self._stats["short_circuited"] += 1
+                return False
+            if self.state == HALF_OPEN:
+                self._trial = True
+            self._stats["calls"] += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self._trial = CLOSED, 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._stats["failures"] += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                if self.state != OPEN:
+                    self._stats["opened"] += 1
+                    print(f"DEBUG | circuit {self.name} opened after {self.failures} failures")
+                self.state, self.opened_at, self._trial = OPEN, time.monotonic(), False
+
+    def _release(self):
+        # The call ended in a way that says nothing about the backend (e.g. cancelled)
+        with self._lock:
+            self._trial = False
+
+    def call(self, fn, *args, retries=0, deadline=None, retry_on=(Exception,), base_delay=RETRY_BASE_DELAY,
+             deadline_cut=True, **kwargs):
+        """Run `fn` through the breaker.
+
+        Failures of type `retry_on` are retried up to `retries` times with full-jitter
+        exponential backoff, as long as `deadline` leaves time for the wait.
+        A failure once `deadline` has passed is not held against the backend:
+        callers cut their timeouts down to the time left, so the backend was not
+        given its usual time to answer.
+        Pass `deadline_cut=False` when `deadline` is the backend's full usual
+        time: then failing after it, or answering only after it, is a failure.
+        Raises CircuitOpen when the circuit refuses the call.
+        """
+        attempt = 0
+        while True:
+            if not self.allow():
+                raise CircuitOpen(f"{self.name} is unavailable (circuit open)")
+            try:
+                result = fn(*args, **kwargs)
+            except retry_on:
+                if deadline is not None and deadline.expired and deadline_cut:
+                    self._release()
+                    raise
+                self.record_failure()
+                delay = random.uniform(0, base_delay * (2 ** attempt))
+                if attempt >= retries or (deadline is not None and deadline.remaining() <= delay):
+                    raise
+                attempt += 1
+                with self._lock:
+                    self._stats["retries"] += 1
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self._release()
+                raise
+            if deadline is not None and deadline.expired and not deadline_cut:
+                self.record_failure()  # too late to be used
+            else:
+                self.record_success()
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, **self._stats}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name) -> CircuitBreaker:
+    """The process-wide breaker for backend `name` (e.g. "ollama", "search:wikipedia")."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def breaker_stats() -> dict:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.stats() for b in breakers}
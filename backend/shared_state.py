@@ -0,0 +1,94 @@
+# shared_state.py
+# State that must be visible to every API worker process (uvicorn --workers N):
+# which /query ids are running and cancel requests for them, /speak playback
+# status and stop requests, prefetched /query answers. Stored as JSON in a
+# small SQLite table with per-entry expiry, namespaced by kind.
+
+import json
+import sqlite3
+import threading
+import time
+
+from config import SHARED_STATE_PATH
+
+PURGE_EVERY = 100  # writes between sweeps of expired rows
+
+
+class SharedStore:
+    def __init__(self, path=SHARED_STATE_PATH):
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        # WAL lets worker processes read while another one writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.lock = threading.Lock()
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS shared_state (
+            ns TEXT,
+            key TEXT,
+            value TEXT,
+            expires_at REAL,
+            PRIMARY KEY (ns, key)
+        )
+        """)
+        self.conn.commit()
+        self._writes = 0
+
+    def put(self, ns, key, value, ttl):
+        with self.lock:
+            self.conn.execute(
+                "REPLACE INTO shared_state VALUES (?, ?, ?, ?)",
+                (ns, key, json.dumps(value, ensure_ascii=False), time.time() + ttl)
+            )
+            self._wrote()
+            self.conn.commit()
+
+    def add(self, ns, key, value, ttl) -> bool:
+        """Store `value` only if `key` is absent (or expired); False if another process holds it."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("DELETE FROM shared_state WHERE ns = ? AND key = ? AND expires_at <= ?", (ns, key, now))
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO shared_state VALUES (?, ?, ?, ?)",
+                (ns, key, json.dumps(value, ensure_ascii=False), now + ttl)
+            )
+            self._wrote()
+            self.conn.commit()
+            return cur.rowcount == 1
+
+    def get(self, ns, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM shared_state WHERE ns = ? AND key = ? AND expires_at > ?",
+                (ns, key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def keys(self, ns) -> set:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key FROM shared_state WHERE ns = ? AND expires_at > ?", (ns, time.time())
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def delete(self, ns, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM shared_state WHERE ns = ? AND key = ?", (ns, key))
+            self.conn.commit()
+
+    def _wrote(self):
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            self.conn.execute("DELETE FROM shared_state WHERE expires_at <= ?", (time.time(),))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_shared_store() -> SharedStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SharedStore()
+    return _store
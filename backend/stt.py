@@ -1,35 +1,468 @@
 # stt.py
-import sounddevice as sd
-from scipy.io.wavfile import write
-from faster_whisper import WhisperModel
-import tempfile
-import os
-
-model = WhisperModel(
-    "small",
-    device="cuda",
-    compute_type="int8_float16"
+import io
+import threading
+
+from config import (
+    STT_MODEL_SIZE, STT_DEVICE, STT_COMPUTE_TYPE, STT_CPU_THREADS, STT_WORKERS, STT_TRIM_SILENCE,
+    STT_MODEL_TIERS, STT_COMMAND_SECONDS,
 )
 
+SAMPLE_RATE = 16000
+# Used by the single-clip and the batched path alike, so a clip gets the same
+# language choice (detected per 30 s chunk) whichever path transcribes it
+DECODE_OPTIONS = {"multilingual": True, "without_timestamps": True}
+
+
+class WhisperEngine:
+    """Lazily loaded faster-whisper model, shared by every caller in the process.
+
+    The model is built on first use (or by `warmup`), exactly once, even when
+    several threads ask for it at the same time.
+    """
+
+    def __init__(self, model_size=STT_MODEL_SIZE, device=STT_DEVICE,
+                 compute_type=STT_COMPUTE_TYPE, cpu_threads=STT_CPU_THREADS, num_workers=STT_WORKERS):
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.num_workers = num_workers
+        self._model = None
+        self._batched = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cuda_available() -> bool:
+        try:
+            import ctranslate2
+            return ctranslate2.get_cuda_device_count() > 0
+        except Exception:
+            return False
+
+    def _resolve(self):
+        device = self.device
+        if device == "auto":
+            device = "cuda" if self._cuda_available() else "cpu"
+        compute_type = self.compute_type
+        if compute_type == "auto":
+            compute_type = "int8_float16" if device == "cuda" else "int8"
+        return device, compute_type
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from faster_whisper import WhisperModel
+
+                    device, compute_type = self._resolve()
+                    print(f"DEBUG | loading whisper '{self.model_size}' on {device} ({compute_type})")
+                    self._model = WhisperModel(
+                        self.model_size,
+                        device=device,
+                        compute_type=compute_type,
+                        cpu_threads=self.cpu_threads,
+                        num_workers=max(1, self.num_workers),
+                    )
+                    self.device, self.compute_type = device, compute_type
+        return self._model
+
+    def transcribe(self, audio, **kwargs) -> str:
+        """Transcribe a path, raw bytes, a file-like object or a float32 16 kHz array."""
+        return self.transcribe_scored(audio, **kwargs)[0]
+
+    def transcribe_scored(self, audio, **kwargs):
+        """Like `transcribe`, but return (text, avg_logprob); avg_logprob is None without segments."""
+        segments, _ = self.model.transcribe(load_audio(audio), **{**DECODE_OPTIONS, **kwargs})
+        return _score(list(segments))
+
+    @property
+    def batched(self):
+        """faster-whisper's BatchedInferencePipeline over the shared model, or None if unavailable."""
+        if self._batched is None:
+            try:
+                from faster_whisper import BatchedInferencePipeline
+            except Exception:
+                self._batched = False
+            else:
+                self._batched = BatchedInferencePipeline(model=self.model)
+        return self._batched or None
+
+    def transcribe_batch(self, clips, scored=False, **kwargs) -> list:
+        """Transcribe several clips (each <= 30 s) in one batched forward pass.
+
+        The clips are laid end to end and passed as `clip_timestamps`, so each one
+        becomes its own chunk in the batch; segments are mapped back by offset.
+        Falls back to one-by-one transcription without the batched pipeline.
+        With `scored`, each result is a (text, avg_logprob) pair.
+        """
+        import numpy as np
+
+        clips = [load_audio(c) for c in clips]
+        pipeline = self.batched
+        if pipeline is None or len(clips) < 2 or any(len(c) > 30 * SAMPLE_RATE for c in clips):
+            results = [self.transcribe_scored(c, **kwargs) for c in clips]
+            return results if scored else [text for text, _ in results]
+
+        offsets, spans, pos = [], [], 0
+        for c in clips:
+            offsets.append(pos / SAMPLE_RATE)
+            spans.append({"start": pos / SAMPLE_RATE, "end": (pos + len(c)) / SAMPLE_RATE})
+            pos += len(c)
+        segments, _ = pipeline.transcribe(
+            np.concatenate(clips),
+            clip_timestamps=spans,
+            batch_size=len(clips),
+            **{**DECODE_OPTIONS, **kwargs},
+        )
+        per_clip = [[] for _ in clips]
+        for seg in segments:
+            idx = max(i for i, off in enumerate(offsets) if off <= seg.start + 1e-3) if seg.start >= 0 else 0
+            per_clip[idx].append(seg)
+        results = [_score(segs) for segs in per_clip]
+        return results if scored else [text for text, _ in results]
+
+    def warmup(self, background=True):
+        """Load the model now; in a daemon thread when `background` is set."""
+        def _load():
+            try:
+                self.model
+            except Exception as e:
+                print("DEBUG | whisper warmup failed:", e)
+
+        if not background:
+            _load()
+            return None
+        t = threading.Thread(target=_load, name="whisper-warmup", daemon=True)
+        t.start()
+        return t
+
+
+def _score(segments):
+    text = " ".join(seg.text for seg in segments).strip()
+    if not segments:
+        return text, None
+    return text, sum(seg.avg_logprob for seg in segments) / len(segments)
+
+
+_engines = {}
+_engine_lock = threading.Lock()
+
+
+def get_engine(model_size=None) -> WhisperEngine:
+    """Shared engine for `model_size` (default STT_MODEL_SIZE); each size loads lazily, once."""
+    model_size = model_size or STT_MODEL_SIZE
+    engine = _engines.get(model_size)
+    if engine is None:
+        with _engine_lock:
+            engine = _engines.get(model_size)
+            if engine is None:
+                engine = _engines[model_size] = WhisperEngine(model_size)
+    return engine
+
+
+def choose_model(duration, queue_depth=0, workers=STT_WORKERS, accuracy=None, tiers=STT_MODEL_TIERS) -> str:
+    """Pick a Whisper size for one clip.
+
+    accuracy="fast" / "high" pins the smallest / largest tier. Otherwise start at
+    the largest tier and step down once for short command-like clips and once
+    per level of backlog (2+ and 4+ queued jobs per worker).
+    """
+    if accuracy == "fast":
+        return tiers[0]
+    if accuracy == "high":
+        return tiers[-1]
+    level = len(tiers) - 1
+    if duration <= STT_COMMAND_SECONDS:
+        level -= 1
+    load = queue_depth / max(1, workers)
+    if load >= 2:
+        level -= 1
+    if load >= 4:
+        level -= 1
+    return tiers[max(0, level)]
+
+
+def larger_model(model_size, tiers=STT_MODEL_TIERS):
+    """The next tier up from `model_size`, or None if it is already the largest."""
+    if model_size not in tiers:
+        return None
+    idx = tiers.index(model_size)
+    return tiers[idx + 1] if idx + 1 < len(tiers) else None
+
+
+def load_audio(audio):
+    """Return mono float32 samples at 16 kHz, decoding containers in memory.
+
+    Accepts a file path, raw bytes (wav/webm/ogg/mp3/...), a binary file-like
+    object, or a NumPy array (float or int16, mono or [frames, channels]) that is
+    already sampled at 16 kHz.
+    """
+    import numpy as np
+
+    if isinstance(audio, np.ndarray):
+        if audio.ndim == 2:
+            audio = audio.mean(axis=1)
+        if audio.dtype == np.int16:
+            return audio.astype(np.float32) / 32768.0
+        return np.ascontiguousarray(audio, dtype=np.float32)
+
+    from faster_whisper import decode_audio
+
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        audio = io.BytesIO(audio)
+    return decode_audio(audio, sampling_rate=SAMPLE_RATE)
+
+
+_trim_lock = threading.Lock()
+_trim_totals = {"clips": 0, "no_speech": 0, "audio_seconds": 0.0, "saved_seconds": 0.0}
+
+
+def prepare_audio(audio, trim=STT_TRIM_SILENCE):
+    """Decode `audio` and strip silence before it reaches Whisper.
+
+    Returns (samples, info); info["speech"] is False when the clip holds no
+    speech, in which case the model should not be run at all.
+    """
+    samples = load_audio(audio)
+    if not trim:
+        seconds = round(len(samples) / SAMPLE_RATE, 2)
+        return samples, {"speech": True, "audio_seconds": seconds, "kept_seconds": seconds, "saved_seconds": 0.0}
+
+    from vad import trim_silence
+
+    samples, info = trim_silence(samples, SAMPLE_RATE)
+    with _trim_lock:
+        _trim_totals["clips"] += 1
+        _trim_totals["no_speech"] += 0 if info["speech"] else 1
+        _trim_totals["audio_seconds"] += info["audio_seconds"]
+        _trim_totals["saved_seconds"] += info["saved_seconds"]
+    return samples, info
+
+
+def trim_stats() -> dict:
+    """Running totals of the silence pre-pass (clips seen, speechless clips, seconds saved)."""
+    with _trim_lock:
+        data = dict(_trim_totals)
+    data["audio_seconds"] = round(data["audio_seconds"], 2)
+    data["saved_seconds"] = round(data["saved_seconds"], 2)
+    return data
+
+
+class _ChunkStream(io.RawIOBase):
+    """Read-only file object over bytes that arrive later from another thread.
+
+    `read` blocks until more data is written or `end` is called, so a
+    container demuxer can consume a live stream one chunk at a time.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._buf = bytearray()
+        self._eof = False
+        self._starved = False  # reader is blocked waiting for input
+        self._cond = threading.Condition()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        with self._cond:
+            while not self._buf and not self._eof:
+                self._starved = True
+                self._cond.notify_all()
+                self._cond.wait()
+            self._starved = False
+            n = min(len(b), len(self._buf))
+            b[:n] = self._buf[:n]
+            del self._buf[:n]
+            return n
+
+    def write_chunk(self, data):
+        with self._cond:
+            self._buf += data
+            self._starved = False
+            self._cond.notify_all()
+
+    def end(self):
+        with self._cond:
+            self._eof = True
+            self._cond.notify_all()
+
+    def wait_starved(self, timeout):
+        """Wait until the reader has consumed everything written so far."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._eof or (self._starved and not self._buf), timeout)
+
+
+class _ContainerDecoder:
+    """Decode a webm/ogg Opus stream incrementally on a helper thread.
+
+    Each chunk is demuxed and decoded once; `push` returns the 16 kHz mono
+    float32 samples that became decodable with it.
+    """
+
+    def __init__(self, fmt, wait=1.0):
+        import queue
+
+        self.wait = wait
+        self._stream = _ChunkStream()
+        self._frames = queue.Queue()
+        self._format = {"webm": "matroska", "ogg": "ogg"}.get(fmt)
+        self._thread = threading.Thread(target=self._run, name="stt-container-decode", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        import av
+        import numpy as np
+
+        try:
+            with av.open(self._stream, mode="r", format=self._format) as container:
+                resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+                for frame in container.decode(audio=0):
+                    for out in resampler.resample(frame):
+                        self._frames.put(out.to_ndarray().reshape(-1).astype(np.float32) / 32768.0)
+                for out in resampler.resample(None):
+                    self._frames.put(out.to_ndarray().reshape(-1).astype(np.float32) / 32768.0)
+        except Exception as e:
+            print("DEBUG | streaming container decode stopped:", e)
+        finally:
+            self._frames.put(None)
+
+    def _drain(self):
+        import numpy as np
+
+        parts = []
+        while not self._frames.empty():
+            part = self._frames.get_nowait()
+            if part is not None:
+                parts.append(part)
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+
+    def push(self, data):
+        self._stream.write_chunk(data)
+        self._stream.wait_starved(self.wait)
+        return self._drain()
+
+    def close(self):
+        """End the stream and return whatever was still being decoded."""
+        self._stream.end()
+        self._thread.join(self.wait)
+        return self._drain()
+
+
+class StreamingTranscriber:
+    """Incremental speech recognition for a stream of audio frames.
+
+    Frames are segmented with `vad.VADSegmenter`; each closed segment is
+    transcribed with the shared Whisper engine as soon as it ends, and the open
+    segment is re-transcribed every `partial_interval` seconds of new speech.
+    `feed` / `finish` return event dicts:
+    {"type": "partial" | "final" | "end_of_utterance", "text": ...}
+
+    Supported formats: "pcm16" (int16 LE), "f32" (float32 LE) at any
+    `sample_rate`, and "webm" / "ogg" (Opus in a container, decoded in memory
+    as the chunks arrive). Call `finish` (or `close`) when the stream ends.
+    """
+
+    def __init__(self, fmt="pcm16", sample_rate=SAMPLE_RATE, engine=None, partial_interval=1.0):
+        from vad import VADSegmenter
+
+        self.fmt = fmt
+        self.sample_rate = sample_rate
+        self.engine = engine or get_engine()
+        self.partial_samples = int(partial_interval * SAMPLE_RATE)
+        self.segmenter = VADSegmenter()
+        self.finals = []
+        self._decoder = _ContainerDecoder(fmt) if fmt in ("webm", "ogg", "opus") else None
+        self._carry = b""  # trailing partial sample, completed by the next frame
+        self._since_partial = 0
+
+    def _samples(self, data: bytes):
+        import numpy as np
+
+        if self._decoder is not None:
+            # Container chunks are not independently decodable; the decoder
+            # thread keeps demuxer state and decodes each chunk once
+            return self._decoder.push(data)
+
+        dtype = np.float32 if self.fmt == "f32" else np.int16
+        data = self._carry + bytes(data)
+        whole = len(data) - len(data) % np.dtype(dtype).itemsize
+        data, self._carry = data[:whole], data[whole:]
+        audio = np.frombuffer(data, dtype=dtype)
+        audio = audio.astype(np.float32) / 32768.0 if dtype == np.int16 else audio.astype(np.float32)
+        if self.sample_rate != SAMPLE_RATE and len(audio):
+            n = int(len(audio) * SAMPLE_RATE / self.sample_rate)
+            audio = np.interp(np.linspace(0, len(audio) - 1, n), np.arange(len(audio)), audio).astype(np.float32)
+        return audio
+
+    def _text(self):
+        return " ".join(t for t in self.finals if t).strip()
+
+    def _handle(self, events):
+        out = []
+        for kind, audio in events:
+            if kind == "segment":
+                text = self.engine.transcribe(audio)
+                self.finals.append(text)
+                self._since_partial = 0
+                out.append({"type": "final", "text": self._text()})
+            elif kind == "end_of_utterance":
+                out.append({"type": "end_of_utterance", "text": self._text()})
+                self.finals = []
+        return out
+
+    def feed(self, data: bytes) -> list:
+        return self._process(self._samples(data))
+
+    def _process(self, audio) -> list:
+        if not len(audio):
+            return []
+        out = self._handle(self.segmenter.push(audio))
+        if self.segmenter.in_speech:
+            self._since_partial += len(audio)
+            if self._since_partial >= self.partial_samples:
+                self._since_partial = 0
+                partial = self.engine.transcribe(self.segmenter.current_segment())
+                out.append({"type": "partial", "text": " ".join(t for t in (self._text(), partial) if t)})
+        return out
+
+    def finish(self) -> list:
+        out = self._process(self.close())
+        return out + self._handle(self.segmenter.flush())
+
+    def close(self):
+        """Stop the container decoder thread; returns samples it had not handed over yet."""
+        import numpy as np
+
+        if self._decoder is None:
+            return np.zeros(0, dtype=np.float32)
+        return self._decoder.close()
+
+
 def record_and_transcribe(seconds=5):
-    fs = 16000
+    import sounddevice as sd
+
+    fs = SAMPLE_RATE
     print("🎤 Listening...")
-    audio = sd.rec(int(seconds * fs), samplerate=fs, channels=1)
+    audio = sd.rec(int(seconds * fs), samplerate=fs, channels=1, dtype="float32")
     sd.wait()
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
-        write(f.name, fs, audio)
-        wav_path = f.name
+    # Straight from the mic buffer to the model, no WAV round-trip
+    return transcribe_audio(audio[:, 0])
 
-    try:
-        text = transcribe_file(wav_path)
-    finally:
-        try:
-            os.unlink(wav_path)
-        except Exception:
-            pass
 
-    return text
+def transcribe_audio(audio) -> str:
+    """Transcribe in-memory audio: bytes, a file-like object or a float32 16 kHz array."""
+    samples, info = prepare_audio(audio)
+    if not info["speech"]:
+        return ""
+    return get_engine().transcribe(samples)
 
 
 def transcribe_file(path: str) -> str:
@@ -37,5 +470,4 @@ def transcribe_file(path: str) -> str:
 
     This is useful when audio is uploaded from a client (web) or saved to disk.
     """
-    segments, _ = model.transcribe(path)
-    return " ".join(seg.text for seg in segments).strip()
+    return transcribe_audio(path)
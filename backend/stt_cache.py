@@ -0,0 +1,132 @@
+# stt_cache.py
+# Content-addressed cache of /stt results, so retried or re-sent clips skip Whisper.
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from hashlib import blake2b
+
+from config import (
+    STT_CACHE_PATH, STT_CACHE_MEMORY_ITEMS, STT_CACHE_MAX_ROWS,
+    STT_MODEL_TIERS, STT_COMPUTE_TYPE, STT_TRIM_SILENCE, STT_ESCALATE_LOGPROB,
+)
+
+
+def transcript_key(samples) -> str:
+    """Hash of the decoded float32 samples plus every setting that changes the transcript.
+
+    The requested accuracy is not part of the key: only transcripts from the
+    largest tier are stored (`is_cacheable`), and those serve every accuracy.
+    """
+    import numpy as np
+
+    h = blake2b(digest_size=20)
+    h.update(np.ascontiguousarray(samples, dtype=np.float32).tobytes())
+    settings = (",".join(STT_MODEL_TIERS), STT_COMPUTE_TYPE, STT_TRIM_SILENCE, STT_ESCALATE_LOGPROB)
+    h.update(repr(settings).encode("utf-8"))
+    return h.hexdigest()
+
+
+def is_cacheable(result) -> bool:
+    """Only largest-tier transcripts are cached. A smaller model picked under
+    load (or for accuracy="fast") must not be replayed to later requests that
+    would have got the full model."""
+    return result.get("model") == STT_MODEL_TIERS[-1]
+
+
+class TranscriptCache:
+    """Bounded LRU in memory in front of a bounded LRU SQLite table.
+
+    Values are the JSON-able /stt result fields (transcript, model and the
+    memory-command flags), stored as-is.
+    """
+
+    def __init__(self, path=STT_CACHE_PATH, memory_items=STT_CACHE_MEMORY_ITEMS, max_rows=STT_CACHE_MAX_ROWS):
+        self.memory_items = memory_items
+        self.max_rows = max_rows
+        self._memory = OrderedDict()
+        self._writes = 0
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS stt_cache (
+            key TEXT PRIMARY KEY,
+            result TEXT,
+            last_used REAL
+        )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_stt_cache_used ON stt_cache(last_used)")
+        self.conn.commit()
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self.lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return dict(result)
+            row = self.conn.execute("SELECT result FROM stt_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE stt_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            result = json.loads(row[0])
+            self._remember(key, result)
+            self.hits += 1
+            return dict(result)
+
+    def lookup(self, samples):
+        """Hash `samples` and fetch in one call (for run_in_threadpool); returns (key, result or None)."""
+        key = transcript_key(samples)
+        return key, self.get(key)
+
+    def set(self, key, result):
+        with self.lock:
+            self._remember(key, dict(result))
+            self.conn.execute(
+                "REPLACE INTO stt_cache VALUES (?, ?, ?)",
+                (key, json.dumps(result, ensure_ascii=False), time.time())
+            )
+            self._writes += 1
+            # Trim the table now and then rather than on every insert
+            if self._writes % 50 == 0:
+                self.conn.execute(
+                    "DELETE FROM stt_cache WHERE key IN "
+                    "(SELECT key FROM stt_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_rows,)
+                )
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self._memory.clear()
+            self.conn.execute("DELETE FROM stt_cache")
+            self.conn.commit()
+
+    def stats(self) -> dict:
+        with self.lock:
+            rows = self.conn.execute("SELECT COUNT(*) FROM stt_cache").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "memory_items": len(self._memory), "rows": rows}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_transcript_cache() -> TranscriptCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TranscriptCache()
+    return _cache
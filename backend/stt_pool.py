@@ -0,0 +1,208 @@
+# stt_pool.py
+# Bounded worker pool that runs Whisper transcription off the API event loop.
+
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from config import STT_WORKERS, STT_QUEUE_SIZE, STT_BATCH_SIZE, STT_REQUEST_TIMEOUT, STT_ESCALATE_LOGPROB
+
+SHORT_CLIP_SECONDS = 30  # clips up to this long can share a batched pass
+
+
+class QueueFull(Exception):
+    """Raised by `submit` when the pool already has STT_QUEUE_SIZE jobs waiting."""
+
+
+class _Job:
+    __slots__ = ("audio", "deadline", "accuracy", "future", "enqueued")
+
+    def __init__(self, audio, deadline, accuracy=None):
+        self.audio = audio
+        self.deadline = deadline
+        self.accuracy = accuracy
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class TranscriptionPool:
+    """Worker threads sharing the process-wide Whisper engines.
+
+    Jobs wait in a bounded queue; a worker takes the oldest job plus any other
+    short clips already waiting (up to STT_BATCH_SIZE), picks a model tier for
+    each (`stt.choose_model`) and transcribes clips of the same tier together.
+    A low-confidence result from a smaller tier is re-run one tier up while the
+    queue is not backed up. Jobs whose deadline passed while queued fail with
+    TimeoutError instead of wasting model time.
+
+    `engine` pins a single engine for every tier (used for tests / custom setups).
+    """
+
+    def __init__(self, engine=None, workers=STT_WORKERS, max_queue=STT_QUEUE_SIZE, batch_size=STT_BATCH_SIZE):
+        from stt import get_engine
+
+        self._engine_for = (lambda size: engine) if engine is not None else get_engine
+        self.batch_size = max(1, batch_size)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "expired": 0, "rejected": 0, "batches": 0,
+                       "batched_jobs": 0, "escalated": 0}
+        self._by_model = {}
+        self._in_flight = 0
+        self._latency = deque(maxlen=500)
+        self._wait = deque(maxlen=500)
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"stt-worker-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    # ---------- submission ----------
+    def submit(self, audio, timeout=STT_REQUEST_TIMEOUT, accuracy=None) -> Future:
+        """Queue a clip; the future resolves to {"text", "model", "avg_logprob", "escalated"}."""
+        job = _Job(audio, time.monotonic() + timeout, accuracy)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._count("rejected")
+            raise QueueFull("STT queue is full")
+        self._count("submitted")
+        return job.future
+
+    def transcribe(self, audio, timeout=STT_REQUEST_TIMEOUT) -> str:
+        """Blocking helper (same shape as WhisperEngine.transcribe) for worker threads."""
+        return self.submit(audio, timeout).result(timeout)["text"]
+
+    async def transcribe_async(self, audio, timeout=STT_REQUEST_TIMEOUT, accuracy=None, detailed=False):
+        """Await a transcript without blocking the event loop; `detailed` returns the full result dict."""
+        future = self.submit(audio, timeout, accuracy)
+        result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        return result if detailed else result["text"]
+
+    # ---------- workers ----------
+    def _take_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        from stt import SAMPLE_RATE, load_audio, choose_model, larger_model
+
+        while True:
+            batch = self._take_batch()
+            now = time.monotonic()
+            live = []
+            for job in batch:
+                if now > job.deadline or not job.future.set_running_or_notify_cancel():
+                    if not job.future.done():
+                        job.future.set_exception(TimeoutError("STT request expired in queue"))
+                    self._count("expired")
+                    continue
+                self._wait.append(now - job.enqueued)
+                live.append(job)
+            if not live:
+                continue
+
+            with self._lock:
+                self._in_flight += len(live)
+            try:
+                self._run(live, load_audio, SAMPLE_RATE, choose_model, larger_model)
+            finally:
+                with self._lock:
+                    self._in_flight -= len(live)
+
+    def _run(self, jobs, load_audio, sample_rate, choose_model, larger_model):
+        groups = {}  # model size -> [(job, samples)]
+        depth, workers = self._queue.qsize(), len(self._threads)
+        for job in jobs:
+            try:
+                clip = load_audio(job.audio)
+            except Exception as e:
+                job.future.set_exception(e)
+                self._count("failed")
+                continue
+            size = choose_model(len(clip) / sample_rate, depth, workers, job.accuracy)
+            groups.setdefault(size, []).append((job, clip))
+
+        for size, items in groups.items():
+            engine = self._engine_for(size)
+            scored = {}
+            short = [(job, clip) for job, clip in items if len(clip) <= SHORT_CLIP_SECONDS * sample_rate]
+            if len(short) > 1:
+                try:
+                    results = engine.transcribe_batch([clip for _, clip in short], scored=True)
+                    scored = {id(job): r for (job, _), r in zip(short, results)}
+                    self._count("batches")
+                    self._count("batched_jobs", len(short))
+                except Exception as e:
+                    print("DEBUG | batched transcription failed, retrying one by one:", e)
+
+            for job, clip in items:
+                try:
+                    text, logprob = scored.get(id(job)) or engine.transcribe_scored(clip)
+                    result = {"text": text, "model": size, "avg_logprob": logprob, "escalated": False}
+                    bigger = larger_model(size)
+                    if (bigger and logprob is not None and logprob < STT_ESCALATE_LOGPROB
+                            and job.accuracy != "fast" and self._queue.qsize() < 2 * workers):
+                        text2, logprob2 = self._engine_for(bigger).transcribe_scored(clip)
+                        self._count("escalated")
+                        if logprob2 is None or logprob2 >= logprob:
+                            result = {"text": text2, "model": bigger, "avg_logprob": logprob2, "escalated": True}
+                    job.future.set_result(result)
+                    self._latency.append(time.monotonic() - job.enqueued)
+                    self._count("completed")
+                    with self._lock:
+                        self._by_model[result["model"]] = self._by_model.get(result["model"], 0) + 1
+                except Exception as e:
+                    job.future.set_exception(e)
+                    self._count("failed")
+
+    # ---------- stats ----------
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    @staticmethod
+    def _percentile(values, pct):
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 3)
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+            data["in_flight"] = self._in_flight
+            data["by_model"] = dict(self._by_model)
+        latency, wait = list(self._latency), list(self._wait)
+        data.update({
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "workers": len(self._threads),
+            "latency_p50_s": self._percentile(latency, 0.5),
+            "latency_p95_s": self._percentile(latency, 0.95),
+            "queue_wait_p50_s": self._percentile(wait, 0.5),
+            "queue_wait_p95_s": self._percentile(wait, 0.95),
+        })
+        return data
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> TranscriptionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = TranscriptionPool()
+    return _pool
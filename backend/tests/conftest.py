@@ -0,0 +1,27 @@
+# conftest.py
+# The backend is a set of flat modules imported by name (as api.py does), so
+# put it on sys.path. Tests run from a scratch directory: the SQLite files
+# (memory.db, shared_state.db, search_cache.db, ...) use relative paths.
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.chdir(tempfile.mkdtemp(prefix="verysleepy-tests-"))
+
+
+@pytest.fixture
+def memory_db(tmp_path, monkeypatch):
+    """A MemoryDB on an empty file, swapped in as the store behind memory.py."""
+    import memory
+    import memory_db as memory_db_module
+
+    monkeypatch.setattr(memory_db_module, "DB_PATH", tmp_path / "memory.db")
+    db = memory_db_module.MemoryDB()
+    monkeypatch.setattr(memory, "memory", db)
+    yield db
+    db.conn.close()
@@ -0,0 +1,26 @@
+from fastapi.testclient import TestClient
+
+import api
+import config
+import tts
+
+
+def test_lifespan_runs_tts_prewarm_from_tts_module(monkeypatch):
+    calls = []
+    monkeypatch.setattr(config, "STT_WARMUP", False)
+    monkeypatch.setattr(config, "TTS_CACHE_PREWARM", True)
+    monkeypatch.setattr(tts, "prewarm_tts", lambda: calls.append("tts"))
+
+    with TestClient(api.app):
+        assert calls == ["tts"]
+
+
+def test_lifespan_skips_disabled_warmups(monkeypatch):
+    calls = []
+    monkeypatch.setattr(config, "STT_WARMUP", False)
+    monkeypatch.setattr(config, "TTS_CACHE_PREWARM", False)
+    monkeypatch.setattr(tts, "prewarm_tts", lambda: calls.append("tts"))
+
+    with TestClient(api.app):
+        pass
+    assert calls == []
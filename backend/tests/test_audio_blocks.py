@@ -0,0 +1,141 @@
+import numpy as np
+import pytest
+
+try:
+    import audio_player
+except (ImportError, OSError) as e:  # sounddevice needs PortAudio
+    pytest.skip(f"no audio output: {e}", allow_module_level=True)
+
+
+class RecordingStream:
+    """Stands in for sd.OutputStream: pulls blocks through the callback right away and keeps them."""
+
+    def __init__(self, samplerate, channels, dtype, blocksize, callback, finished_callback, on_block=None):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.callback = callback
+        self.finished_callback = finished_callback
+        self.on_block = on_block
+        self.blocks = []
+
+    def __enter__(self):
+        try:
+            while True:
+                out = np.full((self.blocksize, self.channels), 9.0, dtype=np.float32)
+                if self.on_block is not None:
+                    self.on_block(len(self.blocks))
+                try:
+                    self.callback(out, self.blocksize, None, None)
+                finally:
+                    self.blocks.append(out)
+        except audio_player.sd.CallbackStop:
+            pass
+        self.finished_callback()
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Streams(list):
+    on_block = None  # called with the block number before each callback
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    opened = Streams()
+
+    def _open(**kwargs):
+        opened.append(RecordingStream(on_block=opened.on_block, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(audio_player.sd, "OutputStream", _open)
+    return opened
+
+
+def _pcm(values):
+    return np.asarray(values, dtype=np.int16).tobytes()
+
+
+def _playing(source, volume=1.0):
+    controller = audio_player.PlaybackController(lambda: source, volume=volume)
+    controller._begin()
+    return controller
+
+
+# ---------- sources ----------
+
+def test_array_source_fills_blocks_and_reports_the_short_last_one():
+    source = audio_player._ArraySource(np.arange(10, dtype=np.float32), 8000)
+    out = np.zeros((4, 1), dtype=np.float32)
+
+    assert [source.read_into(out) for _ in range(4)] == [4, 4, 2, 0]
+    assert out[:2, 0].tolist() == [8.0, 9.0]
+    assert source.channels == 1
+
+
+def test_array_source_keeps_stereo_frames():
+    source = audio_player._ArraySource(np.ones((6, 2)), 8000)
+    out = np.zeros((4, 2), dtype=np.float32)
+
+    assert source.channels == 2
+    assert source.read_into(out) == 4 and source.read_into(out) == 2
+
+
+def test_pcm_source_converts_int16_one_block_at_a_time():
+    source = audio_player._PCMSource(_pcm([0, 16384, -32768, 32767, 8192]), 16000)
+    out = np.zeros((3, 1), dtype=np.float32)
+
+    assert source.read_into(out) == 3
+    assert out[:, 0].tolist() == [0.0, 0.5, -1.0]
+    assert source.read_into(out) == 2
+    assert out[:2, 0].tolist() == pytest.approx([32767 / 32768, 0.25])
+    assert source.read_into(out) == 0
+
+
+# ---------- _play_blocking ----------
+
+def test_play_blocking_streams_whole_clip_and_zero_pads_the_tail(streams):
+    samples = [1000 * (n + 1) for n in range(10)]
+
+    audio_player._play_blocking(_playing(audio_player._PCMSource(_pcm(samples), 16000)), blocksize=4)
+
+    (stream,) = streams
+    assert (stream.samplerate, stream.channels, stream.blocksize) == (16000, 1, 4)
+    played = np.concatenate(stream.blocks)[:, 0]
+    assert len(stream.blocks) == 3
+    assert played[:10] == pytest.approx(np.asarray(samples) / 32768)
+    assert played[10:].tolist() == [0.0, 0.0]
+
+
+def test_play_blocking_applies_volume_per_block_and_clips(streams):
+    source = audio_player._ArraySource(np.asarray([0.2, -0.4, 0.8, -0.9, 0.1], dtype=np.float32), 8000)
+
+    audio_player._play_blocking(_playing(source, volume=2.0), blocksize=2)
+
+    played = np.concatenate(streams[0].blocks)[:, 0]
+    assert played.tolist() == pytest.approx([0.4, -0.8, 1.0, -1.0, 0.2, 0.0])
+
+
+def test_stop_lands_within_one_block(streams):
+    source = audio_player._ArraySource(np.full(100, 0.5, dtype=np.float32), 8000)
+    controller = _playing(source)
+    streams.on_block = lambda n: n == 2 and controller.stop()
+
+    audio_player._play_blocking(controller, blocksize=10)
+
+    blocks = streams[0].blocks
+    assert len(blocks) == 3
+    assert all((b == 0.5).all() for b in blocks[:2])
+    assert (blocks[2] == 0).all()
+    assert source.pos == 20
+
+
+def test_clip_stopped_before_playing_never_opens_a_stream(streams):
+    controller = _playing(audio_player._ArraySource(np.ones(8), 8000))
+    controller.state = audio_player.STOPPED
+
+    audio_player._play_blocking(controller)
+
+    assert streams == []
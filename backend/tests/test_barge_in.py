@@ -0,0 +1,26 @@
+from barge_in import BargeInController, Turn
+
+
+class FakeController:
+    def __init__(self, state):
+        self.state = state
+
+    def stop(self):
+        self.state = "stopped"
+
+
+def test_turn_is_speaking_only_while_a_clip_plays():
+    turn = Turn()
+    clip = FakeController("queued")
+    turn.track_playback(clip)
+
+    assert turn.active and not turn.speaking
+    clip.state = "playing"
+    assert turn.speaking
+    turn.cancel("barge-in")
+    assert clip.state == "stopped" and not turn.speaking
+
+
+def test_headphones_setting_is_per_controller():
+    assert BargeInController(enabled=False, headphones=True).headphones is True
+    assert BargeInController(enabled=False, headphones=False).headphones is False
@@ -0,0 +1,105 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import brain
+import resilience
+from cancellation import Cancelled, CancelToken
+from resilience import Deadline, DeadlineExceeded
+
+
+class StallingOllama:
+    """Answers /api/generate with one NDJSON token, then goes quiet
+    (with `headers=False` it goes quiet before sending anything)."""
+
+    def __init__(self, headers=True):
+        self.headers = headers
+        self.srv = socket.socket()
+        self.srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.srv.bind(("127.0.0.1", 0))
+        self.srv.listen()
+        self.url = "http://127.0.0.1:%d" % self.srv.getsockname()[1]
+        self.client_closed = threading.Event()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        conn, _ = self.srv.accept()
+        request = b""
+        while b"\r\n\r\n" not in request:
+            request += conn.recv(65536)
+        head, body = request.split(b"\r\n\r\n", 1)
+        length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+        while len(body) < length:
+            body += conn.recv(65536)
+        body = b'{"response": "Hel", "done": false}\n'
+        if not self.headers:
+            time.sleep(5)
+            conn.close()
+            return
+        conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n\r\n")
+        conn.sendall(b"%x\r\n%s\r\n" % (len(body), body))
+        conn.settimeout(10)
+        try:
+            if conn.recv(1) == b"":
+                self.client_closed.set()
+        except OSError:
+            self.client_closed.set()
+        conn.close()
+
+
+@pytest.fixture
+def ollama(monkeypatch, request):
+    server = StallingOllama(**getattr(request, "param", {}))
+    monkeypatch.setattr(brain, "OLLAMA_URL", server.url)
+    monkeypatch.setattr(resilience, "_breakers", {})
+    yield server
+    server.srv.close()
+
+
+def test_cancel_drops_a_stream_blocked_mid_read(ollama):
+    cancel = CancelToken()
+    parts = []
+    threading.Timer(0.3, cancel.cancel, args=("barge-in",)).start()
+
+    start = time.monotonic()
+    with pytest.raises(Cancelled):
+        brain._stream_generate({"prompt": "hi"}, cancel=cancel, parts=parts)
+
+    assert time.monotonic() - start < 2
+    assert parts == ["Hel"]
+    assert ollama.client_closed.wait(2)
+    # a cancelled request says nothing about Ollama's health
+    assert resilience.get_breaker("ollama").stats()["failures"] == 0
+
+
+def test_abort_without_a_reachable_socket_still_closes_the_response():
+    class Response:
+        raw = object()  # no public `connection`, e.g. an older urllib3
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    response = Response()
+    brain._abort(response)
+
+    assert response.closed
+
+
+def test_stall_cut_off_by_the_deadline_keeps_partial_and_circuit_closed(ollama):
+    with pytest.raises(DeadlineExceeded) as e:
+        brain._stream_generate({"prompt": "hi"}, deadline=Deadline(0.5))
+
+    assert e.value.partial == "Hel"
+    assert resilience.get_breaker("ollama").stats()["failures"] == 0
+
+
+@pytest.mark.parametrize("ollama", [{"headers": False}], indirect=True)
+def test_no_response_within_the_deadline_is_not_an_ollama_failure(ollama):
+    with pytest.raises(DeadlineExceeded):
+        brain._stream_generate({"prompt": "hi"}, deadline=Deadline(0.5))
+
+    stats = resilience.get_breaker("ollama").stats()
+    assert stats["failures"] == 0 and stats["state"] == resilience.CLOSED
@@ -0,0 +1,54 @@
+import pytest
+
+import compactor
+
+
+def _turns(db, n):
+    for i in range(n):
+        db.add_short_term("user" if i % 2 == 0 else "assistant", f"turn {i} " + "words " * 20)
+
+
+def test_compact_folds_the_rolled_off_window_into_the_summary(memory_db, monkeypatch):
+    folded = []
+    monkeypatch.setattr(compactor, "_summarize", lambda previous, rows: folded.append(rows) or "User talked about turns 0-5.")
+    _turns(memory_db, 10)
+
+    assert compactor.compact(memory_db, threshold=10, keep_recent=4)
+
+    assert [r["content"].split()[1] for r in folded[0]] == ["0", "1", "2", "3", "4", "5"]
+    assert memory_db.get_summary()["summary"] == "User talked about turns 0-5."
+    assert [r["content"].split()[1] for r in memory_db.get_short_term(10)] == ["6", "7", "8", "9"]
+    # nothing new past the window: no second compaction
+    assert not compactor.compact(memory_db, threshold=10, keep_recent=4)
+
+
+def test_error_response_is_not_stored(memory_db, monkeypatch):
+    import requests
+
+    class ErrorResponse:
+        def raise_for_status(self):
+            raise requests.HTTPError("500 Server Error")
+
+        def json(self):
+            return {"response": "model 'phi3:mini' not found"}
+
+    monkeypatch.setattr(requests, "post", lambda *a, **k: ErrorResponse())
+    _turns(memory_db, 10)
+
+    with pytest.raises(requests.HTTPError):
+        compactor.compact(memory_db, threshold=10, keep_recent=4)
+    assert memory_db.get_summary() is None
+
+
+def test_compaction_finished_elsewhere_first_is_not_overwritten(memory_db, monkeypatch):
+    _turns(memory_db, 10)
+    ids = [r["id"] for r in memory_db.get_short_term_since(0)]
+
+    def summarize_while_another_worker_wins(previous, rows):
+        memory_db.set_summary("summary from another worker", ids[7])
+        return "stale summary"
+
+    monkeypatch.setattr(compactor, "_summarize", summarize_while_another_worker_wins)
+
+    assert not compactor.compact(memory_db, threshold=10, keep_recent=4)
+    assert memory_db.get_summary() == {"summary": "summary from another worker", "last_row_id": ids[7]}
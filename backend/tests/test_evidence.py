@@ -0,0 +1,47 @@
+from evidence import compress_evidence
+from tokens import estimate_tokens
+
+
+def _result(n, body):
+    return {"title": f"Result {n}", "href": f"https://example.org/{n}", "body": body}
+
+
+FILLER = "The weather that week was mild and the markets were quiet. "
+
+
+def test_selection_stays_within_the_token_budget_and_keeps_relevant_sentences():
+    results = [
+        _result(1, FILLER * 3 + "Linux was first released by Linus Torvalds in 1991."),
+        _result(2, FILLER.replace("week", "month") * 3 + "The Linux kernel release came in September 1991."),
+        _result(3, "Unrelated travel notes about Lisbon trams and pastries. " * 4),
+    ]
+
+    compressed = compress_evidence("when was linux released", results, token_budget=40)
+
+    assert sum(estimate_tokens(r["body"]) for r in compressed) <= 40
+    bodies = " ".join(r["body"] for r in compressed)
+    assert "Linus Torvalds in 1991" in bodies
+    assert "September 1991" in bodies
+    assert "Lisbon" not in bodies
+
+
+def test_everything_fits_keeps_every_distinct_sentence():
+    results = [_result(1, "Cats sleep a lot. Cats purr."), _result(2, "Cats purr. Dogs bark.")]
+
+    compressed = compress_evidence("cats", results, token_budget=500)
+
+    assert [r["body"] for r in compressed] == ["Cats sleep a lot. Cats purr.", "Dogs bark."]
+
+
+def test_sources_are_renumbered_without_gaps():
+    results = [
+        _result(1, "Linux was released in 1991 by Linus Torvalds."),
+        _result(2, "Linux was released in 1991 by Linus Torvalds!"),  # duplicate snippet
+        _result(3, FILLER * 6),                                       # nothing selected
+        _result(4, "The first Linux release, version 0.01, came out in September 1991."),
+    ]
+
+    compressed = compress_evidence("linux release 1991", results, token_budget=35)
+
+    assert [r["source"] for r in compressed] == [1, 2]
+    assert [r["title"] for r in compressed] == ["Result 1", "Result 4"]
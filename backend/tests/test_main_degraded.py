@@ -0,0 +1,26 @@
+import pytest
+
+import main
+import memory
+from resilience import Deadline
+from web_search import SearchUnavailable
+
+
+@pytest.fixture
+def search_down(monkeypatch):
+    saved = []
+    monkeypatch.setattr(main, "route_intent", lambda text: {"intent": "search_and_explain"})
+    monkeypatch.setattr(main, "web_search", lambda *a, **k: (_ for _ in ()).throw(SearchUnavailable("down")))
+    monkeypatch.setattr(main, "think", lambda *a, **k: "Probably 1991, but I could not verify that.")
+    monkeypatch.setattr(main, "maybe_save_explicit", lambda *a, **k: saved.append(a))
+    monkeypatch.setattr(main, "add_turn", lambda *a, **k: saved.append(a))
+    return saved
+
+
+def test_answer_without_evidence_is_not_saved(search_down):
+    view = memory.MemoryView({}, "", [], [])
+
+    answer = main.handle_query("remember this: when was linux released", deadline=Deadline(30), view=view)
+
+    assert answer == "Probably 1991, but I could not verify that."
+    assert search_down == []
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import api
+import memory_db as memory_db_module
+
+
+def test_threads_sharing_the_connection_keep_transactions_apart(memory_db):
+    errors = []
+
+    def _run(fn):
+        try:
+            fn()
+        except Exception as e:
+            errors.append(e)
+
+    def facts(n):
+        for i in range(40):
+            memory_db.add_long_term(f"Worker {n} fact number {i} is about topic {i * 7 + n}", on_duplicate="insert")
+
+    def turns():
+        for i in range(80):
+            memory_db.add_short_term("user", f"turn {i}")
+
+    def imports():
+        for i in range(10):
+            memory_db.import_rows(long_term=[(f"Imported fact {i}-{j} for batch {i}", "import", "2024-01-01") for j in range(20)])
+
+    def summaries():
+        for i in range(40):
+            memory_db.set_summary(f"summary {i}", i)
+            memory_db.get_short_term(6)
+
+    threads = [threading.Thread(target=_run, args=(fn,)) for fn in
+               (lambda: facts(1), lambda: facts(2), turns, imports, summaries)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    count = memory_db.conn.execute("SELECT COUNT(*) FROM long_term_memory").fetchone()[0]
+    assert count == 40 + 40 + 200
+    assert not memory_db.conn.in_transaction
+
+
+def test_slow_memory_call_does_not_block_query(memory_db, monkeypatch):
+    original = memory_db_module.MemoryDB.get_long_term.__wrapped__
+
+    def slow_get_long_term(self, limit=10):
+        time.sleep(1.0)  # e.g. a commit stuck behind a slow disk
+        return original(self, limit)
+
+    monkeypatch.setattr(memory_db_module.MemoryDB, "get_long_term", memory_db_module._locked(slow_get_long_term))
+    monkeypatch.setattr(api, "_handle_query", lambda user_input, **kwargs: "pong")
+
+    with TestClient(api.app) as client:
+        slow = threading.Thread(target=client.get, args=("/memory",))
+        slow.start()
+        time.sleep(0.2)
+
+        start = time.monotonic()
+        r = client.post("/query", json={"input": "ping"})
+        elapsed = time.monotonic() - start
+        slow.join()
+
+    assert r.json()["response"] == "pong"
+    assert elapsed < 0.5
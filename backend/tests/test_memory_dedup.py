@@ -0,0 +1,64 @@
+def _contents(db):
+    return sorted(r["content"] for r in db.get_long_term(10))
+
+
+def test_exact_repeat_refreshes_existing_fact(memory_db):
+    first = memory_db.add_long_term("User's dentist appointment is on March 12")
+    again = memory_db.add_long_term("  user's dentist appointment is on MARCH 12 ")
+
+    assert again["status"] == "refreshed"
+    assert again["match"] == "exact"
+    assert again["id"] == first["id"]
+    assert _contents(memory_db) == ["User's dentist appointment is on March 12"]
+
+
+def test_near_match_differing_in_a_digit_is_stored_separately(memory_db):
+    old = memory_db.add_long_term("User's office phone number is 555-1234, call after nine")
+    new = memory_db.add_long_term("User's office phone number is 555-1235, call after nine")
+
+    assert new["match"] == "near"
+    assert new["status"] == "inserted"
+    assert new["id"] != old["id"]
+    assert new["existing"] == {"id": old["id"], "content": "User's office phone number is 555-1234, call after nine"}
+    assert len(_contents(memory_db)) == 2
+
+
+def test_near_match_differing_in_a_date_is_stored_separately(memory_db):
+    memory_db.add_long_term("User's sister Mia is flying in from Boston on March 12 next year")
+    new = memory_db.add_long_term("User's sister Mia is flying in from Boston on March 13 next year")
+
+    assert (new["status"], new["match"]) == ("inserted", "near")
+    assert _contents(memory_db) == [
+        "User's sister Mia is flying in from Boston on March 12 next year",
+        "User's sister Mia is flying in from Boston on March 13 next year",
+    ]
+
+
+def test_merge_still_replaces_a_near_match(memory_db):
+    old = memory_db.add_long_term("User's office phone number is 555-1234, call after nine")
+    new = memory_db.add_long_term("User's office phone number is 555-1235, call after nine", on_duplicate="merge")
+
+    assert (new["status"], new["match"], new["id"]) == ("merged", "near", old["id"])
+    assert _contents(memory_db) == ["User's office phone number is 555-1235, call after nine"]
+
+
+
+def _indexed_hashes(db):
+    return {row[0] for row in db.conn.execute("SELECT DISTINCT content_hash FROM long_term_lsh")}
+
+
+def test_delete_drops_only_the_deleted_rows_bands(memory_db):
+    keep = memory_db.add_long_term("User's cat is called Tom and likes tuna")
+    gone = memory_db.add_long_term("User's favourite band is Radiohead since 1997")
+    copy = memory_db.add_long_term("User's cat is called Tom and likes tuna", on_duplicate="insert")
+    hashes = {r["id"]: r["content_hash"] for r in memory_db.conn.execute("SELECT id, content_hash FROM long_term_memory")}
+
+    statements = []
+    memory_db.conn.set_trace_callback(statements.append)
+    memory_db.delete_long_term(gone["id"])
+    memory_db.delete_long_term(copy["id"])  # same text as `keep`, whose bands must stay
+    memory_db.conn.set_trace_callback(None)
+
+    assert _indexed_hashes(memory_db) == {hashes[keep["id"]]}
+    assert not any("NOT IN" in sql for sql in statements)
+    assert memory_db.find_duplicate("User's cat is called Tom and likes tuna!!")[0] == keep["id"]
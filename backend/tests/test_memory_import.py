@@ -0,0 +1,57 @@
+import json
+
+import memory
+
+
+def _lines(*records):
+    return [r if isinstance(r, str) else json.dumps(r) for r in records]
+
+
+def test_bad_rows_are_rejected_without_failing_the_batch(memory_db):
+    report = memory.import_memory_batch(_lines(
+        {"type": "long_term", "content": "User's sister is called Mia"},
+        {"type": "long_term", "content": 123},
+        {"type": "long_term", "content": "User likes jazz", "source": ["x"]},
+        {"type": "pref", "key": "voice", "value": "amy"},
+        {"type": "pref", "key": "opinion_mode", "value": {"nested": True}},
+        {"type": "pref", "key": 7, "value": "x"},
+        {"type": "short_term", "role": "user", "content": "hello"},
+        {"type": "short_term", "content": None},
+        "[1, 2]",
+        "not json",
+        {"type": "mystery"},
+    ))
+
+    assert report["accepted"] == 3
+    assert report["rejected"] == 8
+    assert report["reasons"] == {"malformed": 7, "unknown_type": 1}
+    assert [r["content"] for r in memory_db.get_long_term(10)] == ["User's sister is called Mia"]
+    assert memory_db.get_prefs() == {"voice": "amy"}
+
+
+def test_import_continues_after_a_bad_batch(memory_db):
+    report = memory.new_import_report()
+    memory.import_memory_batch(_lines({"type": "long_term", "content": 1.5}), report)
+    memory.import_memory_batch(_lines({"type": "long_term", "content": "User owns a cat"}), report)
+
+    assert report == {"accepted": 1, "rejected": 1, "reasons": {"malformed": 1}}
+
+
+def test_endpoint_drops_an_overlong_line_without_buffering_it(memory_db, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import api
+
+    monkeypatch.setattr(memory, "MAX_IMPORT_LINE_BYTES", 1000)
+
+    def body():
+        yield b'{"type": "long_term", "content": "User owns a cat"}\n{"type": "long_term", "content": "'
+        for _ in range(50):
+            yield b"x" * 500  # no newline for 25 kB
+        yield b'"}\n{"type": "long_term", "content": "User likes jazz"}\n'
+
+    with TestClient(api.app) as client:
+        report = client.post("/memory/import", content=body()).json()
+
+    assert report == {"accepted": 2, "rejected": 1, "reasons": {"too_long": 1}}
+    assert sorted(r["content"] for r in memory_db.get_long_term(10)) == ["User likes jazz", "User owns a cat"]
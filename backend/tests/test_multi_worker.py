@@ -0,0 +1,161 @@
+# Two real API worker processes sharing one shared_state.db, as with
+# `uvicorn api:app --workers 2`: state created by one must be usable from the other.
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+requests = pytest.importorskip("requests")
+pytest.importorskip("uvicorn")
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# Runs api.app with the query handler and piper replaced, so only the
+# cross-process plumbing (registry, shared store, scheduler) is real
+WORKER = """
+import sys
+import numpy as np
+import uvicorn
+
+import shared_state
+shared_state._store = shared_state.SharedStore(sys.argv[2])
+
+import api
+import tts
+
+
+def handle_query(user_input, source="text", cancel=None, deadline=None, mode=None, view=None):
+    if user_input == "hang":
+        while not cancel.wait(0.05):
+            pass
+        cancel.check()
+    return "Answer to " + user_input + "."
+
+
+def synthesize_one(text, voice_model, use_cache=True):
+    t = np.arange(22050 * 3) / 22050
+    return (0.3 * np.sin(2 * np.pi * 220 * t) * 32767).astype(np.int16).tobytes(), 22050
+
+
+api._handle_query = handle_query
+tts._synthesize_one = synthesize_one
+uvicorn.run(api.app, host="127.0.0.1", port=int(sys.argv[1]), log_level="warning")
+"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start(tmp_path, shared_db):
+    port = _free_port()
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(BACKEND), os.environ.get("PYTHONPATH", "")])}
+    proc = subprocess.Popen([sys.executable, "-c", WORKER, str(port), str(shared_db)], cwd=tmp_path, env=env)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            requests.get(url + "/query/stats", timeout=1)
+            return proc, url
+        except requests.ConnectionError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.05)
+    proc.kill()
+    pytest.fail("API worker did not start")
+
+
+@pytest.fixture
+def shared_db(tmp_path):
+    return tmp_path / "shared_state.db"
+
+
+@pytest.fixture
+def workers(tmp_path, shared_db):
+    started = [_start(tmp_path, shared_db) for _ in range(2)]
+    yield [url for _proc, url in started]
+    for proc, _url in started:
+        proc.terminate()
+        proc.wait(10)
+
+
+def _post_async(url, **kwargs):
+    result = {}
+
+    def _run():
+        result["response"] = requests.post(url, timeout=30, **kwargs)
+
+    thread = threading.Thread(target=_run)
+    thread.start()
+    return thread, result
+
+
+def _until(fn, timeout=5.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        value = fn()
+        if value:
+            return value
+        time.sleep(0.05)
+    return fn()
+
+
+def test_cancel_reaches_a_query_running_in_another_worker(workers):
+    a, b = workers
+    thread, result = _post_async(a + "/query", json={"input": "hang", "id": "q-cancel"})
+
+    cancelled = _until(lambda: requests.post(b + "/query/q-cancel/cancel", timeout=5).json()["status"] == "cancelled")
+    thread.join(10)
+
+    assert cancelled
+    assert result["response"].status_code == 499
+    assert requests.post(b + "/query/q-cancel/cancel", timeout=5).json()["status"] == "not_found"
+
+
+def test_query_id_is_unique_across_workers(workers, shared_db):
+    from shared_state import SharedStore
+
+    a, b = workers
+    store = SharedStore(shared_db)
+    thread, result = _post_async(a + "/query", json={"input": "hang", "id": "q-dup"})
+    assert _until(lambda: "q-dup" in store.keys("query"))
+
+    assert requests.post(b + "/query", json={"input": "hi", "id": "q-dup"}, timeout=5).status_code == 409
+    requests.post(b + "/query/q-dup/cancel", timeout=5)
+    thread.join(10)
+    assert result["response"].status_code == 499
+
+
+def test_prefetched_answer_is_spoken_by_another_worker(workers):
+    a, b = workers
+    r = requests.post(a + "/query", json={"input": "hello", "id": "q-pre", "prefetch_voice": "en_US-lessac"}, timeout=10)
+    assert r.json() == {"response": "Answer to hello.", "id": "q-pre"}
+
+    audio = requests.get(b + "/speak/stream", params={"response_id": "q-pre"}, timeout=10)
+
+    assert audio.status_code == 200
+    assert audio.headers["content-type"] == "audio/wav"
+    assert audio.content[:4] == b"RIFF" and len(audio.content) > 22050
+
+
+def test_playback_status_and_stop_across_workers(workers):
+    try:
+        import audio_player  # noqa: F401  (the workers need sounddevice / PortAudio too)
+    except (ImportError, OSError) as e:
+        pytest.skip(f"no audio output: {e}")
+    a, b = workers
+    play = requests.post(a + "/speak", json={"text": "A long reply.", "channel": "mw"}, timeout=10).json()
+    assert play["id"]
+
+    assert _until(lambda: requests.get(b + f"/speak/{play['id']}", timeout=5).json().get("status") == "playing")
+    assert requests.post(b + f"/speak/{play['id']}/stop", timeout=5).json()["status"] in ("playing", "stopped")
+
+    assert _until(lambda: requests.get(a + f"/speak/{play['id']}", timeout=5).json().get("status") == "stopped")
+    assert requests.get(b + f"/speak/{play['id']}", timeout=5).json()["status"] == "stopped"
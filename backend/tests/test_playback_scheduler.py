@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+try:
+    import audio_player
+except (ImportError, OSError) as e:  # sounddevice needs PortAudio
+    pytest.skip(f"no audio output: {e}", allow_module_level=True)
+
+
+def _until(check, timeout=5.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if check():
+            return True
+        time.sleep(0.02)
+    return check()
+
+
+def _threads(prefix):
+    return [t for t in threading.enumerate() if t.name.startswith(prefix)]
+
+
+@pytest.fixture(autouse=True)
+def silent(monkeypatch):
+    monkeypatch.setattr(audio_player, "_play_blocking", lambda controller: time.sleep(0.01))
+
+
+def _clip(channel):
+    return audio_player.PlaybackController(lambda: None, channel=channel)
+
+
+def test_idle_channels_release_their_worker_threads():
+    scheduler = audio_player.PlaybackScheduler(idle_seconds=0.2)
+    before = len(_threads("playback-client-"))
+
+    clips = [scheduler.schedule(_clip(f"client-{n}")) for n in range(40)]
+    assert _until(lambda: all(c.state == audio_player.DONE for c in clips))
+
+    assert _until(lambda: not scheduler._queues)
+    assert _until(lambda: len(_threads("playback-client-")) == before)
+    # a channel that comes back gets a fresh worker
+    again = scheduler.schedule(_clip("client-1"))
+    assert _until(lambda: again.state == audio_player.DONE)
+
+
+def test_busy_channel_keeps_its_worker_while_clips_arrive():
+    scheduler = audio_player.PlaybackScheduler(idle_seconds=0.3)
+    clips = []
+    for _ in range(5):
+        clips.append(scheduler.schedule(_clip("steady")))
+        time.sleep(0.1)
+
+    assert _until(lambda: all(c.state == audio_player.DONE for c in clips))
+    assert len(_threads("playback-steady")) <= 1
+
+
+def test_stop_watcher_runs_only_while_channels_are_open(monkeypatch):
+    monkeypatch.setattr(audio_player, "STOP_POLL_SECONDS", 0.02)
+    scheduler = audio_player.PlaybackScheduler(shared=True, idle_seconds=0.2)
+    assert not scheduler._watching
+
+    clip = scheduler.schedule(_clip("watched"))
+    assert scheduler._watching
+    assert _until(lambda: clip.state == audio_player.DONE)
+
+    assert _until(lambda: not scheduler._watching)
+    scheduler.schedule(_clip("watched"))
+    assert scheduler._watching
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+import cancellation
+import config
+import main
+
+
+@pytest.fixture
+def answers(memory_db, monkeypatch):
+    monkeypatch.setattr(main, "route_intent", lambda text: {"intent": "chat"})
+    monkeypatch.setattr(main, "think", lambda text, **kwargs: f"answer to {text}")
+    monkeypatch.setattr(api, "_handle_query", main.handle_query)
+    return memory_db
+
+
+def test_handle_query_without_persist_writes_nothing(answers):
+    main.handle_query("remember that my cat is called Tom", persist=False)
+    assert answers.get_short_term(10) == []
+    assert answers.get_long_term() == []
+
+    main.handle_query("remember that my cat is called Tom")
+    assert len(answers.get_short_term(10)) == 2
+
+
+def test_batch_leaves_conversation_state_alone(answers, monkeypatch):
+    compactions = []
+    monkeypatch.setattr("compactor.schedule_compaction", lambda db: compactions.append(db))
+    items = [{"input": "remember that my cat is called Tom"}, {"input": "what is 2 + 2"}]
+
+    with TestClient(api.app) as client:
+        r = client.post("/query/batch", json={"items": items})
+
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert [line["status"] for line in lines[:-1]] == ["ok", "ok"]
+    assert lines[-1]["ok"] == 2
+    assert answers.get_short_term(10) == []
+    assert answers.get_long_term() == []
+    assert compactions == []
+
+
+def test_batch_id_is_reserved_for_the_whole_batch_and_released(answers, monkeypatch):
+    registry = cancellation.get_request_registry()
+    ttls = []
+    register = registry.register
+    monkeypatch.setattr(registry, "register", lambda *a, **k: ttls.append(k.get("ttl")) or register(*a, **k))
+    items = [{"input": f"question {n}"} for n in range(9)]
+
+    with TestClient(api.app) as client:
+        r = client.post("/query/batch", json={"items": items, "concurrency": 4, "id": "batch-ttl"})
+        assert json.loads(r.text.splitlines()[-1])["done"]
+        # finished, so the id can be used again
+        r = client.post("/query/batch", json={"items": items[:1], "id": "batch-ttl"})
+        assert r.status_code == 200
+
+    # 9 items, 4 at a time: three rounds of a full query deadline
+    assert ttls[0] == 3 * config.QUERY_DEADLINE_SECONDS + 60
+    assert registry.get("batch-ttl") is None
+
+
+def _slow_unless_cancelled(text, cancel=None, **kwargs):
+    if text == "fast":
+        return "quick answer"
+    end = time.monotonic() + 5
+    while time.monotonic() < end:
+        cancel.check()
+        time.sleep(0.02)
+    return "slow answer"
+
+
+async def _post_and_disconnect_after_first_line(body):
+    """Drive the ASGI app directly: the client goes away once a line has arrived."""
+    first_line = asyncio.Event()
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}
+        await first_line.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            first_line.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": "/query/batch", "raw_path": b"/query/batch",
+        "query_string": b"", "root_path": "", "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    await asyncio.wait_for(api.app(scope, receive, send), timeout=10)
+
+
+def test_disconnect_mid_stream_releases_the_batch_id(memory_db, monkeypatch):
+    monkeypatch.setattr(api, "_handle_query", _slow_unless_cancelled)
+    registry = cancellation.get_request_registry()
+    cancelled = registry.stats()["cancelled"]
+
+    asyncio.run(_post_and_disconnect_after_first_line(
+        {"items": [{"input": "fast"}, {"input": "slow"}], "id": "batch-gone"}
+    ))
+
+    assert registry.get("batch-gone") is None
+    assert registry.stats()["cancelled"] == cancelled + 1
+    registry.register("batch-gone")  # the id is free again, here and in the shared store
+    registry.finish("batch-gone", "completed")
+
+
+def test_cancel_received_by_another_worker_stops_the_batch(memory_db, monkeypatch):
+    from shared_state import SharedStore
+
+    monkeypatch.setattr(api, "_handle_query", _slow_unless_cancelled)
+    monkeypatch.setattr(config, "QUERY_DISCONNECT_POLL_SECONDS", 0.05)
+    registry = cancellation.get_request_registry()
+    # a second worker process: its own registry and connection to the same store
+    other_worker = cancellation.CancelRegistry(SharedStore(config.SHARED_STATE_PATH), "query")
+    result = {}
+
+    with TestClient(api.app) as client:
+        def post():
+            result["response"] = client.post("/query/batch", json={"items": [{"input": "slow"}], "id": "batch-remote"})
+
+        thread = threading.Thread(target=post)
+        start = time.monotonic()
+        thread.start()
+        while registry.get("batch-remote") is None and time.monotonic() - start < 5:
+            time.sleep(0.02)
+
+        assert other_worker.cancel("batch-remote", "cancelled_by_client")
+        thread.join(10)
+
+    lines = [json.loads(line) for line in result["response"].text.splitlines()]
+    assert lines[0]["status"] == "cancelled"
+    assert lines[-1]["cancelled"] == 1
+    assert time.monotonic() - start < 3
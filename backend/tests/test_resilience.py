@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from resilience import CLOSED, OPEN, CircuitBreaker, Deadline
+
+
+def _fail():
+    raise TimeoutError("backend timed out")
+
+
+def test_failures_open_the_circuit_and_calls_are_refused():
+    breaker = CircuitBreaker("t", failure_threshold=2, reset_seconds=60)
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            breaker.call(_fail, retry_on=(TimeoutError,))
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_failure_after_the_deadline_passed_is_not_held_against_the_backend():
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_seconds=60)
+    deadline = Deadline(0.05)
+
+    def _times_out_with_the_budget():
+        time.sleep(deadline.remaining() + 0.01)
+        _fail()
+
+    with pytest.raises(TimeoutError):
+        breaker.call(_times_out_with_the_budget, retries=2, deadline=deadline, retry_on=(TimeoutError,))
+
+    assert breaker.state == CLOSED
+    assert breaker.stats()["failures"] == 0
+    assert breaker.stats()["retries"] == 0
+
+
+def test_expired_deadline_releases_a_half_open_trial():
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_seconds=0)
+    with pytest.raises(TimeoutError):
+        breaker.call(_fail, retry_on=(TimeoutError,))
+    deadline = Deadline(0)
+
+    with pytest.raises(TimeoutError):
+        breaker.call(_fail, deadline=deadline, retry_on=(TimeoutError,))
+
+    # the trial ended without a verdict, so another one may go through
+    assert breaker.allow()
+
+
+def test_full_time_deadline_counts_a_late_answer_as_a_failure():
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_seconds=60)
+    deadline = Deadline(0.05)
+
+    def _answers_late():
+        time.sleep(0.1)
+        return "late"
+
+    assert breaker.call(_answers_late, deadline=deadline, deadline_cut=False) == "late"
+    assert breaker.state == OPEN
+    assert breaker.stats()["failures"] == 1
@@ -0,0 +1,106 @@
+import struct
+import sys
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+import tts
+
+
+@pytest.fixture
+def client():
+    with TestClient(api.app) as c:
+        yield c
+
+
+def _fail(*args, **kwargs):
+    raise RuntimeError("no audio device")
+
+
+@pytest.fixture
+def broken_player(monkeypatch):
+    """An audio_player whose in-app playback fails, so speak() falls back to play_audio."""
+    module = types.ModuleType("audio_player")
+    module.play_pcm_in_app = _fail
+    monkeypatch.setitem(sys.modules, "audio_player", module)
+
+
+def test_speak_reports_generation_failure(client, monkeypatch):
+    monkeypatch.setattr(tts, "synthesize", _fail)
+
+    r = client.post("/speak", json={"text": "hello there"})
+
+    assert r.status_code == 500
+    assert "no audio device" in r.json()["detail"]
+
+
+def test_speak_reports_playback_failure(client, monkeypatch, broken_player):
+    monkeypatch.setattr(tts, "synthesize", lambda text, voice: (b"\0\0" * 100, 22050))
+    monkeypatch.setattr(tts, "play_audio", _fail)
+
+    assert client.post("/speak", json={"text": "hello there"}).status_code == 500
+
+
+def test_speak_done_only_after_fallback_played(client, monkeypatch, broken_player):
+    played = []
+    monkeypatch.setattr(tts, "synthesize", lambda text, voice: (b"\0\0" * 100, 22050))
+    monkeypatch.setattr(tts, "play_audio", lambda pcm, rate, volume=1.0: played.append(rate))
+
+    r = client.post("/speak", json={"text": "hello there"})
+
+    assert r.json() == {"id": None, "status": "done"}
+    assert played == [22050]
+
+
+def test_speak_without_raise_errors_still_swallows_failures(monkeypatch):
+    monkeypatch.setattr(tts, "synthesize", _fail)
+    assert tts.speak("hello", "en_US-lessac") is None
+
+
+# ---------- /speak/stream ----------
+
+SENTENCES = ["The first sentence is long enough.", "Here comes the second one now.", "And a third to finish it off."]
+
+
+def _loud(sentence):
+    return struct.pack("<h", 1000 * (SENTENCES.index(sentence) + 1)) * 50
+
+
+@pytest.fixture
+def fake_sentences(monkeypatch):
+    monkeypatch.setattr(tts, "_synthesize_one", lambda text, voice, use_cache=True: (_loud(text), 16000))
+
+
+def test_speak_stream_sends_wav_header_then_sentences_with_gaps(client, fake_sentences):
+    r = client.post("/speak/stream", json={"text": " ".join(SENTENCES)})
+
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "audio/wav"
+    header = tts.wav_stream_header(16000)
+    assert r.content[:44] == header
+    assert r.content[:4] == b"RIFF" and r.content[8:16] == b"WAVEfmt "
+    channels, rate, byte_rate, _, bits = struct.unpack("<HIIHH", r.content[22:36])
+    assert (channels, rate, byte_rate, bits) == (1, 16000, 32000, 16)
+    gap = tts.silence_pcm(tts.SENTENCE_GAP_SECONDS, 16000)
+    assert r.content[44:] == gap.join(_loud(s) for s in SENTENCES)
+
+
+def test_speak_stream_get_matches_post(client, fake_sentences):
+    text = " ".join(SENTENCES)
+    assert client.get("/speak/stream", params={"text": text}).content == client.post("/speak/stream", json={"text": text}).content
+
+
+def test_speak_stream_first_sentence_failure_is_a_500(client, monkeypatch):
+    monkeypatch.setattr(tts, "_synthesize_one", _fail)
+
+    r = client.post("/speak/stream", json={"text": " ".join(SENTENCES)})
+
+    assert r.status_code == 500
+    assert "no audio device" in r.json()["detail"]
+
+
+def test_speak_stream_rejects_empty_text_and_bad_voice(client, fake_sentences):
+    assert client.post("/speak/stream", json={"text": "  "}).status_code == 400
+    assert client.post("/speak/stream", json={"text": SENTENCES[0], "voice": "../x"}).status_code == 400
@@ -0,0 +1,79 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+import stt_cache
+import stt_pool
+from config import STT_MODEL_TIERS
+
+
+class FakePool:
+    def __init__(self):
+        self.model = STT_MODEL_TIERS[-1]
+        self.calls = 0
+
+    async def transcribe_async(self, samples, timeout=None, accuracy=None, detailed=False):
+        self.calls += 1
+        return {"text": f"hello from {self.model}", "model": self.model, "escalated": False}
+
+
+def _wav():
+    t = np.arange(16000) / 16000
+    speech = np.concatenate((np.zeros(4000), 0.3 * np.sin(2 * np.pi * 220 * t), np.zeros(4000)))
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes((speech * 32767).astype(np.int16).tobytes())
+    return buf.getvalue()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    pytest.importorskip("faster_whisper")
+    pool = FakePool()
+    monkeypatch.setattr(stt_pool, "get_pool", lambda: pool)
+    monkeypatch.setattr(stt_cache, "_cache", stt_cache.TranscriptCache(tmp_path / "stt_cache.db"))
+    with TestClient(api.app) as c:
+        c.pool = pool
+        yield c
+
+
+def _post(client, **params):
+    return client.post("/stt", params=params, files={"file": ("clip.wav", _wav(), "audio/wav")}).json()
+
+
+def test_key_ignores_accuracy_but_not_audio():
+    a = np.zeros(160, dtype=np.float32)
+    assert stt_cache.transcript_key(a) == stt_cache.transcript_key(a.copy())
+    assert stt_cache.transcript_key(a) != stt_cache.transcript_key(a + 0.1)
+
+
+def test_only_largest_tier_results_are_cacheable():
+    assert stt_cache.is_cacheable({"model": STT_MODEL_TIERS[-1]})
+    assert not stt_cache.is_cacheable({"model": STT_MODEL_TIERS[0]})
+
+
+def test_small_model_transcript_is_not_replayed(client):
+    client.pool.model = STT_MODEL_TIERS[0]
+    first = _post(client, accuracy="fast")
+    client.pool.model = STT_MODEL_TIERS[-1]
+    second = _post(client)
+
+    assert first["cached"] is False and second["cached"] is False
+    assert second["model"] == STT_MODEL_TIERS[-1]
+    assert client.pool.calls == 2
+
+
+def test_largest_tier_transcript_serves_any_accuracy(client):
+    _post(client, accuracy="high")
+    again = _post(client, accuracy="fast")
+
+    assert again["cached"] is True
+    assert again["model"] == STT_MODEL_TIERS[-1]
+    assert client.pool.calls == 1
@@ -0,0 +1,132 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import stt
+from config import STT_ESCALATE_LOGPROB
+
+
+class RecordingModel:
+    """Stands in for WhisperModel / BatchedInferencePipeline and records the decode options."""
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, **kwargs):
+        self.calls.append(kwargs)
+        spans = kwargs.get("clip_timestamps") or [{"start": 0.0}]
+        return [SimpleNamespace(text=f"clip {i}", start=s["start"], avg_logprob=-0.2) for i, s in enumerate(spans)], None
+
+
+def _engine():
+    engine = stt.WhisperEngine("tiny")
+    engine._model, engine._batched = RecordingModel(), RecordingModel()
+    return engine
+
+
+def _decode_options(call):
+    return {k: call[k] for k in stt.DECODE_OPTIONS}
+
+
+def test_single_and_batched_paths_use_the_same_decode_options():
+    engine = _engine()
+    clip = np.zeros(stt.SAMPLE_RATE, dtype=np.float32)
+
+    assert engine.transcribe(clip) == "clip 0"
+    assert engine.transcribe_batch([clip, clip]) == ["clip 0", "clip 1"]
+
+    single, batched = engine._model.calls[0], engine._batched.calls[0]
+    assert _decode_options(single) == _decode_options(batched) == stt.DECODE_OPTIONS
+
+
+def test_callers_can_still_override_a_decode_option():
+    engine = _engine()
+
+    engine.transcribe(np.zeros(stt.SAMPLE_RATE, dtype=np.float32), multilingual=False)
+
+    assert engine._model.calls[0]["multilingual"] is False
+
+
+# ---------- model tiering ----------
+
+TIERS = ["tiny", "base", "small"]
+
+
+@pytest.mark.parametrize("duration, depth, workers, accuracy, expected", [
+    (10.0, 0, 2, None, "small"),    # idle, long clip: largest tier
+    (2.0, 0, 2, None, "base"),      # voice command: one tier down
+    (10.0, 4, 2, None, "base"),     # 2 jobs queued per worker: one tier down
+    (10.0, 8, 2, None, "tiny"),     # 4 per worker: two tiers down
+    (2.0, 8, 2, None, "tiny"),      # never below the smallest tier
+    (10.0, 3, 2, None, "small"),    # 1.5 per worker is not backed up yet
+    (60.0, 8, 2, "high", "small"),  # an accuracy hint pins the tier regardless of load
+    (1.0, 0, 2, "fast", "tiny"),
+])
+def test_choose_model(duration, depth, workers, accuracy, expected):
+    assert stt.choose_model(duration, depth, workers, accuracy, tiers=TIERS) == expected
+
+
+def test_command_length_threshold_is_inclusive():
+    assert stt.choose_model(stt.STT_COMMAND_SECONDS, tiers=TIERS) == "base"
+    assert stt.choose_model(stt.STT_COMMAND_SECONDS + 0.01, tiers=TIERS) == "small"
+
+
+def test_larger_model():
+    assert [stt.larger_model(t, TIERS) for t in TIERS] == ["base", "small", None]
+    assert stt.larger_model("large-v3", TIERS) is None
+
+
+class TierEngine:
+    def __init__(self, size, logprob):
+        self.size, self.logprob, self.calls = size, logprob, 0
+
+    def transcribe_scored(self, clip):
+        self.calls += 1
+        return f"{self.size} text", self.logprob
+
+
+def _pool(monkeypatch, logprobs):
+    """A pool that transcribes every clip with "base" ("tiny" for accuracy="fast")."""
+    import stt_pool
+
+    engines = {size: TierEngine(size, logprob) for size, logprob in logprobs.items()}
+    monkeypatch.setattr(stt, "get_engine", lambda size=None: engines[size])
+    monkeypatch.setattr(stt, "choose_model", lambda duration, depth, workers, accuracy: "tiny" if accuracy == "fast" else "base")
+    return stt_pool.TranscriptionPool(workers=1), engines
+
+
+def _transcribe(pool, accuracy=None):
+    return pool.submit(np.zeros(stt.SAMPLE_RATE * 5, dtype=np.float32), accuracy=accuracy).result(5)
+
+
+def test_low_confidence_result_is_rerun_one_tier_up(monkeypatch):
+    pool, engines = _pool(monkeypatch, {"base": STT_ESCALATE_LOGPROB - 0.5, "small": -0.2})
+
+    result = _transcribe(pool)
+
+    assert (result["model"], result["text"], result["escalated"]) == ("small", "small text", True)
+    assert pool.stats()["escalated"] == 1
+
+
+def test_confident_result_is_not_rerun(monkeypatch):
+    pool, engines = _pool(monkeypatch, {"base": STT_ESCALATE_LOGPROB + 0.1, "small": -0.2})
+
+    assert _transcribe(pool)["model"] == "base"
+    assert engines["small"].calls == 0
+
+
+def test_rerun_that_scores_worse_keeps_the_first_transcript(monkeypatch):
+    pool, engines = _pool(monkeypatch, {"base": STT_ESCALATE_LOGPROB - 0.1, "small": STT_ESCALATE_LOGPROB - 1.0})
+
+    result = _transcribe(pool)
+
+    assert (result["model"], result["escalated"]) == ("base", False)
+    assert engines["small"].calls == 1
+
+
+def test_fast_accuracy_is_never_escalated(monkeypatch):
+    pool, engines = _pool(monkeypatch, {"tiny": -3.0, "base": -0.2})
+
+    assert _transcribe(pool, accuracy="fast")["model"] == "tiny"
+    assert engines["base"].calls == 0
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import stt_pool
+from stt import SAMPLE_RATE
+from stt_pool import QueueFull, TranscriptionPool
+
+
+class FakeEngine:
+    """Scores every clip -0.1 (never escalated); single calls wait for `gate`."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        self.batches = []
+
+    def transcribe_scored(self, clip):
+        self.started.set()
+        self.gate.wait(5)
+        return f"{len(clip)} samples", -0.1
+
+    def transcribe_batch(self, clips, scored=True):
+        self.batches.append(len(clips))
+        return [(f"{len(c)} samples", -0.1) for c in clips]
+
+
+def _clip(seconds=1.0):
+    return np.zeros(int(SAMPLE_RATE * seconds), dtype=np.float32)
+
+
+def _busy_pool(**kwargs):
+    """A one-worker pool whose worker is stuck on a first job until engine.gate is set."""
+    engine = FakeEngine()
+    pool = TranscriptionPool(engine=engine, workers=1, **kwargs)
+    first = pool.submit(_clip())
+    assert engine.started.wait(5)
+    return pool, engine, first
+
+
+def test_queue_is_bounded_and_rejections_are_counted():
+    pool, engine, first = _busy_pool(max_queue=2, batch_size=1)
+    queued = [pool.submit(_clip()), pool.submit(_clip())]
+
+    with pytest.raises(QueueFull):
+        pool.submit(_clip())
+    stats = pool.stats()
+    assert (stats["queue_depth"], stats["queue_capacity"], stats["in_flight"]) == (2, 2, 1)
+    assert (stats["submitted"], stats["rejected"]) == (3, 1)
+
+    engine.gate.set()
+    assert [f.result(5)["text"] for f in [first] + queued] == ["16000 samples"] * 3
+    stats = pool.stats()
+    assert (stats["completed"], stats["in_flight"], stats["queue_depth"]) == (3, 0, 0)
+    assert stats["latency_p50_s"] is not None and stats["queue_wait_p95_s"] is not None
+
+
+def test_waiting_short_clips_share_one_batched_pass():
+    pool, engine, first = _busy_pool(max_queue=8, batch_size=8)
+    # all past STT_COMMAND_SECONDS, so they get the same tier
+    queued = [pool.submit(_clip(n)) for n in (4.0, 5.0, 6.0)]
+
+    engine.gate.set()
+    assert [f.result(5)["text"] for f in queued] == ["64000 samples", "80000 samples", "96000 samples"]
+    assert engine.batches == [3]
+    stats = pool.stats()
+    assert (stats["batches"], stats["batched_jobs"], stats["completed"]) == (1, 3, 4)
+
+
+def test_job_that_outlives_its_deadline_in_the_queue_expires():
+    pool, engine, first = _busy_pool(max_queue=4, batch_size=1)
+    late = pool.submit(_clip(), timeout=0.05)
+
+    time.sleep(0.1)
+    engine.gate.set()
+    with pytest.raises(TimeoutError):
+        late.result(5)
+    assert pool.stats()["expired"] == 1
+
+
+def test_stt_stats_endpoint_reports_the_pool_counters(monkeypatch):
+    import api
+
+    pool, engine, first = _busy_pool(max_queue=4, batch_size=1)
+    engine.gate.set()
+    first.result(5)
+    monkeypatch.setattr(stt_pool, "_pool", pool)
+
+    with TestClient(api.app) as client:
+        stats = client.get("/stt/stats").json()
+
+    assert stats["completed"] == 1 and stats["workers"] == 1 and stats["queue_capacity"] == 4
+    assert "silence_trim" in stats and "cache" in stats
@@ -0,0 +1,67 @@
+import io
+
+import numpy as np
+import pytest
+
+import stt
+
+
+class FakeEngine:
+    def transcribe(self, audio):
+        return f"<{len(audio)}>"
+
+
+def _tone(seconds, rate=16000):
+    t = np.arange(int(rate * seconds)) / rate
+    return (0.3 * np.sin(2 * np.pi * 440 * t) * 32767).astype(np.int16)
+
+
+def _opus(fmt, pcm, rate=48000):
+    av = pytest.importorskip("av")
+    buf = io.BytesIO()
+    with av.open(buf, mode="w", format=fmt) as out:
+        stream = out.add_stream("libopus", rate=rate)
+        stream.layout = "mono"
+        for i in range(0, len(pcm), 960):
+            frame = av.AudioFrame.from_ndarray(pcm[None, i:i + 960], format="s16", layout="mono")
+            frame.sample_rate, frame.pts = rate, i
+            for packet in stream.encode(frame):
+                out.mux(packet)
+        for packet in stream.encode(None):
+            out.mux(packet)
+    return buf.getvalue()
+
+
+def test_pcm16_frames_split_mid_sample_are_reassembled():
+    pcm = _tone(0.5)
+    data = pcm.tobytes()
+    transcriber = stt.StreamingTranscriber(fmt="pcm16", engine=FakeEngine())
+
+    parts = [transcriber._samples(data[i:i + 333]) for i in range(0, len(data), 333)]
+
+    audio = np.concatenate(parts)
+    np.testing.assert_array_equal(audio, pcm.astype(np.float32) / 32768.0)
+
+
+@pytest.mark.parametrize("fmt", ["webm", "ogg"])
+def test_container_stream_is_decoded_incrementally(fmt):
+    data = _opus(fmt, _tone(3.0, rate=48000))
+    transcriber = stt.StreamingTranscriber(fmt=fmt, engine=FakeEngine())
+
+    decoded = [len(transcriber._samples(data[i:i + 1500])) for i in range(0, len(data), 1500)]
+    tail = len(transcriber.close())
+
+    # audio comes out while the stream is still arriving, each chunk decoded once
+    assert sum(decoded[: len(decoded) // 2]) > 12000
+    assert abs(sum(decoded) + tail - 3 * 16000) <= 16000 * 0.05
+
+
+def test_finish_transcribes_container_audio_still_in_the_decoder():
+    transcriber = stt.StreamingTranscriber(fmt="webm", engine=FakeEngine())
+    speech = np.concatenate((np.zeros(24000, dtype=np.int16), _tone(1.0, rate=48000)))
+    transcriber.feed(_opus("webm", speech))
+
+    events = transcriber.finish()
+
+    assert [e["type"] for e in events] == ["final", "end_of_utterance"]
+    assert transcriber.close().size == 0
@@ -0,0 +1,65 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+import tts_cache
+from tts_cache import TTSCache
+
+VOICE = "voices/en_US-lessac-medium.onnx"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(tts_cache, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def _pcm(n):
+    return bytes([n % 256]) * 300
+
+
+def test_hits_and_misses_are_counted(tmp_path):
+    cache = TTSCache(tmp_path / "tts.db")
+
+    assert cache.get("Access denied.", VOICE) is None
+    cache.set("Access denied.", VOICE, _pcm(1), 22050)
+
+    assert cache.get("  Access   denied. ", VOICE) == (_pcm(1), 22050)  # same text once normalized
+    assert cache.get("Access denied.", "voices/te_IN-venkatesh-medium.onnx") is None  # voice is part of the key
+    assert cache.stats() == {"hits": 1, "misses": 2, "rows": 1, "bytes": 300}
+
+
+def test_least_recently_used_audio_is_evicted_first(tmp_path, clock):
+    cache = TTSCache(tmp_path / "tts.db", max_bytes=1000)
+    for name in ("a", "b", "c"):
+        cache.set(name, VOICE, _pcm(ord(name)), 22050)
+    cache.get("a", VOICE)  # "b" is now the least recently used
+
+    cache.set("d", VOICE, _pcm(4), 22050)  # 1200 bytes: evict down to 90% of the cap
+
+    assert cache.get("b", VOICE) is None
+    assert all(cache.get(name, VOICE) for name in ("a", "c", "d"))
+    assert cache.stats()["bytes"] == 900
+
+
+def test_replacing_an_entry_does_not_double_count_it(tmp_path):
+    cache = TTSCache(tmp_path / "tts.db", max_bytes=1000)
+    cache.set("a", VOICE, _pcm(1), 22050)
+    cache.set("a", VOICE, _pcm(2), 22050)
+
+    assert cache.stats()["bytes"] == 300
+    assert cache.get("a", VOICE) == (_pcm(2), 22050)
+
+
+def test_audio_larger_than_the_cap_is_not_stored(tmp_path):
+    cache = TTSCache(tmp_path / "tts.db", max_bytes=200)
+    cache.set("long answer", VOICE, _pcm(1), 22050)
+
+    assert cache.stats()["rows"] == 0
+
+
+def test_size_survives_a_restart(tmp_path):
+    TTSCache(tmp_path / "tts.db").set("a", VOICE, _pcm(1), 22050)
+
+    assert TTSCache(tmp_path / "tts.db").stats()["bytes"] == 300
@@ -0,0 +1,215 @@
+import struct
+import threading
+import time
+
+import pytest
+
+import tts
+import tts_pool
+from tts_pool import SynthesisError, SynthesisPool, WorkerCrashed, WorkerUnavailable
+
+
+class FakeWorker:
+    """Stands in for PiperWorker; `script` decides what each new worker's first request does."""
+
+    started = []
+    script = []  # per started worker: None (works), "crash" or "unavailable"
+    delay = 0.0
+
+    def __init__(self, model_path):
+        plan = FakeWorker.script.pop(0) if FakeWorker.script else None
+        if plan == "unavailable":
+            raise WorkerUnavailable("no piper here")
+        self.plan = plan
+        self.model_path = model_path
+        self.sample_rate = 22050
+        self.calls = 0
+        self.killed = self.closed = False
+        self.proc = self
+        self.last_used = time.monotonic()
+        FakeWorker.started.append(self)
+
+    @property
+    def alive(self):
+        return not (self.killed or self.closed)
+
+    def kill(self):
+        self.killed = True
+
+    def close(self):
+        self.closed = True
+
+    def synthesize(self, text):
+        self.calls += 1
+        if self.plan == "crash":
+            raise WorkerCrashed("worker exited (code -9)")
+        if text == "bad":
+            raise SynthesisError("piper rejected the text")
+        time.sleep(FakeWorker.delay)
+        self.last_used = time.monotonic()
+        return text.encode("utf-8"), self.sample_rate
+
+
+@pytest.fixture(autouse=True)
+def fake_workers(monkeypatch):
+    monkeypatch.setattr(tts_pool, "PiperWorker", FakeWorker)
+    monkeypatch.setattr(FakeWorker, "started", [])
+    monkeypatch.setattr(FakeWorker, "script", [])
+    monkeypatch.setattr(FakeWorker, "delay", 0.0)
+
+
+# ---------- SynthesisPool ----------
+
+def test_worker_is_reused_across_requests():
+    pool = SynthesisPool(workers_per_voice=2)
+
+    assert pool.synthesize("hello", "en_1") == (b"hello", 22050)
+    assert pool.synthesize("again", "en_1") == (b"again", 22050)
+
+    assert len(FakeWorker.started) == 1 and FakeWorker.started[0].calls == 2
+    stats = pool.stats()
+    assert (stats["requests"], stats["started"], stats["restarted"]) == (2, 1, 0)
+    assert stats["workers"] == {"en_1.onnx": 1}
+
+
+def test_each_voice_gets_its_own_worker():
+    pool = SynthesisPool()
+
+    pool.synthesize("hi", "en_1")
+    pool.synthesize("hi", "de_1")
+
+    assert sorted(w.model_path for w in FakeWorker.started) == sorted([tts_pool.voice_path("en_1"), tts_pool.voice_path("de_1")])
+
+
+def test_crashed_worker_is_replaced_and_request_retried():
+    FakeWorker.script = ["crash"]
+    pool = SynthesisPool()
+
+    assert pool.synthesize("hello", "en_1") == (b"hello", 22050)
+
+    crashed, replacement = FakeWorker.started
+    assert crashed.killed and replacement.alive
+    stats = pool.stats()
+    assert (stats["started"], stats["restarted"]) == (2, 1)
+    assert stats["workers"] == {"en_1.onnx": 1}
+
+
+def test_worker_crashing_twice_fails_the_request_and_frees_the_slots():
+    FakeWorker.script = ["crash", "crash"]
+    pool = SynthesisPool(workers_per_voice=1)
+
+    with pytest.raises(WorkerCrashed):
+        pool.synthesize("hello", "en_1")
+
+    assert pool.stats()["workers"] == {}
+    assert pool.synthesize("hello", "en_1") == (b"hello", 22050)
+
+
+def test_rejected_text_keeps_the_worker():
+    pool = SynthesisPool()
+
+    with pytest.raises(SynthesisError):
+        pool.synthesize("bad", "en_1")
+    pool.synthesize("fine", "en_1")
+
+    assert len(FakeWorker.started) == 1
+    assert pool.stats()["restarted"] == 0
+
+
+def test_dead_idle_worker_is_not_handed_out():
+    pool = SynthesisPool()
+    pool.synthesize("one", "en_1")
+    FakeWorker.started[0].kill()
+
+    pool.synthesize("two", "en_1")
+
+    assert len(FakeWorker.started) == 2
+    assert pool.stats()["workers"] == {"en_1.onnx": 1}
+
+
+def test_workers_per_voice_bounds_concurrent_workers():
+    FakeWorker.delay = 0.05
+    pool = SynthesisPool(workers_per_voice=2)
+    threads = [threading.Thread(target=pool.synthesize, args=(f"text {n}", "en_1")) for n in range(6)]
+
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(FakeWorker.started) == 2
+    assert sum(w.calls for w in FakeWorker.started) == 6
+
+
+def test_voice_without_a_worker_falls_back_to_one_shot_piper(monkeypatch):
+    FakeWorker.script = ["unavailable"]
+    runs = []
+    monkeypatch.setattr(tts_pool, "_cli_synthesize", lambda text, path: runs.append(text) or (b"cli", 16000))
+    pool = SynthesisPool()
+
+    assert pool.synthesize("one", "en_1") == (b"cli", 16000)
+    assert pool.synthesize("two", "en_1") == (b"cli", 16000)
+
+    assert runs == ["one", "two"]
+    assert FakeWorker.started == []  # not retried once known to be missing
+    assert pool.stats()["cli_fallback"] == 2
+
+
+# ---------- sentence-parallel synthesis ----------
+
+def test_split_sentences_joins_short_fragments_into_the_next():
+    text = "Hi. This sentence is long enough alone. Ok! And another complete sentence here?"
+
+    assert tts.split_sentences(text) == [
+        "Hi. This sentence is long enough alone.",
+        "Ok! And another complete sentence here?",
+    ]
+    assert tts.split_sentences("") == []
+
+
+def _tone(value, n=40):
+    return struct.pack("<h", value) * n
+
+
+@pytest.fixture
+def sentence_engine(monkeypatch):
+    """Sentence synthesis where earlier sentences take longer, padded with silence piper-style."""
+    done = []
+
+    def _one(text, voice, use_cache=True):
+        n = int(text.split()[1])
+        time.sleep(0.05 * (4 - n))
+        done.append(n)
+        return b"\0\0" * 10 + _tone(1000 * n) + b"\0\0" * 10, 16000
+
+    monkeypatch.setattr(tts, "_synthesize_one", _one)
+    return done
+
+
+SENTENCES = "Sentence 1 is here to be spoken. Sentence 2 is here to be spoken. Sentence 3 is here to be spoken."
+
+
+def test_sentences_run_in_parallel_but_come_back_in_order(sentence_engine):
+    futures = tts.submit_sentences(SENTENCES, "en_1", use_cache=False)
+    parts = [f.result(timeout=5) for f in futures]
+
+    assert sentence_engine == [3, 2, 1]  # finished last-first...
+    assert parts == [(_tone(1000), 16000), (_tone(2000), 16000), (_tone(3000), 16000)]  # ...returned in order, trimmed
+
+
+def test_join_sentences_puts_one_gap_between_sentences():
+    gap = b"\0\0" * int(tts.SENTENCE_GAP_SECONDS * 16000)
+
+    pcm, rate = tts.join_sentences([(_tone(1), 16000), (b"", 16000), (_tone(2), 16000)])
+
+    assert rate == 16000
+    assert pcm == _tone(1) + gap + _tone(2)
+
+
+def test_synthesize_joins_parallel_sentences(sentence_engine):
+    start = time.monotonic()
+    pcm, rate = tts.synthesize(SENTENCES, "en_1", use_cache=False)
+
+    assert time.monotonic() - start < 0.25  # one after another would take 0.3 s
+    gap = tts.silence_pcm(tts.SENTENCE_GAP_SECONDS, 16000)
+    assert (pcm, rate) == (gap.join([_tone(1000), _tone(2000), _tone(3000)]), 16000)
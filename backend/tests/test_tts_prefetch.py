@@ -0,0 +1,104 @@
+import struct
+import sys
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+import tts
+
+ANSWER = "Sentence 1 of the prefetched answer. Sentence 2 of the prefetched answer."
+
+
+@pytest.fixture
+def client():
+    with TestClient(api.app) as c:
+        yield c
+
+
+@pytest.fixture
+def synthesized(monkeypatch):
+    """Every sentence actually synthesized, as (text, voice)."""
+    calls = []
+
+    def _one(text, voice, use_cache=True):
+        calls.append((text, voice))
+        return struct.pack("<h", 1000 * int(text.split()[1])) * 40, 16000
+
+    monkeypatch.setattr(tts, "_synthesize_one", _one)
+    monkeypatch.setattr(tts, "_prefetched", {})
+    monkeypatch.setattr(api, "_handle_query", lambda user_input, **kwargs: ANSWER)
+    return calls
+
+
+@pytest.fixture
+def played(monkeypatch):
+    """An audio_player that records what it is asked to play instead of playing it."""
+    clips = []
+    module = types.ModuleType("audio_player")
+    module.play_pcm_in_app = lambda pcm, rate, **kwargs: clips.append((pcm, rate))
+    monkeypatch.setitem(sys.modules, "audio_player", module)
+    return clips
+
+
+def _query(client, voice="en_1"):
+    r = client.post("/query", json={"input": "tell me", "prefetch_voice": voice})
+    assert r.status_code == 200
+    futures = tts.prefetched_sentences(r.json()["id"], voice)
+    assert [f.result(timeout=5)[1] for f in futures] == [16000, 16000]
+    return r.json()["id"]
+
+
+def _expected_pcm():
+    gap = tts.silence_pcm(tts.SENTENCE_GAP_SECONDS, 16000)
+    return gap.join(struct.pack("<h", 1000 * n) * 40 for n in (1, 2))
+
+
+def test_speak_with_response_id_plays_the_prefetched_audio(client, synthesized, played):
+    response_id = _query(client)
+    assert len(synthesized) == 2
+
+    r = client.post("/speak", json={"response_id": response_id, "voice": "en_1"})
+
+    assert r.status_code == 200
+    assert len(synthesized) == 2  # nothing synthesized twice
+    assert played == [(_expected_pcm(), 16000)]
+
+
+def test_speak_stream_with_response_id_streams_the_prefetched_audio(client, synthesized):
+    response_id = _query(client)
+
+    r = client.get("/speak/stream", params={"response_id": response_id, "voice": "en_1"})
+
+    assert r.status_code == 200
+    assert r.content == tts.wav_stream_header(16000) + _expected_pcm()
+    assert len(synthesized) == 2
+    # the stream doesn't consume the prefetch: /speak can still use it
+    assert tts.prefetched_sentences(response_id, "en_1") is not None
+
+
+def test_prefetch_for_another_voice_or_text_is_not_used(client, synthesized, played):
+    response_id = _query(client)
+
+    client.post("/speak", json={"response_id": response_id, "voice": "en_2"})
+    assert [voice for _, voice in synthesized[2:]] == ["en_2", "en_2"]
+
+    client.post("/speak", json={"response_id": response_id, "voice": "en_1", "text": "Sentence 3 is something else."})
+    assert synthesized[4:] == [("Sentence 3 is something else.", "en_1")]
+
+
+def test_prefetched_text_reaches_a_worker_without_the_audio(client, synthesized, played, monkeypatch):
+    response_id = _query(client)
+    # another worker process: the text comes from the shared store, the audio is synthesized there
+    monkeypatch.setattr(tts, "_prefetched", {})
+
+    r = client.post("/speak", json={"response_id": response_id, "voice": "en_1"})
+
+    assert r.status_code == 200
+    assert played == [(_expected_pcm(), 16000)]
+    assert [text for text, _ in synthesized[2:]] == [text for text, _ in synthesized[:2]]
+
+
+def test_speak_with_unknown_response_id_and_no_text_is_a_400(client, synthesized):
+    assert client.post("/speak", json={"response_id": "nope", "voice": "en_1"}).status_code == 400
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from config import TTS_VOICES_DIR
+from tts_pool import voice_path
+
+
+def test_voice_names_map_into_the_voices_directory():
+    assert voice_path("en_US-lessac") == os.path.join(TTS_VOICES_DIR, "en_US-lessac.onnx")
+    assert voice_path("en_US-lessac.onnx") == os.path.join(TTS_VOICES_DIR, "en_US-lessac.onnx")
+
+
+@pytest.mark.parametrize("voice", [
+    "../secrets", "..", "voices/../../etc/passwd", "/etc/passwd", "sub/voice", "sub\\voice",
+    "C:\\voices\\x", "C:x", ".hidden", "", "en..onnx",
+])
+def test_path_like_voice_names_are_rejected(voice):
+    with pytest.raises(ValueError):
+        voice_path(voice)
+
+
+def test_speak_endpoints_reject_path_voices_with_400():
+    with TestClient(api.app) as client:
+        assert client.post("/speak", json={"text": "hi", "voice": "../../x"}).status_code == 400
+        assert client.post("/speak/stream", json={"text": "hi", "voice": "/tmp/x"}).status_code == 400
+        assert client.get("/speak/stream", params={"text": "hi", "voice": "a/b"}).status_code == 400
+        assert client.post("/query", json={"input": "hi", "prefetch_voice": "../x"}).status_code == 400
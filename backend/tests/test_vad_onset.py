@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+import vad
+from vad import SpeechOnsetDetector, VADSegmenter
+
+RATE = 16000
+FRAME = RATE // 100  # 10 ms
+
+
+def _frames(level, n):
+    """`n` 10 ms frames of a square wave whose RMS is exactly `level`."""
+    return np.tile(np.array([level, -level], dtype=np.float32), FRAME * n // 2)
+
+
+def _detector(**kwargs):
+    kwargs = {"frame_ms": 10, "hold_ms": 60, "ratio": 4.0, "min_rms": 0.02, **kwargs}
+    det = SpeechOnsetDetector(RATE, **kwargs)
+    det.push(_frames(0.01, 20))  # learn a 0.01 noise floor
+    return det
+
+
+def test_onset_needs_hold_ms_of_consecutive_loud_frames():
+    det = _detector()
+
+    assert det.push(_frames(0.1, 5)) is False
+    assert det.push(_frames(0.1, 1)) is True
+
+
+def test_a_quiet_frame_resets_the_hold():
+    det = _detector()
+
+    assert det.push(np.concatenate((_frames(0.1, 5), _frames(0.01, 1), _frames(0.1, 5)))) is False
+    assert det.push(_frames(0.1, 1)) is True
+
+
+def test_speech_must_beat_ratio_times_noise_floor_and_min_rms():
+    det = _detector()
+    assert det.push(_frames(0.035, 20)) is False  # above min_rms, below 4 x 0.01
+
+    quiet = _detector(min_rms=0.5)
+    assert quiet.push(_frames(0.1, 20)) is False  # above 4 x floor, below min_rms
+
+
+def test_noise_floor_adapts_to_louder_background():
+    det = _detector(min_rms=0.0)
+    det.push(_frames(0.03, 200))  # below 4 x 0.01 at first, so it is learned as noise
+
+    assert det.noise > 0.025
+    assert det.push(_frames(0.1, 20)) is False  # no longer 4x louder than the floor
+
+
+def test_echo_while_playing_needs_a_louder_voice():
+    det = _detector(echo_ratio=2.5, echo_min_rms=0.08)
+
+    assert det.push(_frames(0.06, 20), playing=True) is False  # our own reply through the speakers
+    assert det.push(_frames(0.2, 6), playing=True) is True     # user talking over it
+    assert det.push(_frames(0.01, 1)) is False
+    assert det.push(_frames(0.06, 6)) is True                  # same level counts once playback stops
+
+
+def test_echo_does_not_raise_the_noise_floor():
+    det = _detector(echo_ratio=2.5, echo_min_rms=0.08)
+    floor = det.noise
+
+    det.push(_frames(0.06, 500), playing=True)
+
+    assert det.noise == floor
+
+
+def test_playback_from_the_first_frame_does_not_seed_the_floor():
+    det = SpeechOnsetDetector(RATE, frame_ms=10, hold_ms=60, ratio=4.0, min_rms=0.02, echo_min_rms=0.08)
+
+    assert det.push(_frames(0.06, 20), playing=True) is False
+    assert det.noise is None
+
+
+def test_stream_that_opens_with_speech_is_detected():
+    det = SpeechOnsetDetector(RATE, frame_ms=10, hold_ms=60, ratio=4.0, min_rms=0.02)
+
+    assert det.push(_frames(0.1, 6)) is True
+    assert det.noise <= vad.MAX_NOISE_FLOOR
+
+
+def test_quiet_frame_during_calibration_lowers_the_floor():
+    det = SpeechOnsetDetector(RATE, frame_ms=10, hold_ms=60, ratio=4.0, min_rms=0.0)
+    det.push(np.concatenate((_frames(0.05, 3), _frames(0.002, 1))))
+
+    assert det.noise == pytest.approx(0.002, rel=0.1)
+
+
+def test_segmenter_keeps_speech_at_the_start_of_the_stream():
+    seg = VADSegmenter(RATE, frame_ms=30, segment_pause_ms=300, utterance_pause_ms=600)
+
+    events = seg.push(np.concatenate((_frames(0.1, 100), _frames(0.001, 80))))
+
+    kinds = [kind for kind, _ in events]
+    assert kinds == ["segment", "end_of_utterance"]
+    assert len(events[0][1]) >= RATE  # the whole opening second of speech
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from vad import SAMPLE_RATE, trim_silence
+
+rng = np.random.default_rng(0)
+
+
+def _silence(seconds):
+    return (rng.standard_normal(int(SAMPLE_RATE * seconds)) * 0.001).astype(np.float32)
+
+
+def _speech(seconds):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return (0.2 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def test_empty_clip_has_no_speech():
+    trimmed, info = trim_silence(np.zeros(0, dtype=np.float32))
+
+    assert len(trimmed) == 0
+    assert info == {"speech": False, "audio_seconds": 0.0, "kept_seconds": 0.0, "saved_seconds": 0.0}
+
+
+def test_silence_only_is_rejected_and_fully_saved():
+    trimmed, info = trim_silence(_silence(2.0))
+
+    assert len(trimmed) == 0
+    assert (info["speech"], info["saved_seconds"]) == (False, 2.0)
+
+
+def test_blip_shorter_than_min_speech_is_not_speech():
+    trimmed, info = trim_silence(np.concatenate((_silence(1.0), _speech(0.06), _silence(1.0))))
+
+    assert not info["speech"]
+
+
+def test_leading_and_trailing_silence_is_cut_to_the_padding():
+    trimmed, info = trim_silence(np.concatenate((_silence(1.0), _speech(1.0), _silence(1.0))), pad_ms=150)
+
+    assert info["speech"]
+    assert info["audio_seconds"] == 3.0
+    assert info["kept_seconds"] == pytest.approx(1.3, abs=0.07)
+    assert info["saved_seconds"] == pytest.approx(3.0 - info["kept_seconds"], abs=0.01)
+
+
+def test_long_pause_is_shortened_to_max_pause():
+    clip = np.concatenate((_speech(0.5), _silence(3.0), _speech(0.5)))
+
+    trimmed, info = trim_silence(clip, pad_ms=150, max_pause_ms=500)
+
+    # both words, the padding inside the gap and about max_pause of what is left of it
+    assert info["kept_seconds"] == pytest.approx(0.5 + 0.5 + 2 * 0.15 + 0.5, abs=0.1)
+
+
+def test_clip_without_quiet_frames_is_kept_whole():
+    clip = _speech(1.0)
+
+    trimmed, info = trim_silence(clip)
+
+    assert info["speech"] and len(trimmed) == len(clip)
+
+
+def test_trailing_partial_frame_follows_the_last_frame():
+    clip = np.concatenate((_silence(0.5), _speech(1.0)))[:-7]  # not a whole number of frames
+
+    trimmed, info = trim_silence(clip)
+
+    assert info["speech"]
+    assert np.array_equal(trimmed[-100:], clip[-100:])
@@ -0,0 +1,165 @@
+import json
+import time
+
+import pytest
+
+import resilience
+import web_search
+from resilience import Deadline, get_breaker
+from web_search import FixtureProvider, SearchCache, SearchUnavailable
+
+
+def _hit(n, site="example.org"):
+    return {"title": f"Result {n}", "href": f"https://{site}/{n}", "body": f"body {n}"}
+
+
+class BrokenProvider(web_search.SearchProvider):
+    def __init__(self, name="broken"):
+        self.name = name
+        self.calls = 0
+
+    def search(self, query, max_results):
+        self.calls += 1
+        raise ConnectionError("provider down")
+
+
+def _fixture(name, results, delay=0.0):
+    provider = FixtureProvider(results, delay=delay)
+    provider.name = name
+    return provider
+
+
+@pytest.fixture(autouse=True)
+def isolated_search(tmp_path, monkeypatch):
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(web_search, "_cache", SearchCache(tmp_path / "search_cache.db"))
+    monkeypatch.setattr(web_search, "_providers", None)
+    monkeypatch.setattr(web_search, "_abandoned", {})
+
+
+# ---------- FixtureProvider ----------
+
+def test_fixture_provider_matches_normalized_query_and_falls_back_to_wildcard():
+    provider = FixtureProvider({"Weather  in Oslo": [_hit(1), _hit(2), _hit(3)], "*": [_hit(9)]})
+
+    assert provider.search("weather in oslo", 2) == [_hit(1), _hit(2)]
+    assert provider.search("something else", 5) == [_hit(9)]
+
+
+def test_fixture_provider_loads_json_file(tmp_path):
+    path = tmp_path / "fixtures.json"
+    path.write_text(json.dumps({"cats": [_hit(1)]}), encoding="utf-8")
+
+    assert FixtureProvider(path=path).search("Cats", 5) == [_hit(1)]
+    assert FixtureProvider(path=path).search("dogs", 5) == []
+
+
+# ---------- SearchCache ----------
+
+def test_search_cache_hit_and_expiry(tmp_path):
+    cache = SearchCache(tmp_path / "cache.db")
+    cache.set("Weather in Oslo", 8, [_hit(1)], ttl=60)
+    cache.set("stale query", 8, [_hit(2)], ttl=-1)
+
+    assert cache.get("  weather IN oslo ", 8) == [_hit(1)]
+    assert cache.get("weather in oslo", 3) is None  # max_results is part of the key
+    assert cache.get("stale query", 8) is None
+
+    cache.purge_expired()
+    assert cache.conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0] == 1
+
+
+def test_web_search_serves_repeat_queries_from_cache():
+    provider = _fixture("fixture", {"*": [_hit(1)]})
+    web_search.set_providers([provider])
+
+    assert web_search.web_search("python release date") == [_hit(1)]
+    provider.results = {"*": [_hit(2)]}
+    assert web_search.web_search("Python release date") == [_hit(1)]
+    assert web_search.web_search("Python release date", use_cache=False) == [_hit(2)]
+
+
+# ---------- fan-out ----------
+
+def test_fan_out_merges_providers_and_drops_duplicate_urls():
+    web_search.set_providers([
+        _fixture("a", {"*": [_hit(1), _hit(2)]}),
+        _fixture("b", {"*": [_hit(1), _hit(3, site="other.net")]}),
+    ])
+
+    assert web_search.web_search("q", use_cache=False) == [_hit(1), _hit(2), _hit(3, site="other.net")]
+
+
+def test_fan_out_skips_provider_whose_circuit_is_open():
+    broken = BrokenProvider()
+    web_search.set_providers([_fixture("good", {"*": [_hit(1)]}), broken])
+    breaker = get_breaker("search:broken")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    assert web_search.web_search("q", deadline=Deadline(60)) == [_hit(1)]
+    assert broken.calls == 0
+    assert breaker.stats()["short_circuited"] == 1
+    # a partial answer (one provider refused) is not cached
+    assert web_search.get_cache().get("q", 8) is None
+
+
+def test_failing_provider_opens_its_circuit():
+    broken = BrokenProvider()
+    web_search.set_providers([broken])
+    breaker = get_breaker("search:broken")
+
+    for _ in range(breaker.failure_threshold):
+        web_search.web_search("q", use_cache=False)
+
+    assert breaker.state == resilience.OPEN
+    calls = broken.calls
+    web_search.web_search("q", use_cache=False)
+    assert broken.calls == calls
+
+
+# ---------- SearchUnavailable ----------
+
+def test_all_providers_failing_raises_search_unavailable_with_a_deadline():
+    web_search.set_providers([BrokenProvider("x"), BrokenProvider("y")])
+
+    with pytest.raises(SearchUnavailable):
+        web_search.web_search("q", deadline=Deadline(60))
+    # without a request deadline the old contract holds: just no results
+    assert web_search.web_search("q") == []
+
+
+def test_slow_providers_time_out_into_search_unavailable():
+    web_search.set_providers([_fixture("slow", {"*": [_hit(1)]}, delay=1.0)])
+
+    start = time.monotonic()
+    with pytest.raises(SearchUnavailable):
+        web_search.web_search("q", timeout=0.2, deadline=Deadline(60))
+    assert time.monotonic() - start < 0.9
+    # counted once, by the breaker, when the abandoned call comes back too late
+    web_search._abandoned["slow"].result(timeout=5)
+    assert get_breaker("search:slow").stats()["failures"] == 1
+
+
+def test_provider_with_a_call_still_running_gets_no_new_work():
+    slow = _fixture("slow", {"*": [_hit(1)]}, delay=0.5)
+    calls = []
+    search = slow.search
+    slow.search = lambda *a: calls.append(a) or search(*a)
+    web_search.set_providers([slow, _fixture("fast", {"*": [_hit(2)]})])
+
+    web_search.web_search("q", timeout=0.1, use_cache=False)
+    assert web_search.web_search("q", timeout=0.1, use_cache=False) == [_hit(2)]
+    assert len(calls) == 1
+
+    web_search._abandoned["slow"].result(timeout=5)
+    assert web_search.web_search("q", timeout=1.0, use_cache=False) == [_hit(1), _hit(2)]
+    assert len(calls) == 2
+
+
+def test_no_time_left_for_search_raises_search_unavailable(monkeypatch):
+    monkeypatch.setattr(web_search, "LLM_MIN_BUDGET_SECONDS", 8.0)
+    web_search.set_providers([_fixture("fixture", {"*": [_hit(1)]})])
+
+    with pytest.raises(SearchUnavailable):
+        web_search.web_search("q", deadline=Deadline(5))
@@ -0,0 +1,7 @@
+# tokens.py
+# Token counting shared by prompt budgeting (evidence) and memory compaction.
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), good enough for thresholds."""
+    return (len(text) + 3) // 4 if text else 0
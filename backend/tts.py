@@ -1,96 +1,306 @@
-import subprocess
-import tempfile
-import os
+import io
+import re
+import struct
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
 
+from config import TTS_CACHE_ENABLED, TTS_PARALLEL_SENTENCES, TTS_PREFETCH_TTL_SECONDS
 
-def _generate_wav(text: str, voice_model: str) -> str:
-    """Generate TTS via piper into a temp WAV and return the path."""
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
-        out = f.name
+SENTENCE_GAP_SECONDS = 0.12  # silence between synthesized sentences
+_SENTENCE_END = re.compile(r"(?<=[.!?\u0964])\s+")
 
+
+def split_sentences(text: str, min_chars: int = 20) -> list:
+    """Split a reply for sentence-by-sentence synthesis; short fragments join the next sentence."""
+    parts = [p.strip() for p in _SENTENCE_END.split(text or "") if p.strip()]
+    merged = []
+    for part in parts:
+        if merged and len(merged[-1]) < min_chars:
+            merged[-1] += " " + part
+        else:
+            merged.append(part)
+    return merged
+
+
+def _cache_get(text, voice_model):
     try:
-        subprocess.run(
-            [
-                "piper",
-                "--model", f"voices/{voice_model}",
-                "--output_file", out
-            ],
-            input=text.encode("utf-8"),
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            check=True,
-        )
+        from tts_cache import get_tts_cache
+        from tts_pool import voice_path
+        return get_tts_cache().get(text, voice_path(voice_model))
     except Exception as e:
-        # If piper isn't available or fails, ensure we clean up and raise
-        try:
-            os.remove(out)
-        except Exception:
-            pass
-        raise
+        print("DEBUG | TTS cache lookup failed:", e)
+        return None
+
+
+def _cache_set(text, voice_model, pcm, sample_rate):
+    try:
+        from tts_cache import get_tts_cache
+        from tts_pool import voice_path
+        get_tts_cache().set(text, voice_path(voice_model), pcm, sample_rate)
+    except Exception as e:
+        print("DEBUG | TTS cache store failed:", e)
+
+
+def _synthesize_one(text, voice_model, use_cache=TTS_CACHE_ENABLED):
+    from tts_pool import get_synthesis_pool
+
+    hit = _cache_get(text, voice_model) if use_cache else None
+    if hit is not None:
+        return hit
+    pcm, sample_rate = get_synthesis_pool().synthesize(text, voice_model)
+    if use_cache and pcm:
+        _cache_set(text, voice_model, pcm, sample_rate)
+    return pcm, sample_rate
+
+
+def strip_silence(pcm: bytes, threshold: int = 64) -> bytes:
+    """Drop near-silent int16 samples from both ends so sentence gaps come out even."""
+    import numpy as np
+
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    loud = np.flatnonzero((samples > threshold) | (samples < -threshold))
+    if len(loud) == 0:
+        return b""
+    return samples[loud[0]:loud[-1] + 1].tobytes()
+
+
+# Sentence jobs only wait on piper worker processes, so threads are enough here
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tts-sentence")
+
+
+def _sentence_pcm(sentence, voice_model, use_cache):
+    pcm, sample_rate = _synthesize_one(sentence, voice_model, use_cache)
+    return strip_silence(pcm), sample_rate
 
-    return out
 
+def submit_sentences(text: str, voice_model: str, use_cache: bool = TTS_CACHE_ENABLED) -> list:
+    """Start synthesizing every sentence of `text` at once.
 
-def play_audio(wav_path: str):
-    """Fallback synchronous player using sounddevice/soundfile (lazy import)."""
+    Returns futures in sentence order, each resolving to (trimmed PCM, sample_rate);
+    they run in parallel across the voice's piper worker processes.
+    """
+    return [_executor.submit(_sentence_pcm, s, voice_model, use_cache) for s in split_sentences(text)]
+
+
+def join_sentences(parts) -> tuple:
+    """Concatenate (pcm, sample_rate) sentence results with SENTENCE_GAP_SECONDS of silence between them."""
+    sample_rate = parts[0][1]
+    gap = silence_pcm(SENTENCE_GAP_SECONDS, sample_rate)
+    return gap.join(pcm for pcm, _ in parts if pcm), sample_rate
+
+
+# ---------- speculative synthesis ----------
+_prefetched = {}  # response id -> (text, voice, sentence futures, created)
+_prefetch_lock = threading.Lock()
+
+
+def _evict_prefetched():
+    cutoff = time.time() - TTS_PREFETCH_TTL_SECONDS
+    for rid in [rid for rid, entry in _prefetched.items() if entry[3] < cutoff]:
+        for future in _prefetched.pop(rid)[2]:
+            future.cancel()
+
+
+def prefetch(response_id: str, text: str, voice_model: str):
+    """Start synthesizing an answer before anyone asks to hear it (see /query prefetch_voice).
+
+    The text is also shared with the other API worker processes; they can't use
+    these futures, but finished sentences reach them through the TTS cache.
+    """
+    futures = submit_sentences(text, voice_model)
+    with _prefetch_lock:
+        _evict_prefetched()
+        _prefetched[response_id] = (text, voice_model, futures, time.time())
     try:
-        import soundfile as sf
+        from shared_state import get_shared_store
+        get_shared_store().put("tts_prefetch", response_id, {"text": text, "voice": voice_model}, TTS_PREFETCH_TTL_SECONDS)
+    except Exception as e:
+        print("DEBUG | prefetched text not shared:", e)
+
+
+def prefetched_sentences(response_id: str, voice_model: str, text: str = None):
+    """Sentence futures started by `prefetch`, or None when absent / for another voice or text."""
+    with _prefetch_lock:
+        _evict_prefetched()
+        entry = _prefetched.get(response_id)
+    if entry is None or entry[1] != voice_model or (text and text != entry[0]):
+        return None
+    return entry[2]
+
+
+def prefetched_text(response_id: str):
+    with _prefetch_lock:
+        entry = _prefetched.get(response_id)
+    if entry:
+        return entry[0]
+    try:
+        from shared_state import get_shared_store
+        shared = get_shared_store().get("tts_prefetch", response_id)
+    except Exception as e:
+        print("DEBUG | shared prefetch lookup failed:", e)
+        shared = None
+    return shared["text"] if shared else None
+
+
+def synthesize(text: str, voice_model: str, use_cache: bool = TTS_CACHE_ENABLED):
+    """Synthesize `text` with persistent piper workers; returns (int16 PCM bytes, sample_rate).
+
+    Multi-sentence text is synthesized sentence by sentence in parallel and
+    joined in order (TTS_PARALLEL_SENTENCES). Audio for text already spoken in
+    this voice comes from the on-disk TTS cache.
+    """
+    if not TTS_PARALLEL_SENTENCES or len(split_sentences(text)) < 2:
+        return _synthesize_one(text, voice_model, use_cache)
+
+    hit = _cache_get(text, voice_model) if use_cache else None
+    if hit is not None:
+        return hit
+    futures = submit_sentences(text, voice_model, use_cache)
+    try:
+        pcm, sample_rate = join_sentences([f.result() for f in futures])
+    finally:
+        for f in futures:
+            f.cancel()
+    if use_cache and pcm:
+        _cache_set(text, voice_model, pcm, sample_rate)
+    return pcm, sample_rate
+
+
+def prewarm_cache(phrases, voice_model: str, background: bool = True):
+    """Synthesize fixed replies ahead of time so they play back instantly."""
+    def _run():
+        for phrase in phrases:
+            try:
+                synthesize(phrase, voice_model)
+            except Exception as e:
+                print("DEBUG | TTS prewarm failed:", e)
+                return
+
+    if not background:
+        _run()
+        return None
+    t = threading.Thread(target=_run, name="tts-prewarm", daemon=True)
+    t.start()
+    return t
+
+
+# Fixed replies (main.py and tools.py); pre-synthesized into the TTS cache when
+# config.TTS_CACHE_PREWARM is set so they play back without waiting on piper.
+CANNED_REPLIES = [
+    "Please enter a meaningful request.",
+    "Access denied.",
+    "App not allowed.",
+    "Not enough reliable information to form a reasoned opinion.",
+    "No useful information found.",
+    "I couldn't find reliable information about this topic. It may be unclear, poorly documented, or incorrectly named.",
+    "The topic you asked about seems unclear or possibly a placeholder. Please provide a specific name, place, or event.",
+    "The name you asked about may refer to multiple people or entities. Please specify which one you mean (profession, country, or context).",
+]
+
+
+def prewarm_tts(voice="en_US-lessac"):
+    """Fill the TTS cache with CANNED_REPLIES in the background (no-op without TTS)."""
+    try:
+        prewarm_cache(CANNED_REPLIES, voice)
+    except Exception as e:
+        print("DEBUG | TTS prewarm skipped:", e)
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    """Wrap mono int16 PCM in a WAV container, in memory."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+def wav_stream_header(sample_rate: int) -> bytes:
+    """WAV header for mono int16 audio of unknown length (sizes set to the maximum, as streams do)."""
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+
+def silence_pcm(seconds: float, sample_rate: int) -> bytes:
+    return b"\x00\x00" * int(seconds * sample_rate)
+
+
+def play_audio(pcm: bytes, samplerate: int, volume: float = 1.0, blocksize: int = 1024):
+    """Fallback synchronous player: writes int16 PCM to a sounddevice stream block by block."""
+    try:
+        import numpy as np
         import sounddevice as sd
     except Exception as e:
         print("DEBUG | play_audio unavailable (missing deps):", e)
         return
 
-    data, samplerate = sf.read(wav_path, dtype="float32")
-    sd.play(data, samplerate)
-    sd.wait()
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    block = np.empty(blocksize, dtype=np.float32)
+    scale = float(volume) / 32768.0
+    with sd.OutputStream(samplerate=samplerate, channels=1, dtype="float32", blocksize=blocksize) as stream:
+        for start in range(0, len(samples), blocksize):
+            chunk = samples[start:start + blocksize]
+            out = block[:len(chunk)]
+            np.multiply(chunk, scale, out=out, casting="unsafe")
+            np.clip(out, -1.0, 1.0, out=out)
+            stream.write(out)
 
 
-def speak(text: str, voice_model: str):
-    """Generate TTS wav then play it inside the app if possible, otherwise fallback.
+def speak(text: str, voice_model: str, volume: float = 1.0, channel: str = "default", interrupt: bool = False,
+          response_id: str = None, raise_errors: bool = False):
+    """Synthesize TTS audio then play it inside the app if possible, otherwise fallback.
 
-    Uses `audio_player.play_wav_in_app` when available (non-blocking). If that's not
-    available, falls back to a synchronous `play_audio` implementation.
-    The WAV file is removed after playback (or immediately on failure).
+    Uses `audio_player.play_pcm_in_app` when available (non-blocking): the reply
+    is queued on `channel` behind earlier replies unless `interrupt` is set, and
+    its controller is returned. If that's not available, falls back to a
+    synchronous `play_audio` and returns None once it has played.
+    Audio stays in memory as int16 PCM throughout.
+    With a `response_id` from /query, audio already being prefetched is reused.
+
+    Failures are logged and return None, unless `raise_errors` is set (the API
+    uses it so a failed reply is not reported as played).
     """
     try:
-        wav = _generate_wav(text, voice_model)
+        futures = prefetched_sentences(response_id, voice_model, text) if response_id else None
+        if futures:
+            pcm, samplerate = join_sentences([f.result() for f in futures])
+        else:
+            pcm, samplerate = synthesize(text, voice_model)
     except Exception as e:
         print("DEBUG | TTS generation failed:", e)
-        return
+        if raise_errors:
+            raise
+        return None
 
     # Try to use the in-app async player if present
     try:
-        from audio_player import play_wav_in_app
-
-        try:
-            controller = play_wav_in_app(
-                wav,
-                on_done=lambda: os.remove(wav) if os.path.exists(wav) else None,
-                volume=1.0,
-            )
-            # Return controller so callers can stop playback if needed
-            return controller
-        except Exception as e:
-            print("DEBUG | play_wav_in_app failed, falling back:", e)
-            try:
-                play_audio(wav)
-            except Exception as e2:
-                print("DEBUG | fallback play_audio failed:", e2)
-            finally:
-                try:
-                    os.remove(wav)
-                except Exception:
-                    pass
+        from audio_player import play_pcm_in_app
     except Exception:
         # audio_player is not available — do a synchronous play as a fallback
         try:
-            play_audio(wav)
+            play_audio(pcm, samplerate, volume)
         except Exception as e:
             print("DEBUG | play_audio failed:", e)
-        finally:
-            try:
-                os.remove(wav)
-            except Exception:
-                pass
+            if raise_errors:
+                raise
+        return None
 
+    try:
+        # Return controller so callers can stop playback if needed
+        return play_pcm_in_app(pcm, samplerate, volume=volume, channel=channel, interrupt=interrupt)
+    except Exception as e:
+        print("DEBUG | play_pcm_in_app failed, falling back:", e)
+        try:
+            play_audio(pcm, samplerate, volume)
+        except Exception as e2:
+            print("DEBUG | fallback play_audio failed:", e2)
+            if raise_errors:
+                raise
     return None
@@ -0,0 +1,118 @@
+# tts_cache.py
+# On-disk cache of synthesized speech, so repeated replies skip piper entirely.
+
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from hashlib import blake2b
+
+from config import TTS_CACHE_PATH, TTS_CACHE_MAX_BYTES
+
+CACHE_VERSION = 1  # bump when the stored audio format changes
+
+
+def normalize_text(text: str) -> str:
+    """NFC + collapsed whitespace: spacing differences don't change what piper says."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def _voice_fingerprint(model_path: str) -> str:
+    # A replaced / retrained voice file must not reuse old audio
+    try:
+        st = os.stat(model_path)
+        return f"{os.path.basename(model_path)}:{st.st_size}:{int(st.st_mtime)}"
+    except OSError:
+        return os.path.basename(model_path)
+
+
+def tts_key(text: str, model_path: str) -> str:
+    h = blake2b(digest_size=20)
+    h.update(f"{CACHE_VERSION}|{_voice_fingerprint(model_path)}|{normalize_text(text)}".encode("utf-8"))
+    return h.hexdigest()
+
+
+class TTSCache:
+    """SQLite table of mono int16 PCM, capped at `max_bytes`; least recently used audio goes first."""
+
+    def __init__(self, path=TTS_CACHE_PATH, max_bytes=TTS_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS tts_cache (
+            key TEXT PRIMARY KEY,
+            pcm BLOB,
+            sample_rate INTEGER,
+            size INTEGER,
+            last_used REAL
+        )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tts_cache_used ON tts_cache(last_used)")
+        self.conn.commit()
+        self._total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM tts_cache").fetchone()[0]
+
+    def get(self, text: str, model_path: str):
+        """Return (pcm bytes, sample_rate) or None."""
+        key = tts_key(text, model_path)
+        with self.lock:
+            row = self.conn.execute("SELECT pcm, sample_rate FROM tts_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE tts_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.hits += 1
+            return bytes(row[0]), row[1]
+
+    def set(self, text: str, model_path: str, pcm: bytes, sample_rate: int):
+        if len(pcm) > self.max_bytes:
+            return
+        key = tts_key(text, model_path)
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM tts_cache WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "REPLACE INTO tts_cache VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(pcm), sample_rate, len(pcm), time.time())
+            )
+            self._total += len(pcm) - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        # Drop oldest entries until we are back under 90% of the cap
+        target = int(self.max_bytes * 0.9)
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM tts_cache ORDER BY last_used"
+        ).fetchall():
+            if self._total <= target:
+                break
+            self.conn.execute("DELETE FROM tts_cache WHERE key = ?", (key,))
+            self._total -= size
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM tts_cache")
+            self.conn.commit()
+            self._total = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            rows = self.conn.execute("SELECT COUNT(*) FROM tts_cache").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "rows": rows, "bytes": self._total}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache() -> TTSCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TTSCache()
+    return _cache
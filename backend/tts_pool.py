@@ -0,0 +1,305 @@
+# tts_pool.py
+# Long-lived piper synthesis workers. Each worker is a child process that keeps
+# one voice model loaded and turns text into raw int16 PCM over its pipes, so
+# a reply costs only inference instead of process start + model load.
+
+import json
+import os
+import re
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+from config import TTS_VOICES_DIR, TTS_WORKERS_PER_VOICE, TTS_WORKER_IDLE_SECONDS
+
+# Child -> parent frame header: status (0 ok / 1 error), sample rate, payload length
+_HEADER = struct.Struct(">BII")
+_LENGTH = struct.Struct(">I")
+# Voice names come from API clients: a plain file name, never a path
+_VOICE_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]*")
+
+
+class WorkerUnavailable(Exception):
+    """The persistent worker could not start (piper module or voice missing)."""
+
+
+class WorkerCrashed(Exception):
+    """The worker process died or broke the protocol mid-request."""
+
+
+class SynthesisError(Exception):
+    """piper rejected the text; the worker itself is still healthy."""
+
+
+def voice_path(voice: str) -> str:
+    """Map a voice name ("en_1" or "en_1.onnx") to its .onnx model file in TTS_VOICES_DIR.
+
+    Raises ValueError for anything else (path separators, "..", absolute paths),
+    so a request cannot point piper at a file outside the voices directory.
+    """
+    if not isinstance(voice, str) or not _VOICE_NAME.fullmatch(voice) or ".." in voice:
+        raise ValueError(f"invalid voice name: {voice!r}")
+    if not voice.endswith(".onnx"):
+        voice += ".onnx"
+    return os.path.join(TTS_VOICES_DIR, voice)
+
+
+def model_sample_rate(model_path: str, default=22050) -> int:
+    """Sample rate from the voice's .onnx.json config."""
+    try:
+        with open(model_path + ".json", encoding="utf-8") as f:
+            return int(json.load(f)["audio"]["sample_rate"])
+    except Exception:
+        return default
+
+
+# ---------- child process ----------
+def _synthesize_pcm(voice, text):
+    if hasattr(voice, "synthesize_stream_raw"):  # piper-tts < 1.3
+        return b"".join(voice.synthesize_stream_raw(text)), voice.config.sample_rate
+    chunks = list(voice.synthesize(text))
+    rate = chunks[0].sample_rate if chunks else voice.config.sample_rate
+    return b"".join(c.audio_int16_bytes for c in chunks), rate
+
+
+def _worker_main(model_path):
+    # Keep the protocol on a private copy of stdout; anything the model
+    # libraries print goes to stderr instead of corrupting the frames.
+    out = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    stdin = sys.stdin.buffer
+
+    from piper import PiperVoice
+
+    voice = PiperVoice.load(model_path)
+    out.write(_HEADER.pack(0, voice.config.sample_rate, 0))  # ready
+    out.flush()
+
+    while True:
+        head = stdin.read(_LENGTH.size)
+        if len(head) < _LENGTH.size:
+            return
+        (n,) = _LENGTH.unpack(head)
+        text = stdin.read(n).decode("utf-8")
+        try:
+            pcm, rate = _synthesize_pcm(voice, text)
+            out.write(_HEADER.pack(0, rate, len(pcm)))
+            out.write(pcm)
+        except Exception as e:
+            msg = str(e).encode("utf-8")
+            out.write(_HEADER.pack(1, 0, len(msg)))
+            out.write(msg)
+        out.flush()
+
+
+# ---------- parent side ----------
+class PiperWorker:
+    """One child process with `model_path` loaded; not thread-safe (the pool hands it to one caller at a time)."""
+
+    def __init__(self, model_path):
+        if not os.path.exists(model_path):
+            raise WorkerUnavailable(f"voice model not found: {model_path}")
+        self.model_path = model_path
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker", model_path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            _, self.sample_rate, _ = self._read_header()
+        except WorkerCrashed as e:
+            self.close()
+            raise WorkerUnavailable(f"piper worker failed to start for {model_path}: {e}")
+        self.last_used = time.monotonic()
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def _read_exact(self, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.proc.stdout.read(n - len(buf))
+            if not chunk:
+                raise WorkerCrashed(f"worker exited (code {self.proc.poll()})")
+            buf += chunk
+        return bytes(buf)
+
+    def _read_header(self):
+        return _HEADER.unpack(self._read_exact(_HEADER.size))
+
+    def synthesize(self, text: str):
+        """Return (int16 PCM bytes, sample_rate) for `text`."""
+        data = text.encode("utf-8")
+        try:
+            self.proc.stdin.write(_LENGTH.pack(len(data)) + data)
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerCrashed(str(e))
+        status, rate, n = self._read_header()
+        payload = self._read_exact(n)
+        self.last_used = time.monotonic()
+        if status != 0:
+            raise SynthesisError(payload.decode("utf-8", "replace"))
+        return payload, rate
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.proc.wait(timeout=2)
+        except Exception:
+            self.proc.kill()
+
+
+def _cli_synthesize(text, model_path):
+    """One-shot `piper --output_raw` run, for when a persistent worker can't start."""
+    result = subprocess.run(
+        ["piper", "--model", model_path, "--output_raw"],
+        input=text.encode("utf-8"),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    return result.stdout, model_sample_rate(model_path)
+
+
+class SynthesisPool:
+    """Up to `workers_per_voice` persistent workers per voice, started on demand.
+
+    Crashed workers are replaced and the request retried once; workers idle
+    for `idle_seconds` are shut down by a background reaper. Voices whose
+    worker cannot start at all fall back to one-shot piper runs.
+    """
+
+    def __init__(self, workers_per_voice=TTS_WORKERS_PER_VOICE, idle_seconds=TTS_WORKER_IDLE_SECONDS):
+        self.workers_per_voice = max(1, workers_per_voice)
+        self.idle_seconds = idle_seconds
+        self._idle = {}   # model path -> [PiperWorker]
+        self._live = {}   # model path -> number of started workers
+        self._cli_only = set()
+        self._cond = threading.Condition()
+        self._stats = {"requests": 0, "started": 0, "restarted": 0, "evicted": 0, "cli_fallback": 0}
+        threading.Thread(target=self._reap, name="tts-reaper", daemon=True).start()
+
+    def _acquire(self, path):
+        with self._cond:
+            while True:
+                idle = self._idle.get(path)
+                if idle:
+                    worker = idle.pop()
+                    if worker.alive:
+                        return worker
+                    self._live[path] -= 1
+                    continue
+                if self._live.get(path, 0) < self.workers_per_voice:
+                    self._live[path] = self._live.get(path, 0) + 1
+                    break
+                self._cond.wait(1.0)
+        # Spawn outside the lock: loading a voice takes a while
+        try:
+            worker = PiperWorker(path)
+        except Exception:
+            with self._cond:
+                self._live[path] -= 1
+                self._cond.notify()
+            raise
+        self._count("started")
+        return worker
+
+    def _release(self, path, worker, broken=False):
+        with self._cond:
+            if broken or not worker.alive:
+                self._live[path] -= 1
+            else:
+                self._idle.setdefault(path, []).append(worker)
+            self._cond.notify()
+        if broken:
+            worker.proc.kill()
+
+    def synthesize(self, text: str, voice: str):
+        """Return (int16 PCM bytes, sample_rate) for `text` in `voice`."""
+        path = voice_path(voice)
+        self._count("requests")
+        if path not in self._cli_only:
+            for attempt in range(2):
+                try:
+                    worker = self._acquire(path)
+                except WorkerUnavailable as e:
+                    print("DEBUG | persistent piper worker unavailable, using one-shot piper:", e)
+                    self._cli_only.add(path)
+                    break
+                try:
+                    result = worker.synthesize(text)
+                except WorkerCrashed as e:
+                    print("DEBUG | piper worker crashed, restarting:", e)
+                    self._release(path, worker, broken=True)
+                    self._count("restarted")
+                    continue
+                except Exception:
+                    self._release(path, worker)
+                    raise
+                self._release(path, worker)
+                return result
+            else:
+                raise WorkerCrashed(f"piper worker for {path} crashed twice")
+        self._count("cli_fallback")
+        return _cli_synthesize(text, path)
+
+    def _reap(self):
+        while True:
+            time.sleep(min(30, max(1, self.idle_seconds / 4)))
+            cutoff = time.monotonic() - self.idle_seconds
+            stale = []
+            with self._cond:
+                for path, idle in self._idle.items():
+                    keep = [w for w in idle if w.last_used > cutoff and w.alive]
+                    stale += [(path, w) for w in idle if w not in keep]
+                    self._idle[path] = keep
+                for path, _ in stale:
+                    self._live[path] -= 1
+                self._cond.notify_all()
+            for _, worker in stale:
+                worker.close()
+            if stale:
+                self._count("evicted", len(stale))
+
+    def _count(self, key, n=1):
+        with self._cond:
+            self._stats[key] += n
+
+    def stats(self) -> dict:
+        with self._cond:
+            data = dict(self._stats)
+            data["workers"] = {os.path.basename(p): n for p, n in self._live.items() if n}
+        return data
+
+    def shutdown(self):
+        with self._cond:
+            workers = [w for idle in self._idle.values() for w in idle]
+            self._idle.clear()
+            self._live.clear()
+        for worker in workers:
+            worker.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_synthesis_pool() -> SynthesisPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SynthesisPool()
+    return _pool
+
+
+if __name__ == "__main__" and len(sys.argv) == 3 and sys.argv[1] == "--worker":
+    _worker_main(sys.argv[2])
@@ -6,9 +6,13 @@ from tkinter import ttk, scrolledtext
 from main import process_input   # we will add this function
 from stt import record_and_transcribe
 from tts import speak
+from barge_in import BargeInController
 
 result_queue = queue.Queue()
 
+# Speaking over a reply (or pressing the mic button) stops it
+barge = BargeInController()
+
 VOICE_MODELS = {
     "English 1": "en_1.onnx",
     "English 2": "en_2.onnx",
@@ -114,7 +118,8 @@ class ChatUI:
                 self.add_message("AI", response)
                 # voice output in background if enabled
                 if voice_model and self.speak_var.get():
-                    threading.Thread(target=speak, args=(response, voice_model), daemon=True).start()
+                    turn = barge.new_turn(listen=True)
+                    threading.Thread(target=self.speak_turn, args=(turn, response, voice_model), daemon=True).start()
                 # re-enable input and clear status
                 self.entry.config(state=tk.NORMAL)
                 self.status_label.config(text="")
@@ -123,6 +128,20 @@ class ChatUI:
         # schedule next poll
         self.chat.after(100, self.poll_results)
 
+    def speak_turn(self, turn, response, voice_model):
+        turn.begin()
+        try:
+            if turn.cancelled:
+                return
+            controller = speak(response, voice_model)
+            if controller is not None:
+                turn.track_playback(controller)
+        finally:
+            turn.end()
+        # keep the mic watched until the reply ends or the user talks over it
+        if barge.current is turn:
+            barge.wait_for_user()
+
     def send_text(self, event=None):
         text = self.entry.get().strip()
         if not text:
@@ -138,6 +157,8 @@ class ChatUI:
         threading.Thread(target=self.run_ai_background, args=(text,), daemon=True).start()
 
     def voice_input(self):
+        barge.interrupt()
+        barge.wait_for_user()
         self.add_message("System", "Listening...")
         text = record_and_transcribe(6)
         self.add_message("You", text)
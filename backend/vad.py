@@ -0,0 +1,222 @@
+# vad.py
+# Lightweight energy-based voice activity detection on float32 16 kHz audio.
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+MIN_RMS = 0.006          # absolute floor: quieter frames are never speech
+NOISE_RATIO = 3.0        # speech must be this many times louder than the noise floor
+MAX_THRESHOLD = 0.03     # frames this loud are speech even when the clip has no quiet frames
+MAX_NOISE_FLOOR = MAX_THRESHOLD / NOISE_RATIO  # a stream that opens with speech can't seed a floor above this
+CALIBRATION_MS = 300     # streams take the quietest frame heard this early on as their initial noise floor
+
+
+def frame_rms(samples: np.ndarray, sample_rate: int = SAMPLE_RATE, frame_ms: int = FRAME_MS) -> np.ndarray:
+    """RMS energy of consecutive non-overlapping frames (a trailing partial frame is dropped)."""
+    size = int(sample_rate * frame_ms / 1000)
+    n = len(samples) // size
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = np.asarray(samples[:n * size], dtype=np.float32).reshape(n, size)
+    return np.sqrt(np.einsum("ij,ij->i", frames, frames) / size)
+
+
+def speech_threshold(rms: np.ndarray) -> float:
+    """Adaptive threshold from the quietest 10% of frames (the noise floor)."""
+    if len(rms) == 0:
+        return MIN_RMS
+    return min(MAX_THRESHOLD, max(MIN_RMS, float(np.percentile(rms, 10)) * NOISE_RATIO))
+
+
+def trim_silence(samples: np.ndarray, sample_rate: int = SAMPLE_RATE, frame_ms: int = FRAME_MS,
+                 pad_ms: int = 150, max_pause_ms: int = 500, min_speech_ms: int = 120):
+    """Drop leading/trailing silence and shorten long pauses.
+
+    Returns (trimmed_samples, info) where info has "speech" (False when the clip
+    holds less than `min_speech_ms` of voiced audio), "audio_seconds",
+    "kept_seconds" and "saved_seconds". Without speech, trimmed_samples is empty.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    total = len(samples) / sample_rate
+    rms = frame_rms(samples, sample_rate, frame_ms)
+    voiced = rms > speech_threshold(rms)
+    if voiced.sum() * frame_ms < min_speech_ms:
+        return np.zeros(0, dtype=np.float32), {
+            "speech": False, "audio_seconds": round(total, 2), "kept_seconds": 0.0, "saved_seconds": round(total, 2),
+        }
+
+    # Keep voiced frames plus `pad` frames either side of them
+    pad = max(1, pad_ms // frame_ms)
+    counts = np.convolve(voiced.astype(np.int32), np.ones(2 * pad + 1, dtype=np.int32), mode="same")
+    keep = counts > 0
+
+    # Any remaining silent run longer than max_pause keeps only its two ends
+    half = max(1, max_pause_ms // frame_ms // 2)
+    edges = np.flatnonzero(np.diff(np.concatenate(([1], keep.astype(np.int8), [1]))))
+    for start, end in zip(edges[::2], edges[1::2]):
+        if start == 0 or end == len(keep):
+            continue  # leading / trailing silence is dropped entirely
+        if end - start > 2 * half:
+            keep[start:start + half] = True
+            keep[end - half:end] = True
+
+    size = int(sample_rate * frame_ms / 1000)
+    mask = np.repeat(keep, size)
+    # a trailing partial frame follows the last full frame's decision
+    mask = np.concatenate((mask, np.full(len(samples) - len(mask), keep[-1] if len(keep) else False)))
+    trimmed = samples[mask]
+    kept = len(trimmed) / sample_rate
+    return trimmed, {
+        "speech": True, "audio_seconds": round(total, 2), "kept_seconds": round(kept, 2), "saved_seconds": round(total - kept, 2),
+    }
+
+
+def _calibrate(noise, energy):
+    """Initial noise floor: the quietest frame so far, never above MAX_NOISE_FLOOR."""
+    return min(MAX_NOISE_FLOOR, energy if noise is None else min(noise, energy))
+
+
+class SpeechOnsetDetector:
+    """Flags the moment someone starts talking in a live stream (used for barge-in).
+
+    `push` returns True once `hold_ms` of consecutive frames exceed both
+    `min_rms` and `ratio` x the adaptive noise floor. Keep `frame_ms` small:
+    detection latency is roughly frame_ms + hold_ms.
+
+    Pass `playing=True` while the assistant's own voice is coming out of the
+    speakers: the mic then hears it as echo, so the thresholds are raised to
+    `echo_ratio` x ratio and `echo_min_rms`, and the noise floor is frozen
+    so the echo is not learned as background noise.
+
+    The floor starts at the quietest of the first CALIBRATION_MS of frames,
+    capped at MAX_NOISE_FLOOR, so talking from the first frame is still heard.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_ms=10, hold_ms=60, ratio=NOISE_RATIO, min_rms=MIN_RMS,
+                 echo_ratio=1.0, echo_min_rms=None):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame = int(sample_rate * frame_ms / 1000)
+        self.hold = max(1, hold_ms // frame_ms)
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.echo_ratio = echo_ratio
+        self.echo_min_rms = min_rms if echo_min_rms is None else max(min_rms, echo_min_rms)
+        self.noise = None
+        self._calibration = max(1, CALIBRATION_MS // frame_ms)
+        self._run = 0
+        self._pending = np.zeros(0, dtype=np.float32)
+
+    def push(self, samples: np.ndarray, playing: bool = False) -> bool:
+        audio = np.concatenate((self._pending, np.asarray(samples, dtype=np.float32)))
+        rms = frame_rms(audio, self.sample_rate, self.frame_ms)
+        self._pending = audio[len(rms) * self.frame:]
+        ratio, min_rms = (self.ratio * self.echo_ratio, self.echo_min_rms) if playing else (self.ratio, self.min_rms)
+        detected = False
+        for energy in rms:
+            if self._calibration and not playing:
+                self._calibration -= 1
+                self.noise = _calibrate(self.noise, energy)
+            if energy > max(min_rms, (self.noise or 0.0) * ratio):
+                self._run += 1
+                detected = detected or self._run >= self.hold
+            else:
+                self._run = 0
+                if not playing:
+                    self.noise = 0.95 * self.noise + 0.05 * energy
+        return detected
+
+
+class VADSegmenter:
+    """Incremental segmenter: feed audio, get back speech segments and utterance ends.
+
+    `push` returns a list of events:
+    - ("segment", samples): a stretch of speech closed by a short pause
+    - ("end_of_utterance", None): the speaker has been silent long enough to be done
+
+    The noise floor is calibrated like SpeechOnsetDetector's.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, segment_pause_ms=400,
+                 utterance_pause_ms=1000, pre_roll_ms=200, max_segment_s=15.0):
+        self.sample_rate = sample_rate
+        self.frame = int(sample_rate * frame_ms / 1000)
+        self.segment_pause = max(1, segment_pause_ms // frame_ms)
+        self.utterance_pause = max(self.segment_pause, utterance_pause_ms // frame_ms)
+        self.pre_roll = pre_roll_ms // frame_ms
+        self.max_segment = int(max_segment_s * 1000 // frame_ms)
+        self.noise = None
+        self._calibration = max(1, CALIBRATION_MS // frame_ms)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._history = []   # recent silent frames kept as pre-roll
+        self._speech = []    # frames of the open segment
+        self._silence = 0    # consecutive silent frames
+        self._heard = False  # any speech since the last end-of-utterance
+
+    @property
+    def in_speech(self) -> bool:
+        return bool(self._speech)
+
+    def current_segment(self) -> np.ndarray:
+        """Audio of the segment still being spoken (for partial transcripts)."""
+        return np.concatenate(self._speech) if self._speech else np.zeros(0, dtype=np.float32)
+
+    def push(self, samples: np.ndarray) -> list:
+        audio = np.concatenate((self._pending, np.asarray(samples, dtype=np.float32)))
+        n = len(audio) // self.frame
+        self._pending = audio[n * self.frame:]
+        if n == 0:
+            return []
+
+        frames = audio[:n * self.frame].reshape(n, self.frame)
+        rms = np.sqrt(np.einsum("ij,ij->i", frames, frames) / self.frame)
+        events = []
+        for frame, energy in zip(frames, rms):
+            if self._calibration:
+                self._calibration -= 1
+                self.noise = _calibrate(self.noise, energy)
+            voiced = energy > max(MIN_RMS, self.noise * NOISE_RATIO)
+            if not voiced:
+                # slow-moving noise floor estimate from silent frames only
+                self.noise = 0.95 * self.noise + 0.05 * energy
+
+            if voiced:
+                if not self._speech:
+                    self._speech = list(self._history)
+                self._speech.append(frame)
+                self._silence = 0
+                self._heard = True
+                if len(self._speech) >= self.max_segment:
+                    events.append(("segment", self._close()))
+                continue
+
+            self._silence += 1
+            if self._speech:
+                self._speech.append(frame)
+                if self._silence >= self.segment_pause:
+                    events.append(("segment", self._close()))
+            else:
+                self._history.append(frame)
+                if len(self._history) > self.pre_roll:
+                    self._history.pop(0)
+            if self._heard and self._silence >= self.utterance_pause:
+                events.append(("end_of_utterance", None))
+                self._heard = False
+        return events
+
+    def flush(self) -> list:
+        """Close whatever is open (e.g. the client stopped sending)."""
+        events = []
+        if self._speech:
+            events.append(("segment", self._close()))
+        if self._heard:
+            events.append(("end_of_utterance", None))
+            self._heard = False
+        return events
+
+    def _close(self) -> np.ndarray:
+        segment = np.concatenate(self._speech)
+        self._speech = []
+        self._history = []
+        return segment
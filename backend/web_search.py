@@ -0,0 +1,324 @@
+# web_search.py
+# Cached, concurrent web search used by the opinion_analysis and
+# search_and_explain intents. Results are dicts with "title", "href" and "body".
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from hashlib import sha1
+
+from config import (
+    SEARCH_PROVIDERS, SEARCH_TIMEOUT, SEARCH_CACHE_TTL, SEARCH_CACHE_PATH, SEARCH_RETRIES, LLM_MIN_BUDGET_SECONDS,
+)
+from resilience import Deadline, get_breaker
+
+
+class SearchUnavailable(Exception):
+    """Search came back empty because providers failed, timed out or were short-circuited."""
+
+
+# ---------- PROVIDERS ----------
+class SearchProvider:
+    """Base class: `search` returns a list of {"title", "href", "body"} dicts."""
+
+    name = "base"
+
+    def search(self, query: str, max_results: int) -> list:
+        raise NotImplementedError
+
+
+class DuckDuckGoProvider(SearchProvider):
+    name = "duckduckgo"
+
+    def search(self, query, max_results):
+        from duckduckgo_search import DDGS
+
+        with DDGS(timeout=SEARCH_TIMEOUT) as ddgs:
+            hits = ddgs.text(query, max_results=max_results) or []
+        return [{"title": h.get("title", ""), "href": h.get("href", ""), "body": h.get("body", "")} for h in hits]
+
+
+class WikipediaProvider(SearchProvider):
+    name = "wikipedia"
+    API_URL = "https://en.wikipedia.org/w/api.php"
+
+    def search(self, query, max_results):
+        import requests
+
+        response = requests.get(
+            self.API_URL,
+            params={
+                "action": "query",
+                "list": "search",
+                "srsearch": query,
+                "srlimit": max_results,
+                "format": "json",
+            },
+            headers={"User-Agent": "VerySleepyAI/1.0"},
+            timeout=SEARCH_TIMEOUT,
+        )
+        hits = response.json().get("query", {}).get("search", [])
+        return [
+            {
+                "title": h["title"],
+                "href": "https://en.wikipedia.org/wiki/" + h["title"].replace(" ", "_"),
+                "body": re.sub(r"<[^>]+>", "", h.get("snippet", "")),
+            }
+            for h in hits
+        ]
+
+
+class FixtureProvider(SearchProvider):
+    """Offline provider for tests: serves canned results from a dict or a JSON file.
+
+    The mapping is {normalized query: [result, ...]}; a "*" entry is used for any
+    query that has no exact match.
+    """
+
+    name = "fixture"
+
+    def __init__(self, results=None, path=None, delay=0.0):
+        if path:
+            with open(path, "r", encoding="utf-8") as f:
+                results = json.load(f)
+        self.results = {normalize_query(k) if k != "*" else k: v for k, v in (results or {}).items()}
+        self.delay = delay
+
+    def search(self, query, max_results):
+        if self.delay:
+            time.sleep(self.delay)
+        hits = self.results.get(normalize_query(query), self.results.get("*", []))
+        return list(hits[:max_results])
+
+
+PROVIDER_TYPES = {
+    "duckduckgo": DuckDuckGoProvider,
+    "wikipedia": WikipediaProvider,
+}
+
+_providers = None
+_providers_lock = threading.Lock()
+
+
+def register_provider(provider: SearchProvider):
+    """Add a provider to the active set (e.g. a FixtureProvider in tests)."""
+    with _providers_lock:
+        active = list(get_providers())
+        active.append(provider)
+        set_providers(active)
+
+
+def set_providers(providers):
+    """Replace the active providers; pass None to go back to config.SEARCH_PROVIDERS."""
+    global _providers
+    _providers = list(providers) if providers is not None else None
+
+
+def get_providers():
+    global _providers
+    if _providers is None:
+        _providers = [PROVIDER_TYPES[name]() for name in SEARCH_PROVIDERS if name in PROVIDER_TYPES]
+    return _providers
+
+
+# ---------- CACHE ----------
+def normalize_query(query: str) -> str:
+    return " ".join((query or "").lower().split())
+
+
+class SearchCache:
+    """SQLite cache of merged result lists keyed by normalized query and max_results."""
+
+    def __init__(self, path=SEARCH_CACHE_PATH):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS search_cache (
+            key TEXT PRIMARY KEY,
+            results TEXT,
+            expires_at REAL
+        )
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def key(query, max_results):
+        return sha1(f"{normalize_query(query)}|{max_results}".encode("utf-8")).hexdigest()
+
+    def get(self, query, max_results):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT results FROM search_cache WHERE key = ? AND expires_at > ?",
+                (self.key(query, max_results), time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, query, max_results, results, ttl=SEARCH_CACHE_TTL):
+        with self.lock:
+            self.conn.execute(
+                "REPLACE INTO search_cache VALUES (?, ?, ?)",
+                (self.key(query, max_results), json.dumps(results, ensure_ascii=False), time.time() + ttl)
+            )
+            self.conn.commit()
+
+    def purge_expired(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM search_cache WHERE expires_at <= ?", (time.time(),))
+            self.conn.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchCache()
+    return _cache
+
+
+# ---------- FAN-OUT + MERGE ----------
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="web-search")
+# provider name -> call a search gave up waiting for; the provider gets no new
+# work until it returns, so hung calls can't take over the executor
+_abandoned = {}
+_abandoned_lock = threading.Lock()
+
+
+def _url_key(result):
+    href = (result.get("href") or "").strip().lower()
+    if not href:
+        return "text:" + sha1(f"{result.get('title', '')}|{result.get('body', '')}".encode("utf-8")).hexdigest()
+    href = re.sub(r"^https?://(www\.)?", "", href).split("#", 1)[0]
+    return href.rstrip("/")
+
+
+def merge_results(result_lists, max_results):
+    """Interleave provider lists round-robin, keeping the first hit per URL."""
+    merged, seen = [], set()
+    for rank in range(max((len(r) for r in result_lists), default=0)):
+        for results in result_lists:
+            if rank >= len(results):
+                continue
+            r = results[rank]
+            key = _url_key(r)
+            if key in seen or not (r.get("title") or r.get("body")):
+                continue
+            seen.add(key)
+            merged.append(r)
+            if len(merged) >= max_results:
+                return merged
+    return merged
+
+
+def _wait(futures, timeout, cancel=None):
+    if cancel is None:
+        return wait(futures, timeout=timeout)
+    # Wait in short slices so a cancelled request stops waiting on slow providers
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        done, pending = wait(futures, timeout=max(0.0, min(0.1, remaining)))
+        if not pending or remaining <= 0 or cancel.cancelled:
+            return done, pending
+
+
+def _search_provider(provider, query, max_results, deadline, deadline_cut):
+    # Each provider has its own circuit, and it alone counts the provider's
+    # failures (including answering after the search gave up on it); failures
+    # are retried with jitter while the search budget lasts
+    return get_breaker("search:" + provider.name).call(
+        provider.search, query, max_results, retries=SEARCH_RETRIES, deadline=deadline, deadline_cut=deadline_cut,
+    )
+
+
+def _submit(provider, *args):
+    """Start a provider call, or return None while an abandoned call to it is still running."""
+    with _abandoned_lock:
+        stuck = _abandoned.get(provider.name)
+        if stuck is not None:
+            if not stuck.done():
+                return None
+            del _abandoned[provider.name]
+    return _executor.submit(_search_provider, provider, *args)
+
+
+def web_search(query: str, max_results: int = 8, timeout: float = SEARCH_TIMEOUT, use_cache: bool = True,
+               cancel=None, deadline=None) -> list:
+    """Search every active provider concurrently and return merged results.
+
+    A cache hit returns immediately. On a miss, providers that have not answered
+    within `timeout` seconds are abandoned and whatever arrived is returned; only
+    complete answers are cached. If `cancel` (a CancelToken) fires, the search
+    is abandoned and `Cancelled` raised.
+
+    With a request `deadline` (resilience.Deadline) the search also stops in time
+    to leave the model LLM_MIN_BUDGET_SECONDS, and a search that got nothing
+    because providers failed or ran out of time raises `SearchUnavailable`, so
+    the caller can degrade instead of reporting "no results".
+    """
+    if not query or not query.strip():
+        return []
+    if cancel is not None:
+        cancel.check()
+
+    cache = None
+    if use_cache:
+        try:
+            cache = get_cache()
+            cached = cache.get(query, max_results)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            print("DEBUG | search cache unavailable:", e)
+            cache = None
+
+    budget_cut = False
+    if deadline is not None:
+        budget = deadline.budget(timeout, reserve=LLM_MIN_BUDGET_SECONDS)
+        if budget <= 0:
+            raise SearchUnavailable("no time left for search")
+        budget_cut, timeout = budget < timeout, budget
+
+    providers = get_providers()
+    search_deadline = Deadline(timeout)
+    # only a provider that gets its full timeout is blamed for running out of it
+    futures = [_submit(p, query, max_results, search_deadline, budget_cut) for p in providers]
+    done, pending = _wait([f for f in futures if f is not None], timeout, cancel)
+    for provider, future in zip(providers, futures):
+        if future in pending and not future.cancel():
+            with _abandoned_lock:
+                _abandoned[provider.name] = future
+    if cancel is not None:
+        cancel.check()
+
+    result_lists, failed = [], bool(pending)
+    for provider, future in zip(providers, futures):
+        if future is None:
+            failed = True
+            print(f"DEBUG | search provider {provider.name} skipped: an earlier call is still running")
+            continue
+        if future not in done:
+            print(f"DEBUG | search provider {provider.name} timed out")
+            continue
+        try:
+            result_lists.append(future.result() or [])
+        except Exception as e:
+            failed = True
+            print(f"DEBUG | search provider {provider.name} failed:", e)
+
+    results = merge_results(result_lists, max_results)
+    if cache is not None and results and not failed:
+        try:
+            cache.set(query, max_results, results)
+        except Exception as e:
+            print("DEBUG | search cache write failed:", e)
+    if deadline is not None and not results and failed:
+        raise SearchUnavailable("all search providers failed or timed out")
+    return results